@@ -0,0 +1,236 @@
+# coding: utf-8
+
+"""This file contains the executable code that allows to process images with
+MyoFInDer from the command line, without any graphical interface."""
+
+import logging
+from sys import stdout, exit
+from pathlib import Path
+from glob import glob
+from pickle import load
+import argparse
+
+from .tools import (Settings, TableItems, TableEntry, Nuclei, Fibers,
+                    overlay_colors, save_settings, save_data,
+                    save_originals, save_table, save_overlay_images)
+
+# The image extensions that can be loaded in the interface
+image_extensions = ('.tif', '.png', '.jpg', '.jpeg', '.bmp', '.hdr')
+
+# The settings that can be overridden from the command line
+segmentation_settings = ('nuclei_colour', 'fiber_colour',
+                         'minimum_fiber_intensity', 'maximum_fiber_intensity',
+                         'minimum_nucleus_intensity',
+                         'maximum_nucleus_intensity', 'minimum_nuc_diameter',
+                         'minimum_nuclei_count', 'tile_size')
+
+
+def find_images(inputs: list[str]) -> list[Path]:
+    """Returns the paths to the images to process.
+
+    Args:
+        inputs: A list of folders, in which case all the images they contain
+            are selected, or of paths or glob patterns to images.
+
+    Returns:
+        The paths to the images to process, without duplicates and in the order
+        in which they were found.
+    """
+
+    images: list[Path] = list()
+    for pattern in inputs:
+        if Path(pattern).is_dir():
+            found = sorted(path for path in Path(pattern).iterdir()
+                           if path.suffix.lower() in image_extensions)
+        else:
+            found = sorted(Path(path) for path in glob(pattern))
+        images.extend(path.absolute() for path in found
+                      if path.is_file() and path.absolute() not in images)
+
+    return images
+
+
+def main(argv: list[str] | None = None) -> int:
+    """This is the main method called for processing images from the command
+    line.
+
+    It parses the command-line arguments, processes the selected images, and
+    saves the results as a MyoFInDer project that can later be opened in the
+    interface.
+
+    Args:
+        argv: The command-line arguments to parse, if not taken from the
+            command line.
+
+    Returns:
+        0 if all the images were processed successfully, 1 otherwise.
+    """
+
+    # Parser for parsing the command line arguments of the script
+    parser = argparse.ArgumentParser(
+        description="Processes images with MyoFInDer without starting the "
+                    "interface, and saves the results as a project.")
+    parser.add_argument('images', nargs='+', type=str,
+                        help="The folders containing the images to process, "
+                             "or the paths or glob patterns of the images.")
+    parser.add_argument('-o', '--output', action='store', type=Path,
+                        required=True,
+                        help="The folder where to save the project. The files "
+                             "of any project already saved there are "
+                             "overwritten.")
+    parser.add_argument('-s', '--settings', action='store', type=Path,
+                        required=False,
+                        help="The path to a settings.pickle file, for example "
+                             "from a saved project, from which to load the "
+                             "settings. Otherwise, the default settings are "
+                             "used.")
+    parser.add_argument('--nuclei-colour', choices=('red', 'green', 'blue'),
+                        help="The channel of the nuclei.")
+    parser.add_argument('--fiber-colour', choices=('red', 'green', 'blue'),
+                        help="The channel of the fibers.")
+    parser.add_argument('--minimum-fiber-intensity', type=int,
+                        help="The minimum intensity of fiber pixels.")
+    parser.add_argument('--maximum-fiber-intensity', type=int,
+                        help="The maximum intensity of fiber pixels.")
+    parser.add_argument('--minimum-nucleus-intensity', type=int,
+                        help="The minimum average intensity of nuclei.")
+    parser.add_argument('--maximum-nucleus-intensity', type=int,
+                        help="The maximum average intensity of nuclei.")
+    parser.add_argument('--minimum-nuc-diameter', type=int,
+                        help="The minimum diameter of nuclei, in pixels.")
+    parser.add_argument('--minimum-nuclei-count', type=int,
+                        help="The minimum number of nuclei in a fiber for its "
+                             "nuclei to be counted as positive.")
+    parser.add_argument('--tile-size', type=int,
+                        help="The size in pixels above which the images are "
+                             "processed in overlapping tiles of at most this "
+                             "size, to limit the memory usage. 0, the "
+                             "default, processes all the images at once.")
+    parser.add_argument('--save-overlay', action='store_true', default=None,
+                        help="If provided, the images with the nuclei and "
+                             "fibers drawn on them are also saved.")
+    parser.add_argument('-b', '--batch-size', action='store', type=int,
+                        default=8,
+                        help="The maximum number of images processed together "
+                             "by Cellpose. Higher values are faster for small "
+                             "images but use more memory.")
+    parser.add_argument('-c', '--cache-folder', action='store', type=Path,
+                        required=False,
+                        help="If provided, the segmentation results are "
+                             "cached in this folder and reused when "
+                             "processing again the same images with the same "
+                             "settings.")
+    parser.add_argument('-n', '--nolog', action='store_false',
+                        help="If provided, the log messages won't be "
+                             "displayed. Otherwise, they are by default.")
+    args = parser.parse_args(argv)
+
+    # Setting up the logger
+    logger = logging.getLogger("MyoFInDer")
+    logger.setLevel(logging.INFO)
+    if args.nolog:
+        handler_console = logging.StreamHandler(stream=stdout)
+        handler_console.setLevel(logging.INFO)
+        formatter = logging.Formatter('%(asctime)s %(name)-8s %(message)s')
+        handler_console.setFormatter(formatter)
+        logger.addHandler(handler_console)
+    logger = logging.getLogger("MyoFInDer.Batch")
+
+    # Getting the settings, starting from the default ones
+    settings = Settings.defaults()
+    if args.settings is not None:
+        logger.log(logging.INFO, f"Loading the settings file from "
+                                 f"{args.settings}")
+        with open(args.settings, 'rb') as param_file:
+            loaded = load(param_file)
+        for key, value in loaded.items():
+            if key in settings:
+                settings[key] = value
+            else:
+                logger.log(logging.WARNING, f"The {key} setting is not "
+                                            f"supported, ignoring it !")
+    for key in segmentation_settings:
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    if args.save_overlay is not None:
+        settings['save_overlay'] = args.save_overlay
+    values = ', '.join(f'{key}: {value}' for key, value in settings.items())
+    logger.log(logging.INFO, f"Settings values: {values}")
+
+    # Getting the images to process, skipping the duplicate file names
+    table_items = TableItems()
+    for path in find_images(args.images):
+        if path.name in (entry.path.name for entry in table_items):
+            logger.log(logging.WARNING, f"Skipping {path} as an image with "
+                                        f"the same name is already loaded")
+            continue
+        table_items.append(TableEntry(path=path, nuclei=Nuclei(),
+                                      fibers=Fibers()))
+
+    if not table_items:
+        logger.log(logging.ERROR, "No images to process, aborting")
+        return 1
+
+    logger.log(logging.INFO, f"Processing the images: "
+                             f"{', '.join(map(str, table_items.file_names))}")
+
+    # Processing all the images, Cellpose is only imported at this point
+    from .image_segmentation import ImageSegmentation
+    segmentation = ImageSegmentation(args.cache_folder, settings['tile_size'])
+    results = segmentation.batch(
+        table_items.file_names,
+        settings['nuclei_colour'],
+        settings['fiber_colour'],
+        settings['minimum_fiber_intensity'],
+        settings['maximum_fiber_intensity'],
+        settings['minimum_nucleus_intensity'],
+        settings['maximum_nucleus_intensity'],
+        settings['minimum_nuc_diameter'],
+        settings['minimum_nuclei_count'],
+        max_images=args.batch_size)
+
+    # Adding the results to the table entries
+    failed = list()
+    for entry, (path, result) in zip(table_items, results):
+        if isinstance(result, Exception):
+            logger.exception(f"Exception caught while processing image "
+                             f"{path}", exc_info=result)
+            failed.append(path)
+            continue
+        _, nuclei_out, nuclei_in, fiber_contours, area = result
+        logger.log(logging.INFO, f"Segmentation returned file: {path}, "
+                                 f"nuclei out: {len(nuclei_out)}, "
+                                 f"nuclei in: {len(nuclei_in)}, "
+                                 f"fiber contours: {len(fiber_contours)}, "
+                                 f"area: {area}")
+        entry.set_processed_data(nuclei_out, nuclei_in, fiber_contours, area)
+
+    # Saving the project the same way as the interface does
+    directory = args.output.absolute()
+    logger.log(logging.INFO, f"Saving the project {directory}")
+    directory.mkdir(parents=True, exist_ok=True)
+
+    save_settings(settings, directory)
+    save_table(table_items, directory)
+    save_originals(table_items, directory, failed.append)
+    if settings['save_overlay']:
+        save_overlay_images(table_items, directory,
+                            overlay_colors(settings['nuclei_colour'],
+                                           settings['fiber_colour']),
+                            workers=settings['overlay_workers'],
+                            overlay_format=settings['overlay_format'],
+                            compression=settings['overlay_compression'])
+    save_data(table_items, directory)
+
+    if failed:
+        logger.log(logging.ERROR, f"Could not process or save the images: "
+                                  f"{', '.join(map(str, failed))}")
+        return 1
+
+    logger.log(logging.INFO, f"Project saved at {directory}")
+    return 0
+
+
+if __name__ == "__main__":
+
+    exit(main())
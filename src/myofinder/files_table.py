@@ -1,19 +1,16 @@
 # coding: utf-8
 
 from tkinter import ttk, Canvas, messagebox, Event, Frame
-from xlsxwriter import Workbook
-from shutil import copyfile, rmtree
-from cv2 import polylines, ellipse, imwrite, cvtColor, COLOR_RGB2BGR
 from pathlib import Path
 from platform import system
-from copy import deepcopy
 from functools import partial
-from pickle import dump, load
-from numpy import ndarray, array
+from numpy import ndarray
+from typing import Any
 import logging
 
-from .tools import (Nucleus, Fiber, Nuclei, Fibers, GraphicalElement,
-                    check_image, TableItems, TableEntry)
+from .tools import (Nucleus, Nuclei, Fibers, GraphicalElement,
+                    TableItems, TableEntry, ProjectSave, is_saved, load_data,
+                    saved_overlays)
 
 
 class FilesTable(ttk.Frame):
@@ -49,6 +46,11 @@ class FilesTable(ttk.Frame):
         self.image_canvas = None
         self.table_items = TableItems()
 
+        # The folder, colors, format and compression of the last saved
+        # overlay images, if they are up-to-date with the saved data
+        self._overlays: tuple[Path, tuple[str, str, str], str,
+                              int] | None = None
+
     def log(self, msg: str) -> None:
         """Wrapper for reducing the verbosity of logging."""
 
@@ -57,8 +59,10 @@ class FilesTable(ttk.Frame):
     def load_project(self, directory: Path) -> None:
         """Loads an existing project.
 
-        Gets the images names and paths, the fibers positions, and the nuclei
-        positions and colors from the data.pickle file.
+        Gets the images names and paths and their statistics from the Data
+        folder of the project. The fibers positions and the nuclei positions
+        and colors of an image are only loaded once it is selected or
+        exported.
 
         Args:
             directory: The path to the directory where the project to load is.
@@ -67,61 +71,106 @@ class FilesTable(ttk.Frame):
         # First, resetting the project
         self.log("Resetting all the table items")
         self.table_items.reset()
+        self._overlays = None
 
         # Loading the simple version of the stored data
-        with open(directory / 'data.pickle', 'rb') as save_file:
-            self.log(f"Loading project data from {directory / 'data.pickle'}")
-            table_items = load(save_file)
+        table_items = load_data(directory)
 
         # Keeping only the data corresponding to existing images
-        self.table_items = TableItems(
-            entries=[entry for entry in table_items if
-                     (directory / 'Original Images' / entry.path).is_file()])
+        entries = [entry for entry in table_items if
+                   (directory / 'Original Images' / entry.path).is_file()]
 
         # Completing the paths to match that of the directory to load
-        for entry in self.table_items:
+        for entry in entries:
             entry.path = directory / 'Original Images' / entry.path
+        self.table_items = TableItems(entries=entries)
         loaded = (entry.path for entry in self.table_items)
         self.log(f"Loaded data for images: {', '.join(map(str, loaded))}")
 
-        # Removing any reference to Tkinter objects
+        # The overlay images saved with the project don't need to be drawn
+        # again at the next save, unless their parameters change
+        self._overlays = saved_overlays(self.table_items, directory)
+
+        # Removing any reference to Tkinter objects in already loaded data
         for entry in self.table_items:
-            for nucleus in entry.nuclei:
-                nucleus.tk_obj = None
+            if entry.loaded:
+                entry.nuclei.clear_tk_objs()
 
         # Redrawing the canvas
         if self.table_items:
             self._make_table()
 
-    def save_project(self, directory: Path, save_overlay: bool) -> None:
-        """Saves a project.
+    def save_project(self,
+                     directory: Path,
+                     save_overlay: bool,
+                     settings: dict[str, Any],
+                     app_folder: Path | None = None) -> ProjectSave:
+        """Starts saving a project in a background thread.
 
         Saves the images names and paths, the fibers positions, the nuclei
         positions and colors, the images themselves, a .xlsx file containing
         stats of the project, and optionally the images with nuclei and fibers
         drawn on it.
 
+        When saving again to the same folder, only the data and the overlay
+        images of the entries that were modified since the last save are
+        written.
+
         Args:
             directory: The path to the directory where the project has to be
                 saved.
             save_overlay: Should the images with nuclei and fibers drawn be
                 saved ?
+            settings: The values of the settings to save, indexed by name.
+            app_folder: If given, the application folder in which to record
+                the project folder while it is being replaced.
+
+        Returns:
+            The ProjectSave in charge of saving the project, to give to
+            :meth:`finish_save` once it is done.
         """
 
         self.log(f"Saving the project {directory}")
 
-        # First, save the stats in a .xlsx file
-        self._save_table(directory)
+        # The entries whose data is not up-to-date in the project folder
+        changed = [entry for entry in self.table_items
+                   if not is_saved(entry, directory)]
+        self.log(f"{len(changed)} images changed since the last save")
+
+        # The overlay images of the unchanged entries only need to be saved
+        # again if they were not saved in the same folder, with the same
+        # colors and in the same format
+        colors = (self.image_canvas.nuc_col_out,
+                  self.image_canvas.nuc_col_in,
+                  self.image_canvas.fib_color)
+        overlays = (directory, colors, settings['overlay_format'],
+                    settings['overlay_compression'])
+
+        save = ProjectSave(self.table_items, directory, settings, changed,
+                           colors if save_overlay else None,
+                           self._overlays != overlays, app_folder)
+        save.start()
+        return save
+
+    def finish_save(self, save: ProjectSave) -> None:
+        """Updates the entries once a project was successfully saved, and
+        displays the images that couldn't be saved.
 
-        # Then, save the original images
-        self._save_originals(directory)
+        Args:
+            save: The ProjectSave that saved the project.
+        """
+
+        save.apply(self.table_items)
 
-        # If needed, save the overlay images
-        if save_overlay:
-            self._save_overlay_images(directory)
+        for path in save.failed:
+            self._show_save_error(path)
 
-        # Finally, save the data
-        self._save_data(directory)
+        if save.overlay_colors is not None:
+            self._overlays = (save.directory, save.overlay_colors,
+                              save.overlay_format, save.overlay_compression)
+        # Otherwise, the overlay images of the changed entries got outdated
+        elif save.changed:
+            self._overlays = None
 
     def add_nucleus(self, nucleus: Nucleus) -> None:
         """Adds a Nucleus to the Nuclei object associated with the current
@@ -132,7 +181,9 @@ class FilesTable(ttk.Frame):
         """
 
         self.log(f"Nucleus added at position {nucleus.x_pos}, {nucleus.y_pos}")
-        self.table_items.current_entry.nuclei.append(deepcopy(nucleus))
+        self.table_items.current_entry.nuclei.append(
+            Nucleus(nucleus.x_pos, nucleus.y_pos, None, nucleus.color))
+        self.table_items.current_entry.modified = True
         self._update_data(self.table_items.current_entry)
 
     def remove_nucleus(self, nucleus: Nucleus) -> None:
@@ -146,6 +197,7 @@ class FilesTable(ttk.Frame):
         self.log(f"Nucleus removed at position "
                  f"{nucleus.x_pos}, {nucleus.y_pos}")
         self.table_items.current_entry.nuclei.remove(nucleus)
+        self.table_items.current_entry.modified = True
         self._update_data(self.table_items.current_entry)
 
     def switch_nucleus(self, nucleus: Nucleus) -> None:
@@ -157,9 +209,8 @@ class FilesTable(ttk.Frame):
 
         self.log(f"Nucleus switched at position "
                  f"{nucleus.x_pos}, {nucleus.y_pos}")
-        for nuc in self.table_items.current_entry.nuclei:
-            if nuc == nucleus:
-                nuc.color = 'out' if nuc.color == 'in' else 'in'
+        self.table_items.current_entry.nuclei.invert(nucleus)
+        self.table_items.current_entry.modified = True
         self._update_data(self.table_items.current_entry)
 
     def add_images(self, filenames: list[Path]) -> None:
@@ -225,25 +276,14 @@ class FilesTable(ttk.Frame):
                 computed.
         """
 
-        # Adds the received nuclei to the Nuclei object and draws them
-        self.table_items[file].nuclei.reset()
-        for x, y in nuclei_negative_positions:
-            self.table_items[file].nuclei.append(Nucleus(x, y, None, 'out'))
-        for x, y in nuclei_positive_positions:
-            self.table_items[file].nuclei.append(Nucleus(x, y, None, 'in'))
-
-        # Adds the received fibers to the Fibers object and draws them
-        self.table_items[file].fibers.reset()
-        self.table_items[file].fibers.area = area
-        for contour in fiber_contours:
-            # Ensuring single points are not being outlined
-            if len(contour.shape) < 2:
-                continue
-            contour = list(map(tuple, contour))
-            self.table_items[file].fibers.append(Fiber(contour))
+        # Adds the received nuclei and fibers to the entry
+        entry = self.table_items[file]
+        entry.set_processed_data(nuclei_negative_positions,
+                                 nuclei_positive_positions,
+                                 fiber_contours, area)
 
         # Updates the display
-        self._update_data(self.table_items[file])
+        self._update_data(entry)
 
         # Refreshes the image display if necessary
         if file == self.table_items.selected:
@@ -353,196 +393,17 @@ class FilesTable(ttk.Frame):
         # Updating the master checkbox
         self._main_window.update_master_check()
 
-    def _save_data(self, directory: Path) -> None:
-        """Saves the names of the images, the positions of the fibers and the
-        positions and colors of the nuclei.
-
-        All this information is stored in a data.pickle file.
-
-        Args:
-            directory: The directory where the file should be saved.
-        """
-
-        with open(directory / 'data.pickle', 'wb+') as save_file:
-            self.log(f"Saving the data to file {directory / 'data.pickle'}")
-            dump(self.table_items.save_version, save_file, protocol=4)
-
-    def _save_originals(self, directory: Path) -> None:
-        """Saves the original images in a sub-folder of the project folder.
-
-        Args:
-            directory: The path to the project folder.
-        """
-
-        # Creating the directory if it doesn't exit
-        if not (directory / 'Original Images').is_dir():
-            self.log(f"Creating the folder for saving the original images at: "
-                     f"{directory / 'Original Images'}")
-            Path.mkdir(directory / 'Original Images')
-
-        self.log("Saving the original images")
-
-        # Actually saving the images
-        for item in self.table_items:
-            # Saving only if the images are not saved yet
-            if directory not in item.path.parents:
-                new_path = directory / 'Original Images' / item.path.name
-                self.log(f"Saving the image: {new_path}")
-
-                # Handling the case when the image cannot be loaded
-                try:
-                    copyfile(item.path, new_path)
-                except FileNotFoundError:
-                    messagebox.showerror(f'Error while saving the image !',
-                                         f'Check that the image at '
-                                         f'{item.path} still exists and '
-                                         f'that it is accessible.')
-                    self.log(f"ERROR! Could not save file {new_path}")
-                    continue
-
-                # Changing the saved path for the image
-                item.path = new_path
-
-            else:
-                self.log(f"Skipping {item.path} as it is already saved")
-
-    def _save_table(self, directory: Path) -> None:
-        """Saves a .xlsx file containing stats about the images of the project.
+    @staticmethod
+    def _show_save_error(path: Path) -> None:
+        """Displays an error window when an original image cannot be saved.
 
         Args:
-            directory: The path to the project folder.
+            path: The path to the image that couldn't be saved.
         """
 
-        # Creating the Excel file
-        workbook = Workbook(str(directory / str(directory.name + '.xlsx')))
-        worksheet = workbook.add_worksheet()
-
-        self.log(f"Saving an overview of the data as an Excel file at "
-                 f"{directory / str(directory.name + '.xlsx')}")
-
-        # Bold style for a nicer layout
-        bold = workbook.add_format({'bold': True, 'align': 'center'})
-
-        # Writing the labels
-        worksheet.write(0, 0, "Image names", bold)
-        worksheet.write(0, 1, "Total number of nuclei", bold)
-        worksheet.write(0, 2, "Number of tropomyosin positive nuclei", bold)
-        worksheet.write(0, 3, "Fusion index", bold)
-        worksheet.write(0, 4, "Fiber area ratio", bold)
-
-        # Setting the column widths
-        worksheet.set_column(
-            0, 0, width=max(11, max(len(file.name) for file
-                                    in self.table_items.file_names)
-                            if self.table_items else 0))
-        worksheet.set_column(1, 1, width=22)
-        worksheet.set_column(2, 2, width=37)
-        worksheet.set_column(3, 3, width=17)
-        worksheet.set_column(4, 4, width=16)
-
-        for i, item in enumerate(self.table_items):
-            # Writing the names of the images
-            worksheet.write(i + 2, 0, item.path.name)
-
-            # Writing the total number of nuclei
-            worksheet.write(i + 2, 1, len(item.nuclei))
-
-            # Writing the number of nuclei in fibers
-            worksheet.write(i + 2, 2, item.nuclei.nuclei_in_count)
-
-            # Writing the ratio of nuclei in over the total number of nuclei
-            if item.nuclei.nuclei_out_count > 0:
-                worksheet.write(i + 2, 3, item.nuclei.nuclei_in_count /
-                                len(item.nuclei))
-            else:
-                worksheet.write(i + 2, 3, 'NA')
-
-            # Writing the percentage area of fibers
-            worksheet.write(i + 2, 4, f'{item.fibers.area * 100:.2f}')
-
-        workbook.close()
-
-    def _save_overlay_images(self, directory: Path) -> None:
-        """Saves the images with the nuclei and fibers drawn on them.
-
-        Args:
-            directory: The path to the project folder.
-        """
-
-        # Creates the directory if it doesn't exist yet
-        if (directory / 'Overlay Images').is_dir():
-            rmtree(directory / 'Overlay Images')
-            self.log(f"Creating the folder for saving the overlay images at: "
-                     f"{directory / 'Overlay Images'}")
-        Path.mkdir(directory / 'Overlay Images')
-
-        self.log("Saving the overlay images")
-
-        # Saves the images
-        for entry in self.table_items:
-            self._draw_nuclei_save(entry, directory)
-
-    def _draw_nuclei_save(self,
-                          entry: TableEntry,
-                          project_name: Path) -> None:
-        """Draws fibers and nuclei on an images and then saves it.
-
-        Args:
-            entry: The table entry whose image to save.
-            project_name: The path to the project folder.
-        """
-
-        color_to_bgr = {'blue': (255, 0, 0),
-                        'green': (0, 255, 0),
-                        'red': (0, 0, 255),
-                        'yellow': (0, 255, 255),
-                        'cyan': (255, 255, 0),
-                        'magenta': (255, 0, 255),
-                        'black': (0, 0, 0),
-                        'white': (255, 255, 255),
-                        '#FFA500': (0, 165, 255),
-                        '#32CD32': (50, 205, 50),
-                        '#646464': (100, 100, 100)}
-
-        # Reads the image
-        cv_img = check_image(project_name / "Original Images" /
-                             entry.path.name)
-
-        destination = project_name / "Overlay Images" / entry.path.name
-
-        # Aborting if the image cannot be loaded
-        if cv_img is None:
-            self.log(f"Skipping the image {destination} as the original image "
-                     f"could not be loaded")
-            return
-
-        cv_img = cvtColor(cv_img, COLOR_RGB2BGR)
-
-        # Adjusting the indicator sizes to the size of the image
-        max_dim = max(cv_img.shape)
-        line_width = max(1, round(max_dim / 1080))
-        spot_size = max(1, round(max_dim / 1080 * 2))
-
-        # Drawing the fibers
-        for fib in entry.fibers:
-            positions = array(fib.position)
-            positions = positions.reshape((-1, 1, 2))
-            polylines(cv_img, [positions], True,
-                      color_to_bgr[self.image_canvas.fib_color], line_width)
-
-        # Drawing the nuclei
-        for nuc in entry.nuclei:
-            centre = (int(nuc.x_pos), int(nuc.y_pos))
-            if nuc.color == 'out':
-                ellipse(cv_img, centre, (spot_size, spot_size), 0, 0, 360,
-                        color_to_bgr[self.image_canvas.nuc_col_out], -1)
-            else:
-                ellipse(cv_img, centre, (spot_size, spot_size), 0, 0, 360,
-                        color_to_bgr[self.image_canvas.nuc_col_in], -1)
-
-        # Now saving the image
-        self.log(f"Saving the image {destination}")
-        imwrite(str(destination), cv_img)
+        messagebox.showerror(f'Error while saving the image !',
+                             f'Check that the image at {path} still exists '
+                             f'and that it is accessible.')
 
     def _set_layout(self) -> None:
         """Sets the layout of the frame by creating the canvas and the
@@ -642,12 +503,8 @@ class FilesTable(ttk.Frame):
             self.log(f"Skipping as it is already the current selected one")
             return
 
-        # Unselecting the previously selected entry
-        if self.table_items.selected is not None:
-            self.table_items.current_entry.graph_elt.selected.set(False)
-
-        # Selecting the new entry
-        entry.graph_elt.selected.set(True)
+        # Unselecting the previously selected entry and selecting the new one
+        self.table_items.select(index)
         self.table_items.current_index = index
 
         # Displaying the selected image with its nuclei and fibers
@@ -706,19 +563,17 @@ class FilesTable(ttk.Frame):
 
         self.log(f"Updating the data for the entry {entry.path}")
 
-        # To avoid repeated calls to the same attribute
-        nuclei = entry.nuclei
-        fibers = entry.fibers
+        # The summary doesn't require the data of the image to be loaded
+        summary = entry.summary
         items = entry.graph_elt
-        total_nuclei = len(nuclei)
 
         # Updating the labels
-        items.total.configure(text=f'Total : {total_nuclei}')
-        items.positive.configure(text=f'Positive : {nuclei.nuclei_in_count}')
-        if total_nuclei > 0:
+        items.total.configure(text=f'Total : {summary.nuclei}')
+        items.positive.configure(text=f'Positive : {summary.nuclei_in}')
+        if summary.nuclei > 0:
             items.ratio.configure(
                 text=f'Ratio : '
-                     f'{int(100 * nuclei.nuclei_in_count / total_nuclei)}%')
+                     f'{int(100 * summary.nuclei_in / summary.nuclei)}%')
         else:
             items.ratio.configure(text='Ratio : NA')
-        items.area.configure(text=f'Fiber area : {int(fibers.area * 100)}%')
+        items.area.configure(text=f'Fiber area : {int(summary.area * 100)}%')
@@ -8,8 +8,29 @@ from copy import deepcopy
 from pathlib import Path
 import logging
 from typing import Literal
+from collections import OrderedDict
 
-from .tools import Nucleus, Nuclei, Fibers, check_image, SelectionBox
+from .tools import (Nucleus, Nuclei, NucleiIndex, Fibers, check_image,
+                    SelectionBox, overlay_colors, ImageSource)
+
+# The size of the square tiles in which the image is displayed, in pixels
+_tile_size = 512
+
+# The maximum number of rendered tiles kept in memory, including the displayed
+# ones
+_max_tiles = 64
+
+# A tile of the displayed image, identified by its zoom level, the displayed
+# channels, and its column and row
+_TileKey = tuple[int, tuple[bool, bool, bool], int, int]
+
+# Above this number of nuclei, the nuclei are drawn on overlay tiles instead of
+# being individual canvas items
+_max_nuclei_items = 1000
+
+# A tile of the nuclei overlay, identified by its zoom level, its column and
+# its row
+_NucTileKey = tuple[int, int, int]
 
 
 class ImageCanvas(ttk.Frame):
@@ -29,27 +50,46 @@ class ImageCanvas(ttk.Frame):
         self._main_window = main_window
         self._settings = self._main_window.settings
 
-        self._set_layout()
-        self._set_bindings()
-
         self.log("Setting the images canvas's variables")
 
         self._image: Image.Image | None = None
+        self._pyramid: list[Image.Image] = list()
         self._image_path: Path | None = None
         self._img_scale: float = 1.0
         self._can_scale: float = 1.0
         self._delta: float = 1.3
         self._current_zoom: int = 0
         self._nuclei: Nuclei = Nuclei()
+        self._nuclei_index: NucleiIndex = NucleiIndex()
         self._fibers: Fibers = Fibers()
-        self._image_tk: ImageTk.PhotoImage | None = None
-        self._image_id: int | None = None
         self._selection_box: SelectionBox = SelectionBox()
 
+        # The rendered tiles of the image, from the least to the most recently
+        # used, and the canvas objects of the displayed ones
+        self._tiles: OrderedDict[_TileKey, ImageTk.PhotoImage] = OrderedDict()
+        self._tile_ids: dict[_TileKey, int] = dict()
+        self._render_after: str | None = None
+
+        # Objects used for the display of the nuclei when they are drawn on
+        # overlay tiles, i.e. the tiles and their canvas objects, and the
+        # positions of the nuclei to redraw once idle
+        self._nuc_rasterized: bool = False
+        self._nuc_tiles: dict[_NucTileKey, tuple[Image.Image,
+                                                 ImageTk.PhotoImage,
+                                                 int]] = dict()
+        self._nuc_changes: list[tuple[float, float]] = list()
+        self._nuc_after: str | None = None
+
         # Objects used for the display of the fiber overlay
         self._fib_overlay_tk: ImageTk.PhotoImage | None = None
         self._fib_overlay_idx: int | None = None
 
+        # The nuclei and fibers of the image while a preview is displayed
+        self._preview_backup: tuple[Nuclei, Fibers] | None = None
+
+        self._set_layout()
+        self._set_bindings()
+
     def log(self, msg: str) -> None:
         """Wrapper for reducing the verbosity of logging."""
 
@@ -59,17 +99,15 @@ class ImageCanvas(ttk.Frame):
         """Redraws the nuclei and/or fibers after the user changed the elements
         to display."""
 
-        # Show or hide the nuclei
+        # Show or hide the nuclei, whether they're items or overlay tiles
         if self._settings.show_nuclei.get():
             self.log(f"Showing all the {len(self._nuclei)} nuclei on the "
                      f"canvas")
-            for nuc in self._nuclei:
-                self._canvas.itemconfigure(nuc.tk_obj, state="normal")
+            self._canvas.itemconfigure('nuclei', state="normal")
         else:
-            self.log(f"Showing all the {len(self._nuclei)} nuclei on the "
+            self.log(f"Hiding all the {len(self._nuclei)} nuclei on the "
                      f"canvas")
-            for nuc in self._nuclei:
-                self._canvas.itemconfigure(nuc.tk_obj, state="hidden")
+            self._canvas.itemconfigure('nuclei', state="hidden")
 
         # Nothing more to do if there's no fiber overlay
         if self._fib_overlay_idx is None:
@@ -105,7 +143,9 @@ class ImageCanvas(ttk.Frame):
 
         # First, checking that the image can be loaded
         # Otherwise, all data would be lost !
-        if check_image(path)[0] is None:
+        try:
+            ImageSource(path).close()
+        except IOError:
             messagebox.showerror(f'Error while loading the image !',
                                  f'Check that the image at '
                                  f'{path} still exists and '
@@ -144,6 +184,7 @@ class ImageCanvas(ttk.Frame):
 
         # Resetting the variables
         self._image = None
+        self._pyramid = list()
         self._image_path = None
         self._img_scale = 1.0
         self._can_scale = 1.0
@@ -155,17 +196,76 @@ class ImageCanvas(ttk.Frame):
 
         # Resetting the fibers and nuclei objects
         self._nuclei = Nuclei()
+        self._nuclei_index = NucleiIndex()
         self._fibers = Fibers()
 
         # Removing the image from the canvas
-        if self._image_id is not None:
-            self._canvas.delete(self._image_id)
-        self._image_id = None
-        self._image_tk = None
+        for tile_id in self._tile_ids.values():
+            self._canvas.delete(tile_id)
+        self._tile_ids.clear()
+        self._tiles.clear()
+        if self._render_after is not None:
+            self.after_cancel(self._render_after)
+            self._render_after = None
 
         # Resetting the selection box
         self._selection_box = SelectionBox()
 
+        # The preview is dropped along with the image
+        self._preview_backup = None
+
+    def show_preview(self, nuclei: Nuclei, fibers: Fibers) -> None:
+        """Temporarily displays other nuclei and fibers than the ones of the
+        image, until :meth:`end_preview` is called.
+
+        Args:
+            nuclei: The Nuclei object containing the position and color of the
+                nuclei to preview.
+            fibers: The Fibers object containing the position of the fibers to
+                preview.
+        """
+
+        if self._image is None:
+            return
+
+        self.log(f"Previewing {len(nuclei)} nuclei and {len(fibers)} fibers "
+                 f"on the canvas")
+
+        # Keeping the actual nuclei and fibers for restoring them later
+        if self._preview_backup is None:
+            self._preview_backup = (self._nuclei, self._fibers)
+
+        self.delete_nuclei()
+        self.delete_fibers()
+        self._nuclei = nuclei
+        self._fibers = fibers
+        self.draw_nuclei()
+        self.draw_fibers()
+        self.set_indicators()
+
+    def end_preview(self) -> None:
+        """Displays again the nuclei and fibers of the image, if a preview was
+        being displayed."""
+
+        if self._preview_backup is None:
+            return
+
+        self.log("Ending the preview on the canvas")
+
+        self.delete_nuclei()
+        self.delete_fibers()
+        self._nuclei, self._fibers = self._preview_backup
+        self._preview_backup = None
+        self.draw_nuclei()
+        self.draw_fibers()
+        self.set_indicators()
+
+    @property
+    def image_path(self) -> Path | None:
+        """The path to the image currently displayed, if any."""
+
+        return self._image_path
+
     @property
     def nuc_col_out(self) -> str:
         """Returns the color of the nuclei outside of fibers, that depends on
@@ -175,64 +275,31 @@ class ImageCanvas(ttk.Frame):
         nor the one of fibers.
         """
 
-        num_to_color = {0: 'blue', 1: '#32CD32', 2: 'red'}
-        color_to_num = {'blue': 0, 'green': 1, 'red': 2}
-
-        fiber_num = color_to_num[self._settings.fiber_colour.get()]
-        nuclei_num = color_to_num[self._settings.nuclei_colour.get()]
-
-        if not (fiber_num == 2 and nuclei_num == 0):
-            return num_to_color[3 - fiber_num - nuclei_num]
-        # Special case when the fiber channel is red and the nuclei are blue
-        else:
-            return 'red'
+        return overlay_colors(self._settings.nuclei_colour.get(),
+                              self._settings.fiber_colour.get())[0]
 
     @property
     def nuc_col_in(self) -> str:
         """Returns the color of the nuclei inside fibers, that depends on the
         selected channels."""
 
-        if self._settings.nuclei_colour.get() == 'green':
-            if self._settings.fiber_colour.get() == 'red':
-                return 'magenta'
-            else:
-                return 'blue'
-
-        elif self._settings.nuclei_colour.get() == 'red':
-            if self._settings.fiber_colour.get() == 'blue':
-                return '#646464'
-            else:
-                return 'white'
-
-        return 'yellow'
+        return overlay_colors(self._settings.nuclei_colour.get(),
+                              self._settings.fiber_colour.get())[1]
 
     @property
     def fib_color(self) -> str:
         """returns the color of the fibers, that depends on the selected
         channels."""
 
-        if self._settings.fiber_colour.get() == 'green':
-            return 'magenta'
-
-        elif self._settings.fiber_colour.get() == 'blue':
-            if self._settings.nuclei_colour.get() == 'green':
-                return 'magenta'
-            else:
-                return 'white'
-
-        elif self._settings.fiber_colour.get() == 'red':
-            if self._settings.nuclei_colour.get() == 'green':
-                return 'cyan'
-            else:
-                return '#FFA500'
-
-        else:
-            raise ValueError(f"Got incorrect fiber color: "
-                             f"{self._settings.fiber_colour.get()}")
+        return overlay_colors(self._settings.nuclei_colour.get(),
+                              self._settings.fiber_colour.get())[2]
 
     def show_image(self, *_: Event) -> None:
         """Displays the image on the canvas.
 
+        Only the tiles of the image in the visible region are displayed, see
+        :meth:`_render_view`.
+
         Args:
             *_: Ignores the event in case the command was issued by one.
         """
@@ -244,27 +311,9 @@ class ImageCanvas(ttk.Frame):
 
         self.log(f"Displaying the image {self._image_path}")
 
-        # Keeping only the channels the user wants
-        multiplier = (self._settings.red_channel_bool.get(), 0, 0, 0,
-                      0, self._settings.green_channel_bool.get(), 0, 0,
-                      0, 0, self._settings.blue_channel_bool.get(), 0)
-        image = self._image.convert("RGB", multiplier)
-
-        # Resizing the image to the canvas size
-        scaled_x = int(image.width * self._img_scale)
-        scaled_y = int(image.height * self._img_scale)
-        image = image.resize((scaled_x, scaled_y))
-
-        # Delete previous image on canvas before creating new one
-        if self._image_id is not None:
-            self._canvas.delete(self._image_id)
-
-        # Actually displaying the image in the canvas
-        image_tk = ImageTk.PhotoImage(image)
-        self._image_id = self._canvas.create_image(0, 0, anchor='nw',
-                                                   image=image_tk)
-        self._canvas.lower(self._image_id)
-        self._image_tk = image_tk
+        # Setting the scrollable area to the size of the scaled image
+        scaled_x = int(self._image.width * self._img_scale)
+        scaled_y = int(self._image.height * self._img_scale)
         self._canvas.configure(scrollregion=(0, 0, scaled_x, scaled_y))
 
         # Moving the image to the top left corner if it doesn't fill the
@@ -273,7 +322,272 @@ class ImageCanvas(ttk.Frame):
             scaled_y < self._canvas.winfo_height()):
             self._canvas.xview_moveto(0),
             self._canvas.yview_moveto(0)
-    
+
+        self._render_view()
+
+    def _render_view(self) -> None:
+        """Displays the tiles of the image covering the visible region of the
+        canvas, and one more tile on each side.
+
+        The tiles that are not needed anymore are removed from the canvas, but
+        kept in a cache for when the user scrolls back to them. The missing
+        tiles are rendered using :meth:`_get_tile`.
+        """
+
+        self._render_after = None
+
+        if self._image is None:
+            return
+
+        channels = (self._settings.red_channel_bool.get(),
+                    self._settings.green_channel_bool.get(),
+                    self._settings.blue_channel_bool.get())
+        scaled_x = int(self._image.width * self._img_scale)
+        scaled_y = int(self._image.height * self._img_scale)
+        if scaled_x < 1 or scaled_y < 1:
+            return
+
+        # The tiles covering the visible region of the scaled image
+        left = int(self._canvas.canvasx(0))
+        top = int(self._canvas.canvasy(0))
+        columns = range(max(left // _tile_size - 1, 0),
+                        min((left + self._canvas.winfo_width()) // _tile_size,
+                            (scaled_x - 1) // _tile_size - 1) + 2)
+        rows = range(max(top // _tile_size - 1, 0),
+                     min((top + self._canvas.winfo_height()) // _tile_size,
+                         (scaled_y - 1) // _tile_size - 1) + 2)
+        needed = {(self._current_zoom, channels, column, row)
+                  for column in columns for row in rows}
+
+        # Removing the tiles that are not needed anymore from the canvas
+        for key in tuple(self._tile_ids):
+            if key not in needed:
+                self._canvas.delete(self._tile_ids.pop(key))
+
+        # Displaying the missing tiles
+        for key in sorted(needed.difference(self._tile_ids)):
+            *_, column, row = key
+            tile_id = self._canvas.create_image(
+                column * _tile_size, row * _tile_size, anchor='nw',
+                image=self._get_tile(key, scaled_x, scaled_y), tags='image')
+            self._canvas.lower(tile_id)
+            self._tile_ids[key] = tile_id
+
+        # Same goes for the tiles of the nuclei overlay, if it is used
+        needed = ({(self._current_zoom, column, row)
+                   for column in columns for row in rows}
+                  if self._nuc_rasterized else set())
+        for key in tuple(self._nuc_tiles):
+            if key not in needed:
+                self._canvas.delete(self._nuc_tiles.pop(key)[2])
+        for key in sorted(needed.difference(self._nuc_tiles)):
+            self._nuc_tiles[key] = self._draw_nuclei_tile(key, scaled_x,
+                                                          scaled_y)
+
+    def _get_tile(self,
+                  key: _TileKey,
+                  scaled_x: int,
+                  scaled_y: int) -> ImageTk.PhotoImage:
+        """Returns a tile of the image from the cache, or renders it.
+
+        The tile is cropped from the smallest level of the pyramid that is
+        still larger than the displayed image, and only then scaled and
+        filtered to keep the selected channels. The rendering time thus doesn't
+        depend on the size of the image.
+
+        Args:
+            key: The zoom level, displayed channels, column and row of the
+                tile.
+            scaled_x: The width of the scaled image.
+            scaled_y: The height of the scaled image.
+
+        Returns:
+            The rendered tile.
+        """
+
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+
+        _, channels, column, row = key
+        x_0, y_0 = column * _tile_size, row * _tile_size
+        x_1 = min(x_0 + _tile_size, scaled_x)
+        y_1 = min(y_0 + _tile_size, scaled_y)
+
+        # Selecting the smallest pyramid level larger than the scaled image
+        level = 0
+        while (level + 1 < len(self._pyramid)
+               and 2 ** (level + 1) * self._img_scale <= 1):
+            level += 1
+        factor = self._img_scale * 2 ** level
+
+        # Cropping and scaling the tile in a single step
+        image = self._pyramid[level].resize(
+            (x_1 - x_0, y_1 - y_0),
+            box=(x_0 / factor, y_0 / factor, x_1 / factor, y_1 / factor))
+
+        # Keeping only the channels the user wants
+        multiplier = (channels[0], 0, 0, 0,
+                      0, channels[1], 0, 0,
+                      0, 0, channels[2], 0)
+        tile = ImageTk.PhotoImage(image.convert("RGB", multiplier))
+        self._tiles[key] = tile
+
+        # Dropping the least recently used tiles, except the displayed ones
+        for old_key in tuple(self._tiles):
+            if len(self._tiles) <= _max_tiles:
+                break
+            if old_key not in self._tile_ids and old_key != key:
+                del self._tiles[old_key]
+
+        return tile
+
+    def _draw_nuclei_tile(self,
+                          key: _NucTileKey,
+                          scaled_x: int,
+                          scaled_y: int) -> tuple[Image.Image,
+                                                  ImageTk.PhotoImage, int]:
+        """Draws the nuclei on a transparent overlay tile, and adds it to the
+        canvas on top of the image.
+
+        Args:
+            key: The zoom level, column and row of the tile.
+            scaled_x: The width of the scaled image.
+            scaled_y: The height of the scaled image.
+
+        Returns:
+            The overlay, its displayed version, and its index on the canvas.
+        """
+
+        _, column, row = key
+        x_0, y_0 = column * _tile_size, row * _tile_size
+        x_1 = min(x_0 + _tile_size, scaled_x)
+        y_1 = min(y_0 + _tile_size, scaled_y)
+
+        overlay = Image.new("RGBA", (x_1 - x_0, y_1 - y_0), (0, 0, 0, 0))
+        self._draw_nuclei_region(overlay, (x_0, y_0), (x_0, y_0, x_1, y_1))
+        overlay_tk = ImageTk.PhotoImage(overlay)
+
+        # Keeping the overlay between the image and the fibers
+        overlay_idx = self._canvas.create_image(
+            x_0, y_0, anchor='nw', image=overlay_tk, tags='nuclei',
+            state='normal' if self._settings.show_nuclei.get() else 'hidden')
+        if self._fib_overlay_idx is not None:
+            self._canvas.tag_lower(overlay_idx, self._fib_overlay_idx)
+
+        return overlay, overlay_tk, overlay_idx
+
+    def _draw_nuclei_region(self,
+                            overlay: Image.Image,
+                            origin: tuple[int, int],
+                            region: tuple[float, float, float, float]) -> None:
+        """Draws on an overlay tile all the nuclei overlapping a given region.
+
+        Args:
+            overlay: The overlay tile on which to draw.
+            origin: The position of the top left corner of the tile on the
+                scaled image.
+            region: The left, top, right and bottom limits of the region on
+                the scaled image.
+        """
+
+        radius = max(int(3.0 * self._can_scale), 1)
+        left, top, right, bottom = region
+        x_0, y_0 = origin
+        color_in = ImageColor.getrgb(self.nuc_col_in)
+        color_out = ImageColor.getrgb(self.nuc_col_out)
+
+        draw = ImageDraw.Draw(overlay)
+        for index in self._nuclei_index.in_box(
+                (left - radius) / self._img_scale,
+                (top - radius) / self._img_scale,
+                (right + radius) / self._img_scale,
+                (bottom + radius) / self._img_scale):
+            nuc = self._nuclei[index]
+            x = nuc.x_pos * self._img_scale - x_0
+            y = nuc.y_pos * self._img_scale - y_0
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                         fill=color_in if nuc.color == 'in' else color_out)
+
+    def _nucleus_changed(self, nuc: Nucleus) -> None:
+        """Plans the redrawing of the nuclei overlay around a nucleus that was
+        added, inverted, or deleted.
+
+        The changes are redrawn all at once when idle, so that editing many
+        nuclei at once only redraws the affected tiles once.
+
+        Args:
+            nuc: The Nucleus object that changed.
+        """
+
+        if not self._nuc_rasterized:
+            return
+
+        self._nuc_changes.append((nuc.x_pos, nuc.y_pos))
+        if self._nuc_after is None:
+            self._nuc_after = self.after_idle(self._redraw_nuclei)
+
+    def _redraw_nuclei(self) -> None:
+        """Redraws the region of the displayed nuclei overlay tiles where
+        nuclei were changed.
+
+        On each tile, the region including all the changed nuclei is cleared
+        and the nuclei overlapping it are drawn again.
+        """
+
+        self._nuc_after = None
+        changes, self._nuc_changes = self._nuc_changes, list()
+        radius = max(int(3.0 * self._can_scale), 1) + 1
+
+        # Getting the region to redraw on each displayed tile
+        regions: dict[_NucTileKey, list[float]] = dict()
+        for x, y in changes:
+            x, y = x * self._img_scale, y * self._img_scale
+            for column in range(max(int(x - radius) // _tile_size, 0),
+                                int(x + radius) // _tile_size + 1):
+                for row in range(max(int(y - radius) // _tile_size, 0),
+                                 int(y + radius) // _tile_size + 1):
+                    key = (self._current_zoom, column, row)
+                    if key not in self._nuc_tiles:
+                        continue
+                    region = regions.setdefault(key, [x, y, x, y])
+                    region[:] = (min(region[0], x), min(region[1], y),
+                                 max(region[2], x), max(region[3], y))
+
+        # Clearing and redrawing the regions
+        for (_, column, row), region in regions.items():
+            overlay, overlay_tk, _ = self._nuc_tiles[(self._current_zoom,
+                                                      column, row)]
+            x_0, y_0 = column * _tile_size, row * _tile_size
+            left, top = region[0] - radius, region[1] - radius
+            right, bottom = region[2] + radius, region[3] + radius
+            overlay.paste((0, 0, 0, 0),
+                          (max(int(left) - x_0, 0), max(int(top) - y_0, 0),
+                           min(int(right) + 1 - x_0, overlay.width),
+                           min(int(bottom) + 1 - y_0, overlay.height)))
+            self._draw_nuclei_region(overlay, (x_0, y_0),
+                                     (left, top, right, bottom))
+            overlay_tk.paste(overlay)
+
+    def _view_changed(self,
+                      scrollbar: ttk.Scrollbar,
+                      first: str,
+                      last: str) -> None:
+        """Updates a scrollbar when the visible region of the canvas changes,
+        and renders the newly visible region of the image once idle.
+
+        Args:
+            scrollbar: The scrollbar to update.
+            first: The fraction of the scrollable area before the visible
+                region.
+            last: The fraction of the scrollable area up to the end of the
+                visible region.
+        """
+
+        scrollbar.set(first, last)
+        if self._image is not None and self._render_after is None:
+            self._render_after = self.after_idle(self._render_view)
+
     def delete_nuclei(self) -> None:
         """Removes all nuclei from the canvas, but doesn't delete the nuclei
         objects."""
@@ -283,7 +597,17 @@ class ImageCanvas(ttk.Frame):
         for nuc in self._nuclei:
             if nuc.tk_obj is not None:
                 self._canvas.delete(nuc.tk_obj)
-                nuc.tk_obj = None
+        self._nuclei.clear_tk_objs()
+
+        # Deleting the overlay tiles, if the nuclei were drawn on them
+        for *_, overlay_idx in self._nuc_tiles.values():
+            self._canvas.delete(overlay_idx)
+        self._nuc_tiles.clear()
+        self._nuc_rasterized = False
+        self._nuc_changes.clear()
+        if self._nuc_after is not None:
+            self.after_cancel(self._nuc_after)
+            self._nuc_after = None
 
     def delete_fibers(self) -> None:
         """Removes all fibers from the canvas, but doesn't delete the fibers
@@ -300,15 +624,33 @@ class ImageCanvas(ttk.Frame):
         self._fib_overlay_tk = None
 
     def draw_nuclei(self) -> None:
-        """Draws all the nuclei on the canvas, in hidden mode."""
+        """Draws all the nuclei on the canvas, in hidden mode.
+
+        If there are too many nuclei for drawing each of them as a canvas item,
+        they are instead drawn on overlay tiles covering the visible region of
+        the image. These tiles are drawn again at each zoom level and when
+        scrolling, see :meth:`_render_view`.
+
+        The spatial index of the nuclei is also rebuilt here.
+        """
+
+        self._nuclei_index.build(self._nuclei)
+
+        if len(self._nuclei) > _max_nuclei_items:
+            self.log(f"Drawing all the {len(self._nuclei)} nuclei on overlay "
+                     f"tiles")
+            self._nuc_rasterized = True
+            self._render_view()
+            return
 
         self.log(f"Drawing all the {len(self._nuclei)} nuclei on the "
                  f"canvas in hidden mode")
-        for nuc in self._nuclei:
-            nuc.tk_obj = self._draw_nucleus(
+        for index in self._nuclei.indexes().tolist():
+            nuc = self._nuclei[index]
+            self._nuclei.set_tk_obj(index, self._draw_nucleus(
                 nuc.x_pos, nuc.y_pos,
                 self.nuc_col_in if nuc.color == 'in'
-                else self.nuc_col_out, 'hidden')
+                else self.nuc_col_out, 'hidden'))
 
     def draw_fibers(self) -> None:
         """Creates a transparent overlay on which the outline of the detected
@@ -388,9 +730,12 @@ class ImageCanvas(ttk.Frame):
         self._hbar.pack(fill='x')
         self._hbar.config(command=self._canvas.xview)
 
-        # Linking the scrollbars to the canvas
-        self._canvas.config(yscrollcommand=self._vbar.set)
-        self._canvas.config(xscrollcommand=self._hbar.set)
+        # Linking the scrollbars to the canvas, the image being rendered again
+        # whenever the visible region changes
+        self._canvas.config(yscrollcommand=partial(self._view_changed,
+                                                   self._vbar))
+        self._canvas.config(xscrollcommand=partial(self._view_changed,
+                                                   self._hbar))
         self._canvas.configure(xscrollincrement='1', yscrollincrement='1')
 
         # Finally, applying the changes
@@ -460,7 +805,7 @@ class ImageCanvas(ttk.Frame):
         # Actually drawing the nucleus
         return self._canvas.create_oval(
             x - radius, y - radius, x + radius, y + radius,
-            fill=color, outline='#fff', width=0, state=state)
+            fill=color, outline='#fff', width=0, state=state, tags='nuclei')
 
     def _draw_box(self) -> int:
         """Draws the selection box for either inverting the nuclei or deleting
@@ -604,9 +949,8 @@ class ImageCanvas(ttk.Frame):
                  f"{self._selection_box.y_end})")
 
         # Inverting all the nuclei found inside the selection box
-        for nuc in self._nuclei:
-            if self._selection_box.is_inside(nuc.x_pos, nuc.y_pos):
-                self._invert_nucleus(nuc)
+        for index in self._nuclei_index.in_box(*self._selection_box.limits):
+            self._invert_nucleus(index)
 
     def _left_release_nucleus(self, event: Event) -> None:
         """Upon left click, either adds a new nucleus or a fiber, or switches
@@ -633,11 +977,11 @@ class ImageCanvas(ttk.Frame):
             return
 
         # Trying to find a close nucleus
-        nuc = self._find_closest_nucleus(abs_x, abs_y)
+        index = self._find_closest_nucleus(abs_x, abs_y)
 
         # One close nucleus found, inverting it color
-        if nuc is not None:
-            self._invert_nucleus(nuc)
+        if index is not None:
+            self._invert_nucleus(index)
 
         # No close nucleus found, adding a new one
         else:
@@ -701,14 +1045,9 @@ class ImageCanvas(ttk.Frame):
                  f"{self._selection_box.x_end}, "
                  f"{self._selection_box.y_end})")
 
-        to_delete = list()
-        # Detecting all the nuclei to delete
-        for nuc in self._nuclei:
-            if self._selection_box.is_inside(nuc.x_pos, nuc.y_pos):
-                to_delete.append(nuc)
-        # Actually deleting the detected nuclei
-        for nuc in to_delete:
-            self._delete_nucleus(nuc)
+        # Deleting all the nuclei found inside the selection box
+        for index in self._nuclei_index.in_box(*self._selection_box.limits):
+            self._delete_nucleus(index)
 
     def _right_release_nucleus(self, event: Event) -> None:
         """Method called when the user releases the right mouse button but did
@@ -739,41 +1078,29 @@ class ImageCanvas(ttk.Frame):
             return
 
         # Trying to find a close nucleus
-        nuc = self._find_closest_nucleus(abs_x, abs_y)
+        index = self._find_closest_nucleus(abs_x, abs_y)
 
         # One close nucleus found, deleting it
-        if nuc is not None:
-            self._delete_nucleus(nuc)
+        if index is not None:
+            self._delete_nucleus(index)
 
-    def _find_closest_nucleus(self, x: float, y: float) -> Nucleus | None:
-        """Searches for a close nucleus among the existing nuclei.
+    def _find_closest_nucleus(self, x: float, y: float) -> int | None:
+        """Searches for a close nucleus among the existing nuclei, using their
+        spatial index.
 
         Args:
             x: The x position where to search for a nucleus.
             y: The y position where to search for a nucleus.
 
         Returns:
-            The Nucleus object closest to the given coordinates, if any close
-            enough nucleus was found.
+            The index of the nucleus closest to the given coordinates, if any
+            close enough nucleus was found.
         """
 
         # Adjusting the search radius to the scale
         radius = max(3.0 * self._can_scale / self._img_scale, 3.0)
 
-        closest_nuc = None
-        closest_distance = None
-
-        # Iterating over the nuclei
-        for nuc in self._nuclei:
-            # Keeping only those within the radius of search
-            if abs(x - nuc.x_pos) <= radius and abs(y - nuc.y_pos) <= radius:
-                dis_sq = (nuc.x_pos - x) ** 2 + (nuc.y_pos - y) ** 2
-                # Keeping only the closest one
-                if closest_distance is None or dis_sq < closest_distance:
-                    closest_distance = dis_sq
-                    closest_nuc = nuc
-
-        return closest_nuc if closest_nuc is not None else None
+        return self._nuclei_index.closest(x, y, radius)
 
     def _add_nucleus(self, abs_x: float, abs_y: float) -> None:
         """Creates a Nucleus object, displays it and saves it to the nuclei
@@ -788,36 +1115,39 @@ class ImageCanvas(ttk.Frame):
 
         # Creating the nucleus and displaying it
         new_nuc = Nucleus(abs_x, abs_y,
-                          self._draw_nucleus(abs_x, abs_y,
-                                             self.nuc_col_out,
-                                             'normal'),
+                          None if self._nuc_rasterized
+                          else self._draw_nucleus(abs_x, abs_y,
+                                                  self.nuc_col_out,
+                                                  'normal'),
                           'out')
 
         self.log(f"Added nucleus at position ({abs_x}, {abs_y})")
 
         # Adding the nucleus to the nuclei table and to the current nuclei
         self.nuclei_table.add_nucleus(new_nuc)
-        self._nuclei.append(new_nuc)
+        self._nuclei_index.add(self._nuclei.append(new_nuc))
+        self._nucleus_changed(new_nuc)
 
         # Setting the unsaved status
         self._main_window.set_unsaved_status()
 
-    def _invert_nucleus(self, nuc: Nucleus) -> None:
+    def _invert_nucleus(self, index: int) -> None:
         """Inverts the color and status of a given nucleus.
 
         Also sets the unsaved status for the current project.
 
         Args:
-            nuc: The Nucleus object to invert
+            index: The index of the nucleus to invert.
         """
 
         # Updating the display
-        if nuc.color == 'out':
-            self._canvas.itemconfig(nuc.tk_obj, fill=self.nuc_col_in)
-            nuc.color = 'in'
-        else:
-            self._canvas.itemconfig(nuc.tk_obj, fill=self.nuc_col_out)
-            nuc.color = 'out'
+        self._nuclei.invert_at(index)
+        nuc = self._nuclei[index]
+        if nuc.tk_obj is not None:
+            self._canvas.itemconfig(nuc.tk_obj, fill=self.nuc_col_in
+                                    if nuc.color == 'in'
+                                    else self.nuc_col_out)
+        self._nucleus_changed(nuc)
 
         self.log(f"Inverted nucleus at position ({nuc.x_pos}, {nuc.y_pos})")
 
@@ -827,19 +1157,23 @@ class ImageCanvas(ttk.Frame):
         # Setting the unsaved status
         self._main_window.set_unsaved_status()
 
-    def _delete_nucleus(self, nuc: Nucleus) -> None:
-        """Deletes a given Nucleus and all the references to it.
+    def _delete_nucleus(self, index: int) -> None:
+        """Deletes a given nucleus and all the references to it.
 
         Also sets the unsaved status for the current project.
 
         Args:
-            nuc: The Nucleus object to delete
+            index: The index of the nucleus to delete.
         """
 
         # Deleting all the references to the nucleus to delete
+        nuc = self._nuclei[index]
         self.nuclei_table.remove_nucleus(nuc)
-        self._canvas.delete(nuc.tk_obj)
-        self._nuclei.remove(nuc)
+        if nuc.tk_obj is not None:
+            self._canvas.delete(nuc.tk_obj)
+        self._nuclei_index.remove(index)
+        self._nuclei.remove_at(index)
+        self._nucleus_changed(nuc)
 
         self.log(f"Deleted nucleus at position ({nuc.x_pos}, {nuc.y_pos})")
 
@@ -869,6 +1203,15 @@ class ImageCanvas(ttk.Frame):
             return
 
         self._image = Image.fromarray(cv_img)
+        del cv_img
+
+        # Building the pyramid of downsampled images, each level being half the
+        # size of the previous one
+        self._pyramid = [self._image]
+        while max(self._pyramid[-1].size) > 512:
+            self._pyramid.append(self._pyramid[-1].reduce(2))
+        self.log(f"Built a pyramid of {len(self._pyramid)} levels for the "
+                 f"image")
 
         # Getting the different parameters of interest
         can_width = self._canvas.winfo_width()
@@ -1,29 +1,199 @@
 # coding: utf-8
 
 import cellpose.models
+import cellpose.dynamics
+import cellpose.transforms
+import cellpose.utils
 import numpy as np
-import numpy.ma as ma
 from pathlib import Path
 import cv2
+from math import ceil, prod
 from typing import Any
+from dataclasses import dataclass, field
+from collections.abc import Iterable, Iterator, Sequence
 from collections import defaultdict
+from queue import Queue, Full, Empty
+from threading import Thread, Event
 
-from .tools import check_image
+from .tools import load_channels, SegmentationCache, ImageSource
+from .__version__ import __version__
 
 # Table for converting color strings to channels, assuming RGB images
 numpy_color_to_int = {"red": 0,
                       "green": 1,
                       "blue": 2}
 
+# Identifies the Cellpose model, for invalidating the cached labeled images
+model_version = f"cellpose-{cellpose.version}-nuclei"
+
+# Instance of the segmentation class used in each worker process of the
+# processing pool
+_worker_segmentation: 'ImageSegmentation | None' = None
+
+# Margins added around the tiles of the images processed in tiles, so that the
+# nuclei and the holes in the fibers crossing a seam are entirely contained in
+# at least one tile
+_nuclei_margin = 64
+_fiber_margin = 64
+
+# Maximum size of the downsampled copy of the images processed in tiles, used
+# for computing the thresholds common to all the tiles
+_overview_size = 2048
+
+# The size of the square tiles sent through the Cellpose network, their
+# overlap, and the default number of tiles in a batch
+_cellpose_tile = 224
+_cellpose_overlap = 0.1
+_cellpose_batch = 8
+
+# Maximum number of tiles in a batch when the tiles of several images are sent
+# through the network together, limiting the memory usage
+_max_batch_tiles = 128
+
+# A region of an image, as slices along the rows and the columns
+Region = tuple[slice, slice]
+
+
+def _put(queue: Queue, item: Any, closed: Event) -> None:
+    """Puts an item in a bounded queue of the pipeline, unless the pipeline
+    gets closed while waiting for a free slot."""
+
+    while not closed.is_set():
+        try:
+            queue.put(item, block=True, timeout=0.1)
+            return
+        except Full:
+            pass
+
+
+def _get(queue: Queue, closed: Event) -> Any:
+    """Gets an item from a queue of the pipeline, or returns None if the
+    pipeline gets closed while waiting for an item."""
+
+    while not closed.is_set():
+        try:
+            return queue.get(block=True, timeout=0.1)
+        except Empty:
+            pass
+    return None
+
+
+def _split_tiles(shape: tuple[int, int], tile_size: int) -> list[Region]:
+    """Splits an image into a grid of non-overlapping tiles, all having roughly
+    the same shape and at most the given size.
+
+    Args:
+        shape: The height and width of the image.
+        tile_size: The maximum size of the tiles along any dimension.
+
+    Returns:
+        The regions covered by the tiles, row by row.
+    """
+
+    rows = np.linspace(0, shape[0], ceil(shape[0] / tile_size) + 1,
+                       dtype=np.int64)
+    columns = np.linspace(0, shape[1], ceil(shape[1] / tile_size) + 1,
+                          dtype=np.int64)
+    return [(slice(int(top), int(bottom)), slice(int(left), int(right)))
+            for top, bottom in zip(rows[:-1], rows[1:])
+            for left, right in zip(columns[:-1], columns[1:])]
+
+
+def _count_network_tiles(shape: tuple[int, int]) -> int:
+    """Returns the number of tiles in which Cellpose splits an image of the
+    given shape before sending it through the network.
+
+    It follows the computation of :func:`cellpose.core.run_net`, for images
+    that are not rescaled and without augmentation.
+    """
+
+    ypad1, ypad2, xpad1, xpad2 = cellpose.transforms.get_pad_yx(*shape)
+    padded = (shape[0] + ypad1 + ypad2, shape[1] + xpad1 + xpad2)
+    return prod(1 if size <= _cellpose_tile else
+                ceil((1 + 2 * _cellpose_overlap) * size / _cellpose_tile)
+                for size in padded)
+
+
+def _expand(region: Region, margin: int, shape: tuple[int, int]) -> Region:
+    """Expands a region by a margin on all sides, without exceeding the
+    image."""
+
+    return tuple(slice(max(part.start - margin, 0),
+                       min(part.stop + margin, size))
+                 for part, size in zip(region, shape))
+
+
+@dataclass
+class _DecodedImage:
+    """Class holding the data of an image being processed, passed between the
+    stages of the segmentation."""
+
+    path: Path
+    digest: str
+    nuclei_channel: np.ndarray | None
+    mask: np.ndarray
+    fiber_contours: tuple[Any, ...]
+    area: float
+    labeled_image: np.ndarray | None = None
+
+
+@dataclass
+class _TiledImage(_DecodedImage):
+    """Class holding the data of an image processed in tiles.
+
+    Only the fiber mask is kept at full resolution. The nuclei channel is None
+    if the image can be read region by region from the disk, and the nuclei
+    are directly reduced to their statistics instead of a labeled image.
+    """
+
+    tiles: list[Region] = field(default_factory=list)
+    bounds: tuple[int, int] = (0, 255)
+    fibers: tuple[list[np.ndarray], ...] = ()
+    boxes: np.ndarray | None = None
+    stats: tuple[np.ndarray, ...] | None = None
+
+
+@dataclass
+class _PreviewImage:
+    """Class holding a downsampled copy of an already processed image, used
+    for previewing the effect of the settings."""
+
+    path: Path
+    nuclei_color: str
+    fiber_color: str
+    scale: float
+    nuclei_channel: np.ndarray
+    fiber_channel: np.ndarray
+    labeled_image: np.ndarray
+    filtered: tuple[float, np.ndarray] | None = None
+
 
 class ImageSegmentation:
     """Class for processing images, detecting fibers and nuclei."""
 
-    def __init__(self) -> None:
-        """Simply loads the Mesmer library."""
+    def __init__(self,
+                 cache_folder: Path | None = None,
+                 tile_size: int | None = None) -> None:
+        """Simply loads the Mesmer library.
+
+        The fiber masks and the labeled images are always cached in memory, so
+        that processing again the same image with different settings does not
+        run Cellpose again.
+
+        Args:
+            cache_folder: If given, the fiber masks and the labeled images are
+                also cached in this folder, and reused when processing again
+                the same image in a later session.
+            tile_size: If given and not 0, the images larger than this size
+                along any dimension are processed in overlapping tiles of at
+                most this size, which bounds the memory usage.
+        """
 
         self._app = cellpose.models.CellposeModel(diam_mean=17,
                                                   model_type='nuclei')
+        self.cache: SegmentationCache = SegmentationCache(cache_folder)
+        self.tile_size: int | None = tile_size
+        self._preview_image: _PreviewImage | None = None
 
     def __call__(self,
                  path: Path,
@@ -66,47 +236,600 @@ class ImageSegmentation:
             over the total area.
         """
 
+        # Decoding the image and detecting the fibers
+        image = self._decode_stage(path, nuclei_color, fiber_color,
+                                   minimum_fiber_intensity,
+                                   maximum_fiber_intensity)
+
+        # Detecting the nuclei
+        self._detect_nuclei((image,), nuclei_color, minimum_nucleus_diameter)
+
+        # Getting the position of the nuclei
+        return self._post_processing_stage(image, minimum_nucleus_intensity,
+                                           maximum_nucleus_intensity,
+                                           minimum_nuclei_count)
+
+    def pipeline(self,
+                 jobs: Iterable[tuple[Any, ...]],
+                 decode_depth: int,
+                 post_processing_depth: int,
+                 abort: Event | None = None
+                 ) -> Iterator[tuple[Path, tuple[Any, ...] | Exception]]:
+        """Processes a sequence of images in three concurrent stages.
+
+        The images are decoded and their fibers detected in a first thread,
+        the nuclei are detected by Cellpose in a second one, and their
+        positions are computed in a third one. The stages are connected by
+        bounded queues, so that the next images are already decoded when
+        Cellpose becomes available.
+
+        Args:
+            jobs: An iterable of tuples containing the arguments of
+                :meth:`__call__`, for each image to process. It is consumed
+                from the decoding thread.
+            decode_depth: The maximum number of decoded images waiting for
+                Cellpose.
+            post_processing_depth: The maximum number of labeled images waiting
+                for post-processing.
+            abort: If given and set, the images that haven't been processed yet
+                are skipped.
+
+        Returns:
+            An iterator yielding, in the same order as the jobs, the path to
+            each processed image and either the output of :meth:`__call__` or
+            the exception raised while processing it.
+        """
+
+        closed = Event()
+        decoded = Queue(maxsize=max(decode_depth, 1))
+        labeled = Queue(maxsize=max(post_processing_depth, 1))
+        results = Queue()
+
+        def skip() -> bool:
+            """Indicates whether the remaining images should be skipped."""
+
+            return abort is not None and abort.is_set()
+
+        def decode() -> None:
+            """First stage, decodes the images and detects the fibers."""
+
+            try:
+                for job in jobs:
+                    if closed.is_set():
+                        return
+                    if skip():
+                        continue
+                    try:
+                        data = self._decode_stage(*job[:5])
+                    except Exception as exc:
+                        data = exc
+                    _put(decoded, (job, data), closed)
+            finally:
+                _put(decoded, None, closed)
+
+        def infer() -> None:
+            """Second stage, detects the nuclei using Cellpose."""
+
+            while (item := _get(decoded, closed)) is not None:
+                job, data = item
+                if skip():
+                    continue
+                if not isinstance(data, Exception):
+                    try:
+                        self._detect_nuclei((data,), job[1], job[7])
+                    except Exception as exc:
+                        data = exc
+                _put(labeled, (job, data), closed)
+            _put(labeled, None, closed)
+
+        def post_process() -> None:
+            """Third stage, computes the positions of the nuclei."""
+
+            while (item := _get(labeled, closed)) is not None:
+                job, data = item
+                if skip():
+                    continue
+                if not isinstance(data, Exception):
+                    try:
+                        data = self._post_processing_stage(data, *job[5:7],
+                                                           job[8])
+                    except Exception as exc:
+                        data = exc
+                results.put_nowait((job[0], data))
+            results.put_nowait(None)
+
+        threads = [Thread(target=target, daemon=True)
+                   for target in (decode, infer, post_process)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while (item := results.get()) is not None:
+                yield item
+        finally:
+            # Unblocks the stages if the iteration is interrupted
+            closed.set()
+
+    def batch(self,
+              paths: Sequence[Path],
+              nuclei_color: str,
+              fiber_color: str,
+              minimum_fiber_intensity: int,
+              maximum_fiber_intensity: int,
+              minimum_nucleus_intensity: int,
+              maximum_nucleus_intensity: int,
+              minimum_nucleus_diameter: int,
+              minimum_nuclei_count: int,
+              max_images: int = 8
+              ) -> list[tuple[Path, tuple[Any, ...] | Exception]]:
+        """Processes several images with the same settings, running Cellpose
+        on groups of images rather than on one image at a time.
+
+        The images having the same shape are grouped, and the tiles of the
+        images of a group are sent through the network in shared batches, of
+        at most _max_batch_tiles tiles. This is much faster than
+        :meth:`__call__` for many images. The images processed in tiles are
+        not grouped.
+
+        Args:
+            paths: The paths to the images to process.
+            nuclei_color: The color of the nuclei, as a string.
+            fiber_color: The color of the fibers, as a string.
+            minimum_fiber_intensity: The gray level intensity above which a
+                pixel is considered to be part of a fiber.
+            maximum_fiber_intensity: The gray level intensity below which a
+                pixel is considered to be part of a fiber.
+            minimum_nucleus_intensity: Any nucleus whose average brightness is
+                lower than this value will be discarded.
+            maximum_nucleus_intensity: Any nucleus whose average brightness is
+                greater than this value will be discarded.
+            minimum_nucleus_diameter: Objects whose area is lower than this
+                value (in pixels) will not be considered.
+            minimum_nuclei_count: Nuclei located in a fiber containing less
+                than this number of positive nuclei will be counted as
+                negative.
+            max_images: The maximum number of images in a group, limiting the
+                memory usage.
+
+        Returns:
+            A list containing, in the same order as the paths, the path to each
+            processed image and either the output of :meth:`__call__` or the
+            exception raised while processing it.
+        """
+
+        results: list[tuple[Path, tuple[Any, ...] | Exception] | None] = \
+            [None] * len(paths)
+        groups: dict[tuple[int, ...], list[tuple[int, _DecodedImage]]] = \
+            defaultdict(list)
+
+        def flush(shape: tuple[int, ...]) -> None:
+            """Detects the nuclei on a group of images, and post-processes
+            them."""
+
+            group = groups.pop(shape)
+            try:
+                self._detect_nuclei([image for _, image in group],
+                                    nuclei_color, minimum_nucleus_diameter)
+            except Exception as exc:
+                for index, _ in group:
+                    results[index] = (paths[index], exc)
+                return
+
+            for index, image in group:
+                try:
+                    results[index] = (paths[index],
+                                      self._post_processing_stage(
+                                          image, minimum_nucleus_intensity,
+                                          maximum_nucleus_intensity,
+                                          minimum_nuclei_count))
+                except Exception as exc:
+                    results[index] = (paths[index], exc)
+
+        for index, path in enumerate(paths):
+            # Decoding the image and detecting the fibers
+            try:
+                image = self._decode_stage(path, nuclei_color, fiber_color,
+                                           minimum_fiber_intensity,
+                                           maximum_fiber_intensity)
+            except Exception as exc:
+                results[index] = (path, exc)
+                continue
+
+            # Running Cellpose as soon as a group is full, the images processed
+            # in tiles being never grouped with other images
+            tiled = isinstance(image, _TiledImage)
+            shape = (index,) if tiled else image.nuclei_channel.shape
+            groups[shape].append((index, image))
+            if tiled or len(groups[shape]) >= max_images:
+                flush(shape)
+
+        # Processing the groups that are not full
+        for shape in tuple(groups):
+            flush(shape)
+
+        return results
+
+    def _decode_stage(self,
+                      path: Path,
+                      nuclei_color: str,
+                      fiber_color: str,
+                      minimum_fiber_intensity: int,
+                      maximum_fiber_intensity: int) -> _DecodedImage:
+        """Loads an image and detects the fibers on it.
+
+        The fiber mask is retrieved from the cache if possible. The images
+        larger than the tile size are processed in tiles, see
+        :meth:`_decode_tiled`.
+
+        Args:
+            path: The path to the image to process.
+            nuclei_color: The color of the nuclei, as a string.
+            fiber_color: The color of the fibers, as a string.
+            minimum_fiber_intensity: The gray level intensity above which a
+                pixel is considered to be part of a fiber.
+            maximum_fiber_intensity: The gray level intensity below which a
+                pixel is considered to be part of a fiber.
+
+        Returns:
+            The decoded image, with its fiber mask, fiber contours and fiber
+            area.
+        """
+
         # Converting colors from string to int
         colors = [numpy_color_to_int[nuclei_color],
                   numpy_color_to_int[fiber_color]]
 
-        # Loads the image and keeps only the nuclei and fibers channels
-        image = check_image(path)
+        # Identifying the image content, for retrieving the cached results
+        digest = self.cache.digest(path)
 
         # The image couldn't be loaded
-        if image is None:
+        try:
+            source = ImageSource(path)
+        except IOError:
             raise IOError("Could not load the image for segmentation, "
                           "aborting !")
 
-        nuclei_channel = image[:, :, colors[0]]
-        fiber_channel = image[:, :, colors[1]]
+        with source:
+            # Large images are processed in tiles
+            if self.tile_size and max(source.shape) > self.tile_size:
+                return self._decode_tiled(source, path, digest, nuclei_color,
+                                          fiber_color,
+                                          minimum_fiber_intensity,
+                                          maximum_fiber_intensity)
+
+            # Loads only the nuclei and fibers channels of the image
+            channels = source.read(colors)
+
+        # Copying the nuclei channel so that the decoded image can be freed
+        nuclei_channel = np.ascontiguousarray(channels[0])
+        fiber_channel = channels[1]
+
+        del channels
+
+        # Getting the fiber mask, from the cache if possible
+        key = ('fiber_mask', digest, nuclei_color, fiber_color,
+               minimum_fiber_intensity, maximum_fiber_intensity, __version__)
+        mask = self.cache.get(key)
+        if mask is None:
+            mask = self._get_fiber_mask(fiber_channel,
+                                        nuclei_channel,
+                                        minimum_fiber_intensity,
+                                        maximum_fiber_intensity)
+            self.cache.put(key, mask)
 
-        del image
+        del fiber_channel
 
-        small_objects_threshold = int(minimum_nucleus_diameter ** 2
-                                      * np.pi / 4)
+        # Calculating the area of fibers over the total area
+        area = np.count_nonzero(mask) / mask.shape[0] / mask.shape[1]
 
-        # Image to pass to CellPose
-        if nuclei_channel.max() > nuclei_channel.min():
-            x = np.stack(((nuclei_channel - nuclei_channel.min()) /
-                          (nuclei_channel.max() - nuclei_channel.min()),
-                          np.zeros_like(nuclei_channel)),
-                         axis=-1)
-        else:
-            x = np.stack((np.full_like(nuclei_channel, 1.0),
-                          np.zeros_like(nuclei_channel)),
-                         axis=-1)
+        # Finding the contours of the fibers
+        mask_8_bits = (mask * 255).astype('uint8')
+        fiber_contours, _ = cv2.findContours(mask_8_bits, cv2.RETR_LIST,
+                                             cv2.CHAIN_APPROX_SIMPLE)
+        fiber_contours = tuple(map(np.squeeze, fiber_contours))
 
-        # Actual nuclei detection function
-        labeled_image, *_ = self._app.eval(
-            # Normalize here instead of letting eval do it
+        return _DecodedImage(path, digest, nuclei_channel, mask,
+                             fiber_contours, area)
+
+    def _decode_tiled(self,
+                      source: ImageSource,
+                      path: Path,
+                      digest: str,
+                      nuclei_color: str,
+                      fiber_color: str,
+                      minimum_fiber_intensity: int,
+                      maximum_fiber_intensity: int) -> _TiledImage:
+        """Detects the fibers on an image too large to be processed at once.
+
+        The fiber mask is computed tile by tile, each tile being extended by a
+        margin so that the Gaussian blur and the filling of the holes are not
+        affected by the seams. The thresholds for filling the holes are
+        computed once on a downsampled copy of the image, so that they are the
+        same for all the tiles. The fiber contours are then detected on the
+        assembled mask, and are therefore continuous across the seams.
+
+        Args:
+            source: The opened image to process.
+            path: The path to the image to process.
+            digest: The key identifying the image content in the cache.
+            nuclei_color: The color of the nuclei, as a string.
+            fiber_color: The color of the fibers, as a string.
+            minimum_fiber_intensity: The gray level intensity above which a
+                pixel is considered to be part of a fiber.
+            maximum_fiber_intensity: The gray level intensity below which a
+                pixel is considered to be part of a fiber.
+
+        Returns:
+            The decoded image, with its fiber mask, fiber contours, fiber area,
+            and the data needed for detecting the nuclei tile by tile.
+        """
+
+        colors = [numpy_color_to_int[nuclei_color],
+                  numpy_color_to_int[fiber_color]]
+        tiles = _split_tiles(source.shape, self.tile_size)
+        blur_size = self._get_blur_size(source.shape)
+
+        # Getting the fiber mask from the cache if possible, the mask computed
+        # in tiles being slightly different from the one of the whole image
+        key = ('fiber_mask', digest, nuclei_color, fiber_color,
+               minimum_fiber_intensity, maximum_fiber_intensity, __version__,
+               self.tile_size)
+        mask = self.cache.get(key)
+        compute_mask = mask is None
+
+        if compute_mask:
+            # Thresholds for filling the holes, common to all the tiles
+            step = ceil(max(source.shape) / _overview_size)
+            nuclei_channel, fiber_channel = source.read(
+                colors, (slice(None, None, step), slice(None, None, step)))
+            _, processed = self._threshold_fibers(
+                fiber_channel, minimum_fiber_intensity,
+                maximum_fiber_intensity,
+                self._get_blur_size(fiber_channel.shape))
+            thresholds = self._get_hole_thresholds(nuclei_channel, processed)
+            del nuclei_channel, fiber_channel, processed
+
+            mask = np.zeros(source.shape, dtype=bool)
+
+        # Also getting the intensity bounds of the nuclei channel, for
+        # normalizing all the tiles the same way before running Cellpose
+        low, high = 255, 0
+        for tile in tiles:
+            region = _expand(tile, blur_size // 2 + _fiber_margin,
+                             source.shape)
+            inner = tuple(slice(part.start - ext.start, part.stop - ext.start)
+                          for part, ext in zip(tile, region))
+
+            if not compute_mask:
+                nuclei_channel, = source.read(colors[:1], tile)
+                low = min(low, int(nuclei_channel.min()))
+                high = max(high, int(nuclei_channel.max()))
+                continue
+
+            nuclei_channel, fiber_channel = source.read(colors, region)
+            low = min(low, int(nuclei_channel[inner].min()))
+            high = max(high, int(nuclei_channel[inner].max()))
+
+            # Only the inner part of the tile is kept, the margin being only
+            # here to provide context
+            mask[tile] = self._get_fiber_mask(
+                fiber_channel, nuclei_channel, minimum_fiber_intensity,
+                maximum_fiber_intensity, blur_size, thresholds)[inner]
+
+        if compute_mask:
+            self.cache.put(key, mask)
+
+        # Calculating the area of fibers over the total area
+        area = np.count_nonzero(mask) / mask.shape[0] / mask.shape[1]
+
+        # Finding the contours of the fibers on the whole mask, without copying
+        # it to a new image
+        fiber_contours, _ = cv2.findContours(mask.view(np.uint8),
+                                             cv2.RETR_LIST,
+                                             cv2.CHAIN_APPROX_SIMPLE)
+        fiber_contours = tuple(map(np.squeeze, fiber_contours))
+
+        # The fibers and their bounding boxes, for assigning nuclei to fibers
+        fibers = self._get_fibers(mask)
+        boxes = np.array([cv2.boundingRect(np.concatenate(contours))
+                          for contours in fibers], dtype=np.int64)
+
+        # The nuclei channel is only kept if it cannot be read again lazily
+        nuclei_channel = None
+        if not source.lazy:
+            nuclei_channel = np.ascontiguousarray(source.read(colors[:1])[0])
+
+        return _TiledImage(path, digest, nuclei_channel, mask,
+                           fiber_contours, area, tiles=tiles,
+                           bounds=(low, high), fibers=fibers, boxes=boxes)
+
+    def _detect_nuclei(self,
+                       images: Sequence[_DecodedImage],
+                       nuclei_color: str,
+                       minimum_nucleus_diameter: int) -> None:
+        """Sets the labeled image of decoded images, either from the cache or
+        by running Cellpose on them.
+
+        The cached labeled images do not depend on the minimum nucleus
+        diameter, so that the small objects can be removed again for a
+        different diameter without running Cellpose.
+
+        Args:
+            images: The decoded images, that must all have the same shape
+                except for the images processed in tiles.
+            nuclei_color: The color of the nuclei, as a string.
+            minimum_nucleus_diameter: Objects whose area is lower than this
+                value (in pixels) will not be considered.
+        """
+
+        # The images processed in tiles are handled separately
+        for image in images:
+            if isinstance(image, _TiledImage):
+                self._detect_tiled_nuclei(image, nuclei_color,
+                                          minimum_nucleus_diameter)
+        images = [image for image in images
+                  if not isinstance(image, _TiledImage)]
+
+        # Retrieving the unfiltered labeled images from the cache if possible
+        keys = [('labels', image.digest, nuclei_color, model_version,
+                 __version__) for image in images]
+        raw_labels = [self.cache.get(key) for key in keys]
+        missing = [i for i, labels in enumerate(raw_labels) if labels is None]
+
+        # Running Cellpose on the other images, and caching the result
+        if missing:
+            computed = self._inference_stage(
+                [images[i].nuclei_channel for i in missing])
+            for i, labels in zip(missing, computed):
+                raw_labels[i] = labels
+                self.cache.put(keys[i], labels)
+
+        # Removing the objects that are too small
+        for image, labels in zip(images, raw_labels):
+            image.labeled_image = self._remove_small_nuclei(
+                labels, minimum_nucleus_diameter)
+
+    def _detect_tiled_nuclei(self,
+                             image: _TiledImage,
+                             nuclei_color: str,
+                             minimum_nucleus_diameter: int) -> None:
+        """Detects the nuclei tile by tile on an image processed in tiles, and
+        sets the statistics of the detected nuclei.
+
+        Each tile is extended by a margin, and only the nuclei whose center
+        lies inside the tile itself are kept. A nucleus crossing a seam is
+        thus entirely detected in the tile containing its center, and counted
+        only once. The unfiltered labeled image of each tile is cached
+        separately.
+
+        Args:
+            image: The decoded image.
+            nuclei_color: The color of the nuclei, as a string.
+            minimum_nucleus_diameter: Objects whose area is lower than this
+                value (in pixels) will not be considered.
+        """
+
+        channel = numpy_color_to_int[nuclei_color]
+        nb_fib = len(image.fibers)
+
+        # Index 0 is the background, like for a single labeled image
+        stats = [(np.zeros(1, dtype=np.int64), np.full(1, np.nan),
+                  np.full(1, np.nan), np.full(1, np.nan),
+                  np.zeros(1, dtype=np.int64),
+                  np.full(1, nb_fib + 1, dtype=np.int32))]
+
+        source = ImageSource(image.path) if image.nuclei_channel is None \
+            else None
+        try:
+            for tile in image.tiles:
+                region = _expand(tile, _nuclei_margin, image.mask.shape)
+                top, left = region[0].start, region[1].start
+                if source is not None:
+                    nuclei_channel, = source.read((channel,), region)
+                else:
+                    nuclei_channel = image.nuclei_channel[region]
+
+                # Retrieving the unfiltered labeled tile from the cache if
+                # possible, or running Cellpose on it
+                key = ('labels', image.digest, nuclei_color, model_version,
+                       __version__, top, region[0].stop, left,
+                       region[1].stop)
+                labels = self.cache.get(key)
+                if labels is None:
+                    labels, = self._inference_stage((nuclei_channel,),
+                                                    image.bounds)
+                    self.cache.put(key, labels)
+                labels = self._remove_small_nuclei(labels,
+                                                   minimum_nucleus_diameter)
+
+                # Computing the statistics of the nuclei of the tile
+                count, center_x, center_y, intensity, in_fiber = \
+                    self._get_nuclei_stats(labels, image.mask[region],
+                                           nuclei_channel)
+                fiber_labels = self._get_fiber_labels(
+                    labels.shape, image.fibers, (top, left), image.boxes)
+                first_fiber = self._get_first_fibers(labels, fiber_labels,
+                                                     len(count), nb_fib)
+                del labels, fiber_labels
+                center_x += left
+                center_y += top
+
+                # Only keeping the nuclei whose center lies inside the tile
+                keep = ((count > 0) &
+                        (tile[0].start <= center_y + 0.5) &
+                        (center_y + 0.5 < tile[0].stop) &
+                        (tile[1].start <= center_x + 0.5) &
+                        (center_x + 0.5 < tile[1].stop))
+                keep[0] = False
+                stats.append(tuple(array[keep] for array in
+                                   (count, center_x, center_y, intensity,
+                                    in_fiber, first_fiber)))
+        finally:
+            if source is not None:
+                source.close()
+
+        image.stats = tuple(map(np.concatenate, zip(*stats)))
+
+    def _inference_stage(self,
+                         nuclei_channels: Sequence[np.ndarray],
+                         bounds: tuple[int, int] | None = None
+                         ) -> list[np.ndarray]:
+        """Detects the nuclei on the nuclei channels of one or several images
+        using Cellpose.
+
+        The nuclei channels must all have the same shape. If several are
+        given, they are passed to Cellpose as a single stack, with a batch
+        size large enough for the tiles of several images to be sent through
+        the network together. The labels are still computed separately on each
+        image.
+
+        Args:
+            nuclei_channels: The nuclei channels of the images.
+            bounds: If given, the intensities mapped to 0 and 1 when
+                normalizing the nuclei channels. Otherwise, the minimum and
+                maximum intensities of each channel are used.
+
+        Returns:
+            The labeled images, in which each nucleus has a distinct label, in
+            the same order as the nuclei channels. The holes in the nuclei are
+            not filled and the small objects are not removed yet, this is done
+            by :meth:`_remove_small_nuclei`.
+        """
+
+        # Images to pass to CellPose
+        x = []
+        for nuclei_channel in nuclei_channels:
+            low, high = bounds if bounds is not None else \
+                (nuclei_channel.min(), nuclei_channel.max())
+            if high > low:
+                x.append(np.stack(
+                    ((nuclei_channel - low) / (high - low),
+                     np.zeros_like(nuclei_channel)), axis=-1))
+            else:
+                x.append(np.stack((np.full_like(nuclei_channel, 1.0),
+                                   np.zeros_like(nuclei_channel)),
+                                  axis=-1))
+        stacked = len(x) > 1
+        x = np.stack(x) if stacked else x[0]
+
+        # Cellpose only sends several images of a stack through the network
+        # together if all their tiles fit in one batch
+        batch_size = _cellpose_batch
+        if stacked:
+            tiles = _count_network_tiles(nuclei_channels[0].shape)
+            images = min(len(x), max(1, _max_batch_tiles // tiles))
+            batch_size = max(batch_size, images * tiles)
+
+        # Actual nuclei detection function, only returning the flows
+        _, (_, flows, cell_prob), _ = self._app.eval(
             x=x,
-            batch_size=8,
+            batch_size=batch_size,
             resample=None,
             channels=None,
-            channel_axis=2,
-            z_axis=None,
-            normalize=False,
+            channel_axis=x.ndim - 1,
+            z_axis=0 if stacked else None,
+            # Normalize here instead of letting eval do it
+            normalize={'normalize': False, 'norm3D': False},
             invert=False,
             rescale=None,
             diameter=None,
@@ -116,45 +839,249 @@ class ImageSegmentation:
             anisotropy=None,
             flow3D_smooth=0,
             stitch_threshold=0.0,
-            min_size=small_objects_threshold,
+            min_size=-1,
             max_size_fraction=1.0,
             niter=None,
             augment=False,
-            tile_overlap=0.1,
-            bsize=224,
-            compute_masks=True,
+            tile_overlap=_cellpose_overlap,
+            bsize=_cellpose_tile,
+            compute_masks=False,
             progress=None)
 
-        # Getting the fiber mask
-        mask = self._get_fiber_mask(fiber_channel,
-                                    nuclei_channel,
-                                    minimum_fiber_intensity,
-                                    maximum_fiber_intensity)
+        if not stacked:
+            flows, cell_prob = flows[:, np.newaxis], cell_prob[np.newaxis]
+
+        # Computing the labels separately on each image, the same way as eval
+        # would do except for the small objects removal
+        labeled_images = list()
+        for i, nuclei_channel in enumerate(nuclei_channels):
+            labeled_image = cellpose.dynamics.compute_masks(
+                flows[:, i], cell_prob[i], niter=200, cellprob_threshold=0.0,
+                flow_threshold=0.4, interp=True, do_3D=False,
+                max_size_fraction=1.0, device=self._app.device)
+            if labeled_image.shape != nuclei_channel.shape:
+                labeled_image = cellpose.transforms.resize_image(
+                    labeled_image, *nuclei_channel.shape, no_channels=True,
+                    interpolation=cv2.INTER_NEAREST)
+            labeled_images.append(labeled_image)
+
+        return labeled_images
 
-        del fiber_channel
+    @staticmethod
+    def _remove_small_nuclei(labeled_image: np.ndarray,
+                             minimum_nucleus_diameter: float) -> np.ndarray:
+        """Fills the holes in the nuclei and removes the objects that are too
+        small, on a copy of a labeled image returned by
+        :meth:`_inference_stage`.
 
-        # Calculating the area of fibers over the total area
-        area = np.count_nonzero(mask) / mask.shape[0] / mask.shape[1]
+        Args:
+            labeled_image: The labeled image to process.
+            minimum_nucleus_diameter: Objects whose area is lower than this
+                value (in pixels) will not be considered.
 
-        # Finding the contours of the fibers
-        mask_8_bits = (mask * 255).astype('uint8')
-        fiber_contours, _ = cv2.findContours(mask_8_bits, cv2.RETR_LIST,
+        Returns:
+            The labeled image, relabeled with consecutive labels.
+        """
+
+        small_objects_threshold = int(minimum_nucleus_diameter ** 2
+                                      * np.pi / 4)
+        return cellpose.utils.fill_holes_and_remove_small_masks(
+            labeled_image.copy(), min_size=small_objects_threshold)
+
+    def _post_processing_stage(self,
+                               image: _DecodedImage,
+                               minimum_nucleus_intensity: int,
+                               maximum_nucleus_intensity: int,
+                               minimum_nuclei_count: int
+                               ) -> tuple[Path,
+                                          list[tuple[np.ndarray, np.ndarray]],
+                                          list[tuple[np.ndarray, np.ndarray]],
+                                          tuple[Any, ...], float]:
+        """Computes the positions of the nuclei and assembles the output of
+        :meth:`__call__`.
+
+        Args:
+            image: The decoded image, whose nuclei were detected.
+            minimum_nucleus_intensity: Any nucleus whose average brightness is
+                lower than this value will be discarded.
+            maximum_nucleus_intensity: Any nucleus whose average brightness is
+                greater than this value will be discarded.
+            minimum_nuclei_count: Nuclei located in a fiber containing less
+                than this number of positive nuclei will be counted as
+                negative.
+
+        Returns:
+            The same output as :meth:`__call__`.
+        """
+
+        # For the images processed in tiles, the statistics of the nuclei were
+        # already computed and only need to be classified
+        if isinstance(image, _TiledImage):
+            nuclei_out, nuclei_in = list(), list()
+            if image.fibers:
+                nuclei_out, nuclei_in = self._classify_nuclei(
+                    image.stats, len(image.fibers), 0.75,
+                    minimum_nucleus_intensity, maximum_nucleus_intensity,
+                    minimum_nuclei_count)
+        else:
+            nuclei_out, nuclei_in = self._get_nuclei_positions(
+                image.labeled_image, image.mask, image.nuclei_channel, 0.75,
+                minimum_nucleus_intensity, maximum_nucleus_intensity,
+                minimum_nuclei_count)
+
+        return (image.path, nuclei_out, nuclei_in, image.fiber_contours,
+                image.area)
+
+    def preview(self,
+                path: Path,
+                nuclei_color: str,
+                fiber_color: str,
+                minimum_fiber_intensity: int,
+                maximum_fiber_intensity: int,
+                minimum_nucleus_intensity: int,
+                maximum_nucleus_intensity: int,
+                minimum_nucleus_diameter: int,
+                minimum_nuclei_count: int,
+                max_size: int = 1024
+                ) -> tuple[Path, list[tuple[np.ndarray, np.ndarray]],
+                           list[tuple[np.ndarray, np.ndarray]],
+                           tuple[Any, ...], float] | None:
+        """Quickly computes an approximation of the output of
+        :meth:`__call__`, for previewing the effect of the settings on an
+        already processed image.
+
+        Cellpose is never run, the labeled image is retrieved from the cache.
+        The post-processing is performed on a downsampled copy of the image,
+        that is kept between the calls so that only the first call for a given
+        image needs to load it.
+
+        Args:
+            path: The path to the image to preview.
+            nuclei_color: The color of the nuclei, as a string.
+            fiber_color: The color of the fibers, as a string.
+            minimum_fiber_intensity: The gray level intensity above which a
+                pixel is considered to be part of a fiber.
+            maximum_fiber_intensity: The gray level intensity below which a
+                pixel is considered to be part of a fiber.
+            minimum_nucleus_intensity: Any nucleus whose average brightness is
+                lower than this value will be discarded.
+            maximum_nucleus_intensity: Any nucleus whose average brightness is
+                greater than this value will be discarded.
+            minimum_nucleus_diameter: Objects whose area is lower than this
+                value (in pixels) will not be considered.
+            minimum_nuclei_count: Nuclei located in a fiber containing less
+                than this number of positive nuclei will be counted as
+                negative.
+            max_size: The maximum size of the downsampled image along any
+                dimension, in pixels.
+
+        Returns:
+            The same output as :meth:`__call__`, with the positions expressed
+            in the coordinates of the original image, or None if the labeled
+            image is not in the cache.
+        """
+
+        image = self._preview_image
+        if (image is None or image.path != path
+                or image.nuclei_color != nuclei_color
+                or image.fiber_color != fiber_color):
+            image = self._load_preview_image(path, nuclei_color, fiber_color,
+                                             max_size)
+            if image is None:
+                return None
+            self._preview_image = image
+
+        # Detecting the fibers on the downsampled image
+        mask = self._get_fiber_mask(image.fiber_channel,
+                                    image.nuclei_channel,
+                                    minimum_fiber_intensity,
+                                    maximum_fiber_intensity)
+        area = np.count_nonzero(mask) / mask.shape[0] / mask.shape[1]
+        fiber_contours, _ = cv2.findContours((mask * 255).astype('uint8'),
+                                             cv2.RETR_LIST,
                                              cv2.CHAIN_APPROX_SIMPLE)
-        fiber_contours = tuple(map(np.squeeze, fiber_contours))
+        fiber_contours = tuple(
+            np.round((np.squeeze(contour) + 0.5) / image.scale - 0.5
+                     ).astype(np.int32) for contour in fiber_contours)
+
+        # The small objects are only removed again if the diameter changed
+        diameter = minimum_nucleus_diameter * image.scale
+        if image.filtered is None or image.filtered[0] != diameter:
+            image.filtered = (diameter, self._remove_small_nuclei(
+                image.labeled_image, diameter))
 
-        # Getting the position of the nuclei
         nuclei_out, nuclei_in = self._get_nuclei_positions(
-            labeled_image, mask, nuclei_channel, 0.75,
+            image.filtered[1], mask, image.nuclei_channel, 0.75,
             minimum_nucleus_intensity, maximum_nucleus_intensity,
             minimum_nuclei_count)
 
+        # Converting the positions back to the original image coordinates
+        nuclei_out = [((x + 0.5) / image.scale - 0.5,
+                       (y + 0.5) / image.scale - 0.5) for x, y in nuclei_out]
+        nuclei_in = [((x + 0.5) / image.scale - 0.5,
+                      (y + 0.5) / image.scale - 0.5) for x, y in nuclei_in]
+
         return path, nuclei_out, nuclei_in, fiber_contours, area
 
+    def _load_preview_image(self,
+                            path: Path,
+                            nuclei_color: str,
+                            fiber_color: str,
+                            max_size: int) -> _PreviewImage | None:
+        """Loads an image and its cached labeled image, and downsamples them
+        for previewing the effect of the settings.
+
+        Args:
+            path: The path to the image to load.
+            nuclei_color: The color of the nuclei, as a string.
+            fiber_color: The color of the fibers, as a string.
+            max_size: The maximum size of the downsampled image along any
+                dimension, in pixels.
+
+        Returns:
+            The downsampled image, or None if the image cannot be loaded or if
+            its labeled image is not in the cache.
+        """
+
+        # Retrieving the labeled image, without which no preview is possible
+        try:
+            digest = self.cache.digest(path)
+        except OSError:
+            return None
+        labeled_image = self.cache.get(('labels', digest, nuclei_color,
+                                        model_version, __version__))
+        if labeled_image is None:
+            return None
+
+        channels = load_channels(path, (numpy_color_to_int[nuclei_color],
+                                        numpy_color_to_int[fiber_color]))
+        if channels is None:
+            return None
+        nuclei_channel, fiber_channel = channels
+
+        # Downsampling the channels and the labeled image
+        scale = min(max_size / max(nuclei_channel.shape), 1.0)
+        if scale < 1:
+            size = (max(round(nuclei_channel.shape[1] * scale), 1),
+                    max(round(nuclei_channel.shape[0] * scale), 1))
+            nuclei_channel = cv2.resize(nuclei_channel, size,
+                                        interpolation=cv2.INTER_AREA)
+            fiber_channel = cv2.resize(fiber_channel, size,
+                                       interpolation=cv2.INTER_AREA)
+            labeled_image = cv2.resize(labeled_image.astype(np.int32), size,
+                                       interpolation=cv2.INTER_NEAREST)
+
+        return _PreviewImage(path, nuclei_color, fiber_color, scale,
+                             nuclei_channel, fiber_channel, labeled_image)
+
     @staticmethod
     def _get_fiber_mask(fiber_channel: np.ndarray,
                         nuclei_channel: np.ndarray,
                         minimum_intensity: int,
-                        maximum_intensity: int) -> np.ndarray:
+                        maximum_intensity: int,
+                        blur_size: int | None = None,
+                        hole_thresholds: tuple[float, float] | None = None
+                        ) -> np.ndarray:
         """Applies several images processing methods to the fiber channel of
         the image to smoothen the outline.
 
@@ -165,14 +1092,98 @@ class ImageSegmentation:
                 considered to be part of a fiber.
             minimum_intensity: The gray level intensity below which a pixel is
                 considered to be part of a fiber.
+            blur_size: The size of the Gaussian filter, if it should not be
+                derived from the size of the image.
+            hole_thresholds: The thresholds for filling the holes, as returned
+                by :meth:`_get_hole_thresholds`, if they should not be computed
+                on the given channels.
 
         Returns:
             A boolean mask containing the position of the fibers
         """
 
+        if blur_size is None:
+            blur_size = ImageSegmentation._get_blur_size(fiber_channel.shape)
+        fiber_channel, processed = ImageSegmentation._threshold_fibers(
+            fiber_channel, minimum_intensity, maximum_intensity, blur_size)
+
+        # Find contours and hierarchy of the holes inside the fibers
+        # All the contour points are kept, as they are needed for the filling
+        contours, hierarchy = cv2.findContours(processed, cv2.RETR_TREE,
+                                               cv2.CHAIN_APPROX_NONE)
+
+        if hierarchy is None:
+            return np.zeros_like(processed, dtype=np.bool)
+
+        # Define thresholds for filling up the inside holes
+        if hole_thresholds is None:
+            hole_thresholds = ImageSegmentation._get_hole_thresholds(
+                nuclei_channel, processed)
+        thresh_nuc, med_excl = hole_thresholds
+
+        # Only the inside contours are considered, i.e. those with a parent
+        parents = hierarchy[0, :, 3]
+
+        # Drawing all the holes on a single label image
+        holes, order, borders = ImageSegmentation._get_hole_labels(
+            processed.shape, contours, parents)
+
+        # Computing the size and intensities of all the holes at once
+        count, sum_nuc, sum_fib = ImageSegmentation._get_hole_sums(
+            holes, parents, order, borders, nuclei_channel, fiber_channel)
+
+        # If the hole in the fiber signal is below a nucleus, and the fiber
+        # signal is still quite bright, then fill up the hole
+        # The contours that were not drawn have a count of 0 and are ignored
+        with np.errstate(divide='ignore', invalid='ignore'):
+            to_fill = ((sum_nuc / count > thresh_nuc) &
+                       (sum_fib / count > med_excl))
+        to_fill[0] = False
+
+        # A hole also gets filled if it is located inside a filled hole
+        for i in order:
+            if parents[parents[i]] >= 0 and to_fill[parents[i] + 1]:
+                to_fill[i + 1] = True
+
+        # Filling up all the selected holes at once
+        processed[to_fill[holes]] = 255
+
+        # Creating a boolean mask, later used to generate a masked array
+        mask = processed.astype(bool)
+
+        return mask
+
+    @staticmethod
+    def _get_blur_size(shape: tuple[int, int]) -> int:
+        """Returns the size of the Gaussian filter smoothening the fiber signal
+        of an image of the given shape."""
+
+        return max(int(min(shape) / 50) // 2 * 2 - 1, 1)
+
+    @staticmethod
+    def _threshold_fibers(fiber_channel: np.ndarray,
+                          minimum_intensity: int,
+                          maximum_intensity: int,
+                          blur_size: int) -> tuple[np.ndarray, np.ndarray]:
+        """Smoothens the fiber channel, and keeps the pixels whose intensity is
+        within the given bounds.
+
+        Args:
+            fiber_channel: The channel of the image containing the fibers.
+            minimum_intensity: The gray level intensity above which a pixel is
+                considered to be part of a fiber.
+            maximum_intensity: The gray level intensity below which a pixel is
+                considered to be part of a fiber.
+            blur_size: The size of the Gaussian filter.
+
+        Returns:
+            The smoothened fiber channel, and the thresholded image in which
+            the fiber pixels have the value 255 and the others 0.
+        """
+
         # Apply a Gaussian filter to smoothen the fiber signal
-        dim = max(int(min(fiber_channel.shape) / 50) // 2 * 2 - 1, 1)
-        fiber_channel = cv2.GaussianBlur(fiber_channel, (dim, dim), 0)
+        fiber_channel = cv2.GaussianBlur(fiber_channel,
+                                         (blur_size, blur_size), 0)
 
         # First, apply a base threshold
         kernel = np.ones((4, 4), np.uint8)
@@ -190,47 +1201,192 @@ class ImageSegmentation:
         # Closing, to remove noise inside the fibers
         processed = cv2.morphologyEx(processed, cv2.MORPH_CLOSE, kernel)
 
-        # Find contours and hierarchy of the holes inside the fibers
-        contours, hierarchy = cv2.findContours(processed, cv2.RETR_TREE,
-                                               cv2.CHAIN_APPROX_SIMPLE)
+        return fiber_channel, processed
 
-        if hierarchy is None:
-            return np.zeros_like(processed, dtype=np.bool)
+    @staticmethod
+    def _get_hole_thresholds(nuclei_channel: np.ndarray,
+                             processed: np.ndarray) -> tuple[float, float]:
+        """Computes the thresholds above which a hole in the fibers is filled.
 
-        hierarchy = np.squeeze(hierarchy).tolist()
+        Args:
+            nuclei_channel: The channel of the image containing the nuclei.
+            processed: The thresholded fiber image, as returned by
+                :meth:`_threshold_fibers`.
 
-        # If the hierarchy only contains one object, it is cast to int
-        if isinstance(hierarchy, int):
-            hierarchy = [hierarchy]
-        if (isinstance(hierarchy, list)
-            and len(hierarchy) > 0
-            and isinstance(hierarchy[0], int)):
-            hierarchy = [hierarchy]
+        Returns:
+            The threshold on the average nuclei intensity in the hole, and the
+            one on the average fiber intensity in the hole. If there is no
+            fiber, the latter is infinite so that no hole gets filled.
+        """
 
-        # Define thresholds for filling up the inside holes
         thresh_nuc, _ = cv2.threshold(nuclei_channel, 0, 255, cv2.THRESH_OTSU)
-        med_excl = np.median(nuclei_channel[processed > 0])
+        in_fibers = nuclei_channel[processed > 0]
+        med_excl = np.median(in_fibers) if in_fibers.size else np.inf
 
-        for contour, (_, _, _, parent) in zip(contours, hierarchy):
+        return thresh_nuc, med_excl
 
-            # Only consider inside contours
-            if parent < 0:
-                continue
+    @staticmethod
+    def _get_hole_labels(shape: tuple[int, int],
+                         contours: tuple[np.ndarray, ...],
+                         parents: np.ndarray
+                         ) -> tuple[np.ndarray, list[int],
+                                    tuple[np.ndarray, np.ndarray]]:
+        """Draws all the inside contours on a single label image.
+
+        The contours are drawn from the outermost to the innermost, so that
+        each pixel carries the label of the innermost contour containing it.
 
-            # Create a mask for the current contour
-            mask = np.zeros_like(processed)
-            cv2.drawContours(mask, (contour,), -1, 255, -1)
+        Args:
+            shape: The shape of the image on which the contours were detected.
+            contours: All the contours detected on the image.
+            parents: For each contour, the index of its parent contour, or -1
+                if it has no parent.
 
-            # If the hole in the fiber signal is below a nucleus, and the fiber
-            # signal is still quite bright, then fill up the hole
-            if (np.average(nuclei_channel[mask.nonzero()]) > thresh_nuc and
-                np.average(fiber_channel[mask.nonzero()]) > med_excl):
-                cv2.drawContours(processed, (contour,), -1, 255, -1)
+        Returns:
+            An int32 image in which the pixels of the i-th contour have the
+            value i + 1 and all the others the value 0, the indexes of the
+            inside contours in the order in which they were drawn, and the
+            labels and flat indexes of the contour pixels that were filled by
+            each contour.
+        """
 
-        # Creating a boolean mask, later used to generate a masked array
-        mask = processed.astype(bool)
+        # Computing the nesting depth of all the inside contours
+        depth = dict()
+        for i in np.flatnonzero(parents >= 0):
+            depth[i] = 0
+            parent = parents[i]
+            while parent >= 0:
+                depth[i] += 1
+                parent = parents[parent]
+        order = sorted(depth, key=depth.get)
+
+        # Drawing the contours one by one on the same canvas
+        holes = np.zeros(shape, dtype=np.int32)
+        owners = list()
+        pixels = list()
+        for i in order:
+            cv2.drawContours(holes, (contours[i],), -1, int(i) + 1, -1)
+
+            # Keeping track of the contour pixels, as they might later be
+            # overwritten by a neighboring contour
+            points = contours[i].reshape(-1, 2)
+            points = points[holes[points[:, 1], points[:, 0]] == i + 1]
+            owners.append(np.full(len(points), i + 1))
+            pixels.append(points[:, 1] * shape[1] + points[:, 0])
+
+        if order:
+            borders = np.concatenate(owners), np.concatenate(pixels)
+        else:
+            borders = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
 
-        return mask
+        return holes, order, borders
+
+    @staticmethod
+    def _get_hole_sums(holes: np.ndarray,
+                       parents: np.ndarray,
+                       order: list[int],
+                       borders: tuple[np.ndarray, np.ndarray],
+                       nuclei_channel: np.ndarray,
+                       fiber_channel: np.ndarray
+                       ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Computes the number of pixels and the sum of the intensities on the
+        nuclei and fiber channels, for the area enclosed by each inside
+        contour.
+
+        The area enclosed by a contour includes the contour itself, as well as
+        all the contours nested inside it.
+
+        Args:
+            holes: The label image returned by _get_hole_labels.
+            parents: For each contour, the index of its parent contour, or -1
+                if it has no parent.
+            order: The indexes of the inside contours, from the outermost to
+                the innermost.
+            borders: The labels and flat indexes of the contour pixels filled
+                by each contour, as returned by _get_hole_labels.
+            nuclei_channel: The channel of the image containing the nuclei.
+            fiber_channel: The smoothened channel of the image containing the
+                fibers.
+
+        Returns:
+            The number of pixels, the sum of the nuclei intensities and the sum
+            of the fiber intensities, indexed by contour index plus one.
+        """
+
+        labels = holes.ravel()
+        nb_labels = len(parents) + 1
+
+        # Reduction over the pixels that carry the label of each contour
+        count = np.bincount(labels, minlength=nb_labels)
+        sum_nuc = np.bincount(labels, weights=nuclei_channel.ravel(),
+                              minlength=nb_labels)
+        sum_fib = np.bincount(labels, weights=fiber_channel.ravel(),
+                              minlength=nb_labels)
+
+        # Adding the nested contours to their parents, innermost first
+        for i in reversed(order):
+            parent = parents[i]
+            if parents[parent] >= 0:
+                count[parent + 1] += count[i + 1]
+                sum_nuc[parent + 1] += sum_nuc[i + 1]
+                sum_fib[parent + 1] += sum_fib[i + 1]
+
+        # Neighboring holes may share the pixels of their contours, but these
+        # pixels carry only one label so they are added to the other holes
+        owners, pixels = borders
+        shared = labels[pixels] != owners
+        owners, pixels = owners[shared], pixels[shared]
+
+        # The label of the parent of each inside contour, or 0 if the parent
+        # is not an inside contour
+        inside = np.flatnonzero(parents >= 0)
+        inside = inside[parents[parents[inside]] >= 0]
+        up = np.zeros(nb_labels, dtype=np.int64)
+        up[inside + 1] = parents[inside] + 1
+
+        # A shared pixel is added to its owners and to all their ancestors,
+        # except to the ones already containing it through its label, and
+        # only once to each contour
+        added = ImageSegmentation._ancestor_pairs(owners, pixels, up,
+                                                  labels.size)
+        present = ImageSegmentation._ancestor_pairs(labels[pixels], pixels,
+                                                    up, labels.size)
+        added = np.setdiff1d(added, present)
+        owners, pixels = np.divmod(added, labels.size)
+
+        count += np.bincount(owners, minlength=nb_labels)
+        sum_nuc += np.bincount(owners, weights=nuclei_channel.ravel()[pixels],
+                               minlength=nb_labels)
+        sum_fib += np.bincount(owners, weights=fiber_channel.ravel()[pixels],
+                               minlength=nb_labels)
+
+        return count, sum_nuc, sum_fib
+
+    @staticmethod
+    def _ancestor_pairs(labels: np.ndarray,
+                        pixels: np.ndarray,
+                        up: np.ndarray,
+                        size: int) -> np.ndarray:
+        """Returns the unique pairs made of each given pixel and of its label
+        and all the ancestors of this label, encoded as label * size + pixel.
+
+        Args:
+            labels: The labels of the pixels, 0 standing for no label.
+            pixels: The flat indexes of the pixels.
+            up: The label of the parent of each label, or 0 if it has none.
+            size: The total number of pixels in the image.
+        """
+
+        labels = np.asarray(labels, dtype=np.int64)
+        pairs = list()
+        while labels.size:
+            valid = labels > 0
+            labels, pixels = labels[valid], pixels[valid]
+            pairs.append(labels * size + pixels)
+            labels = up[labels]
+
+        return np.unique(np.concatenate(pairs)) if pairs else \
+            np.empty(0, dtype=np.int64)
 
     @staticmethod
     def _get_nuclei_positions(labeled_image: np.ndarray,
@@ -264,16 +1420,47 @@ class ImageSegmentation:
             of centers of nuclei inside fibers
         """
 
-        nuclei_out_fiber = list()
-        nuclei_in_fiber = list()
+        # Detect the fibers, no nucleus is returned if there is none
+        fibers = ImageSegmentation._get_fibers(mask)
+        if not fibers:
+            return list(), list()
+
+        # Rasterizing all the fibers in a single label image, in which each
+        # fiber is labeled with its rank plus one and the background with 0
+        fiber_labels = ImageSegmentation._get_fiber_labels(mask.shape, fibers)
+
+        # Computing the statistics of all the nuclei at once
+        stats = ImageSegmentation._get_nuclei_stats(labeled_image, mask,
+                                                    nuclei_channel)
+
+        # Searching for the first fiber that contains part of each nucleus
+        first_fiber = ImageSegmentation._get_first_fibers(
+            labeled_image, fiber_labels, len(stats[0]), len(fibers))
+        del fiber_labels
+
+        return ImageSegmentation._classify_nuclei(
+            (*stats, first_fiber), len(fibers), fiber_overlap_threshold,
+            minimum_nucleus_intensity, maximum_nucleus_intensity,
+            minimum_nuclei_count)
+
+    @staticmethod
+    def _get_fibers(mask: np.ndarray) -> tuple[list[np.ndarray], ...]:
+        """Detects the fibers on a fiber mask.
+
+        Args:
+            mask: The boolean mask of the fibers.
+
+        Returns:
+            For each fiber, the list of its outer and inner contours.
+        """
 
         # Detect the contours of the detected fibers
-        contours, hierarchy = cv2.findContours(mask.astype(np.uint8),
+        contours, hierarchy = cv2.findContours(mask.view(np.uint8),
                                                cv2.RETR_CCOMP,
                                                cv2.CHAIN_APPROX_SIMPLE)
 
         if hierarchy is None:
-            return nuclei_out_fiber, nuclei_in_fiber
+            return tuple()
 
         hierarchy = np.squeeze(hierarchy).tolist()
 
@@ -294,91 +1481,227 @@ class ImageSegmentation:
             else:
                 grouped[parent].append(contour)
 
-        # Dict to keep track of the nuclei count in each fiber
-        nuc_count = {i: 0 for i in grouped.keys()}
-
-        # Create fiber masks to check in which fiber each positive nucleus is
-        fib_masks = dict()
-        for i, cont in grouped.items():
-            fib_mask = np.zeros_like(mask, dtype=np.uint8)
-            cv2.drawContours(fib_mask, cont, -1, 255, -1)
-            fib_mask = fib_mask.astype(bool)
-            fib_mask = ma.masked_array(labeled_image, fib_mask)
-            fib_masks[i] = fib_mask
+        return tuple(grouped.values())
 
-        # Masking the image containing the nuclei with the boolean mask of the
-        # fibers
-        masked_image = ma.masked_array(labeled_image, mask)
+    @staticmethod
+    def _get_first_fibers(labeled_image: np.ndarray,
+                          fiber_labels: np.ndarray,
+                          nb_labels: int,
+                          nb_fib: int) -> np.ndarray:
+        """Searches for the first fiber that contains part of each nucleus,
+        i.e. the lowest fiber label found among the pixels of the nucleus.
 
-        # Each gray level on the nuclei image corresponds to one nucleus
-        nb_nuc = np.max(labeled_image)
-
-        # Buffers for storing the nuclei, their positivity status, and the
-        # index of the fiber in which they are located
-        nuclei = dict()
-        positivity = dict()
-        fiber_num = dict()
-
-        # Iterating through the detected nuclei
-        for i in range(1, nb_nuc + 1):
-
-            # Getting a list of the detected pixels
-            nucleus_y, nucleus_x = np.where(labeled_image == i)
-            center_x, center_y = np.mean(nucleus_x), np.mean(nucleus_y)
-
-            # Aborting for the current nucleus if it's not bright enough
-            if not (minimum_nucleus_intensity <=
-                    np.average(nuclei_channel[nucleus_y, nucleus_x]) <=
-                    maximum_nucleus_intensity):
-                nuclei[i] = None
-                positivity[i] = None
-                fiber_num[i] = None
-                continue
+        Args:
+            labeled_image: The image containing the nuclei.
+            fiber_labels: The label image of the fibers, as returned by
+                :meth:`_get_fiber_labels`.
+            nb_labels: The number of labels of the labeled image, including
+                the background.
+            nb_fib: The total number of fibers.
 
-            # Determining whether the nucleus is positive or negative
-            in_fiber = ma.count_masked(masked_image[nucleus_y, nucleus_x])
-            if in_fiber < fiber_overlap_threshold * nucleus_x.shape[0]:
-                positive = False
-            else:
-                positive = True
-
-            # Storing the nucleus position and positivity
-            nuclei[i] = (center_x, center_y)
-            positivity[i] = positive
-
-            # Searching for the first fiber that contains part of the nucleus
-            if positive:
-                for j, fib_mask in fib_masks.items():
-                    if ma.count_masked(fib_mask[nucleus_y, nucleus_x]):
-                        nuc_count[j] += 1
-                        fiber_num[i] = j
-                        break
-            else:
-                fiber_num[i] = None
+        Returns:
+            The label of the first fiber of each nucleus, indexed by nucleus
+            label, or nb_fib + 1 for the nuclei outside any fiber.
+        """
 
-        # Excluding the fibers that contain too few nuclei
-        fib_to_ban = tuple(i for i, count in nuc_count.items()
-                           if count < minimum_nuclei_count)
+        first_fiber = np.full(nb_labels, nb_fib + 1, dtype=np.int32)
+        overlap = (labeled_image > 0) & (fiber_labels > 0)
+        np.minimum.at(first_fiber, labeled_image[overlap],
+                      fiber_labels[overlap])
 
-        # Iterating again over the detected nuclei
-        for i in range(1, nb_nuc + 1):
+        return first_fiber
 
-            # Means that the nucleus was skipped due to out-of-bounds intensity
-            if nuclei[i] is None:
-                continue
+    @staticmethod
+    def _classify_nuclei(stats: tuple[np.ndarray, ...],
+                         nb_fib: int,
+                         fiber_overlap_threshold: float,
+                         minimum_nucleus_intensity: int,
+                         maximum_nucleus_intensity: int,
+                         minimum_nuclei_count: int
+                         ) -> tuple[list[tuple[np.ndarray, np.ndarray]],
+                                    list[tuple[np.ndarray, np.ndarray]]]:
+        """Determines from their statistics which nuclei are valid, and whether
+        they're positive or not.
 
-            center_x, center_y = nuclei[i]
-            positive = positivity[i]
-            fib_num = fiber_num[i]
+        Args:
+            stats: The number of pixels of each nucleus, the x and y positions
+                of its center, its average intensity, the number of its pixels
+                lying inside the fibers, and its first fiber. Index 0 is the
+                background.
+            nb_fib: The total number of fibers.
+            fiber_overlap_threshold: Fraction of area above which a nucleus is
+                considered to be inside a fiber.
+            minimum_nucleus_intensity: Any nucleus whose average brightness is
+                lower than this value will be discarded.
+            maximum_nucleus_intensity: Any nucleus whose average brightness is
+                greater than this value will be discarded.
+            minimum_nuclei_count: Nuclei located in a fiber containing less
+                than this number of positive nuclei will be counted as
+                negative.
 
-            # Excluding the nuclei belonging to fibers with too few nuclei
-            if fib_num is not None and fib_num in fib_to_ban:
-                positive = False
+        Returns:
+            The list of the centers of nuclei outside of fibers, and the list
+            of centers of nuclei inside fibers
+        """
 
-            # Building the final lists of positive and negative nuclei
-            if positive:
-                nuclei_in_fiber.append((center_x, center_y))
+        nuclei_out_fiber = list()
+        nuclei_in_fiber = list()
+        count, center_x, center_y, intensity, in_fiber, first_fiber = stats
+
+        # Nuclei that are not bright enough, or that are too bright, are
+        # discarded, as well as the labels that do not correspond to any pixel
+        valid = ((count > 0) &
+                 (minimum_nucleus_intensity <= intensity) &
+                 (intensity <= maximum_nucleus_intensity))
+        valid[0] = False
+
+        # Determining whether the nuclei are positive or negative
+        positive = valid & ~(in_fiber < fiber_overlap_threshold * count)
+
+        # Only the positive nuclei are assigned to a fiber, index 0 meaning
+        # that the nucleus is not assigned
+        fiber_num = np.where(positive & (first_fiber <= nb_fib),
+                             first_fiber, 0)
+
+        # Counting the positive nuclei in each fiber, and excluding the fibers
+        # that contain too few nuclei
+        nuc_count = np.bincount(fiber_num, minlength=nb_fib + 1)
+        fib_to_ban = nuc_count < minimum_nuclei_count
+        fib_to_ban[0] = False
+
+        # Excluding the nuclei belonging to fibers with too few nuclei
+        positive &= ~fib_to_ban[fiber_num]
+
+        # Building the final lists of positive and negative nuclei
+        for i in np.flatnonzero(valid):
+            if positive[i]:
+                nuclei_in_fiber.append((center_x[i], center_y[i]))
             else:
-                nuclei_out_fiber.append((center_x, center_y))
+                nuclei_out_fiber.append((center_x[i], center_y[i]))
 
         return nuclei_out_fiber, nuclei_in_fiber
+
+    @staticmethod
+    def _get_fiber_labels(shape: tuple[int, int],
+                          grouped: tuple[list[np.ndarray], ...],
+                          origin: tuple[int, int] = (0, 0),
+                          boxes: np.ndarray | None = None
+                          ) -> np.ndarray:
+        """Draws all the fibers on a single label image.
+
+        The fibers are drawn in reverse order, so that a pixel shared by
+        several fibers carries the label of the first one.
+
+        Args:
+            shape: The shape of the label image.
+            grouped: For each fiber, the list of its outer and inner contours.
+            origin: The position of the top-left corner of the label image in
+                the image on which the fibers were detected, for drawing only
+                one region of it.
+            boxes: The bounding boxes of the fibers as returned by
+                cv2.boundingRect, for skipping the fibers outside the region.
+
+        Returns:
+            An int32 image in which the pixels of the i-th fiber have the value
+            i + 1, and the background the value 0.
+        """
+
+        top, left = origin
+        fiber_labels = np.zeros(shape, dtype=np.int32)
+        for i in reversed(range(len(grouped))):
+            if boxes is not None:
+                x, y, width, height = boxes[i]
+                if (x >= left + shape[1] or x + width <= left
+                        or y >= top + shape[0] or y + height <= top):
+                    continue
+            cv2.drawContours(fiber_labels, grouped[i], -1, i + 1, -1,
+                             offset=(-left, -top))
+
+        return fiber_labels
+
+    @staticmethod
+    def _get_nuclei_stats(labeled_image: np.ndarray,
+                          mask: np.ndarray,
+                          nuclei_channel: np.ndarray
+                          ) -> tuple[np.ndarray, np.ndarray, np.ndarray,
+                                     np.ndarray, np.ndarray]:
+        """Computes in a single pass over the image the statistics of every
+        labeled nucleus.
+
+        The returned arrays are indexed by label, index 0 being the background.
+
+        Args:
+            labeled_image: The image containing the nuclei.
+            mask: The boolean mask of the fibers.
+            nuclei_channel: The channel of the image containing the nuclei.
+
+        Returns:
+            The number of pixels of each nucleus, the x and y positions of its
+            center, its average intensity on the nuclei channel, and the number
+            of its pixels lying inside the fibers.
+        """
+
+        # Each gray level on the nuclei image corresponds to one nucleus
+        labels = labeled_image.ravel()
+        nb_labels = int(labels.max(initial=0)) + 1
+        height, width = labeled_image.shape
+
+        # Number of pixels and sum of the coordinates for each nucleus
+        count = np.bincount(labels, minlength=nb_labels)
+        sum_x = np.bincount(labels,
+                            weights=np.tile(np.arange(width,
+                                                      dtype=np.float64),
+                                            height),
+                            minlength=nb_labels)
+        sum_y = np.bincount(labels,
+                            weights=np.repeat(np.arange(height,
+                                                        dtype=np.float64),
+                                              width),
+                            minlength=nb_labels)
+
+        # Sum of the intensities, and number of pixels inside the fibers
+        sum_int = np.bincount(labels,
+                              weights=nuclei_channel.ravel(),
+                              minlength=nb_labels)
+        in_fiber = np.bincount(labels[mask.ravel()], minlength=nb_labels)
+
+        # The empty labels get a NaN position and intensity
+        with np.errstate(divide='ignore', invalid='ignore'):
+            center_x = sum_x / count
+            center_y = sum_y / count
+            intensity = sum_int / count
+
+        return count, center_x, center_y, intensity, in_fiber
+
+
+def init_worker(cache_folder: Path | None = None,
+                tile_size: int | None = None) -> None:
+    """Loads a dedicated instance of the segmentation class in a worker process
+    of the processing pool.
+
+    Args:
+        cache_folder: The folder where to cache the segmentation results, if
+            any.
+        tile_size: The size above which the images are processed in tiles, if
+            any.
+    """
+
+    global _worker_segmentation
+    _worker_segmentation = ImageSegmentation(cache_folder, tile_size)
+
+
+def process_in_worker(*job: Any
+                      ) -> tuple[Path, list[tuple[np.ndarray, np.ndarray]],
+                                 list[tuple[np.ndarray, np.ndarray]],
+                                 tuple[Any, ...], float]:
+    """Processes one image in a worker process of the processing pool.
+
+    Args:
+        *job: The arguments to pass to the segmentation class, in the same
+            order as for ImageSegmentation.__call__.
+
+    Returns:
+        The output of the segmentation class for the given image.
+    """
+
+    return _worker_segmentation(*job)
@@ -7,18 +7,23 @@ from shutil import rmtree
 from webbrowser import open_new
 from threading import Thread, Event
 from queue import Empty, Queue
-from time import sleep
-from pickle import load, dump
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import get_context
+from collections import deque
+from pickle import load
 from functools import partial, wraps
 from pathlib import Path
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
 import logging
 import importlib.resources as resources
 from time import time
 
 from .tools import (Settings, SavePopup, WarningWindow, SettingsWindow,
                     SplashWindow, check_project_name, ProcessError,
-                    ProcessResult)
+                    ProcessResult, SegmentationCache, TableEntry, Nuclei,
+                    Fibers, ProjectSave, has_project_data, save_settings,
+                    recover_project, recover_projects,
+                    recover_interrupted_save)
 from .files_table import FilesTable
 from .image_canvas import ImageCanvas
 
@@ -80,6 +85,14 @@ class MainWindow(Tk):
             self.attributes('-zoomed', True)
         self.app_folder = app_folder
 
+        # Caching the segmentation results in the application folder
+        self._cache_folder: Path | None = None
+        if app_folder is not None:
+            self._cache_folder = app_folder / 'cache'
+            self.log(f"Caching the segmentation results in "
+                     f"{self._cache_folder}")
+            self._segmentation.cache = SegmentationCache(self._cache_folder)
+
         # Sets the application icon
         self.log("Setting the application icon")
         ref = resources.files('myofinder') / 'app_images' / 'project_icon.png'
@@ -107,6 +120,17 @@ class MainWindow(Tk):
             if (self.app_folder / 'settings.pickle').exists():
                 self._load_settings(self.app_folder)
 
+        # Restoring the project whose save was interrupted, if any
+        if self.app_folder is not None:
+            restored = recover_interrupted_save(self.app_folder)
+            if restored is not None:
+                self.log(f"Restored the project {restored} after an "
+                         f"interrupted save")
+                messagebox.showinfo("Project restored",
+                                    f"The save of the project {restored} was "
+                                    f"interrupted, its previous version was "
+                                    f"restored.")
+
         # Finishes the initialization and starts the event loop
         self.update()
         self.log("Setting the main windows's bindings and protocols")
@@ -132,15 +156,53 @@ class MainWindow(Tk):
         """Saves the settings to a settings.pickle file.
 
         Args:
-            project_path: The Path where the project will be saved.
+            project_path: The Path where the settings should be saved.
         """
 
-        # Saving the settings
         self.log(f"Settings values: {str(self.settings)}")
-        settings_file = project_path / 'settings.pickle'
-        with open(settings_file, 'wb+') as param_file:
-            dump(self.settings.get_all(), param_file, protocol=4)
-            self.log(f"Saved the settings at: {settings_file}")
+        save_settings(self.settings.get_all(), project_path)
+
+    def preview_settings(self) -> bool:
+        """Displays on the current image the nuclei and fibers that would be
+        obtained with the current settings, without processing it again.
+
+        Returns:
+            True if the preview could be displayed, False if there's no image
+            displayed or if it was not processed yet.
+        """
+
+        path = self._image_canvas.image_path
+        if path is None:
+            return False
+
+        result = self._segmentation.preview(
+            path,
+            self.settings.nuclei_colour.get(),
+            self.settings.fiber_colour.get(),
+            self.settings.minimum_fiber_intensity.get(),
+            self.settings.maximum_fiber_intensity.get(),
+            self.settings.minimum_nucleus_intensity.get(),
+            self.settings.maximum_nucleus_intensity.get(),
+            self.settings.minimum_nuc_diameter.get(),
+            self.settings.minimum_nuclei_count.get())
+
+        if result is None:
+            self.log(f"Cannot preview the settings on {path}, as it was not "
+                     f"processed yet")
+            return False
+
+        # Building temporary nuclei and fibers objects from the result
+        _, nuclei_out, nuclei_in, fiber_contours, area = result
+        entry = TableEntry(path=path, nuclei=Nuclei(), fibers=Fibers())
+        entry.set_processed_data(nuclei_out, nuclei_in, fiber_contours, area)
+        self._image_canvas.show_preview(entry.nuclei, entry.fibers)
+        return True
+
+    def end_preview(self) -> None:
+        """Displays again the actual nuclei and fibers of the current image
+        after a preview."""
+
+        self._image_canvas.end_preview()
 
     def update_master_check(self) -> None:
         """Updates the master checkbox according to the states of the
@@ -206,9 +268,21 @@ class MainWindow(Tk):
         self._ui_queue = Queue(maxsize=0)
         self._thread = Thread(target=self._process_thread)
         self._ui_after_idx: str | None = None
+
+        # Variables managing the optional pool of processing workers
+        self._nb_workers = 1
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_size = 0
+        self._pool_tile_size: int | None = None
+        self._pending: deque[tuple[Path, Future]] = deque()
+
+        # Depths of the queues between the stages of the processing pipeline
+        self._pipeline_depths = (2, 2)
+
         self._thread.start()
 
         self._current_project: Path | None = None  # Path to current project
+        self._saving = False  # Whether a project is being saved
 
     def _set_traces(self) -> None:
         """Sets the callbacks triggered upon modification of the settings."""
@@ -467,17 +541,19 @@ class MainWindow(Tk):
     def _save_project(self, directory: Path) -> None:
         """Saves a project, its images and the associated data.
 
+        The project is saved in a background thread, while the interface
+        displays the progress and remains responsive.
+
         Args:
             directory: The path to the folder where the project should be
                 saved.
         """
 
-        # Creating the folder if needed
+        # Preparing the save, which also creates the folder where it happens
         try:
-            if not (directory.is_dir() and directory.exists()):
-                self.log(f"Creating the directory where to save the "
-                         f"project at {directory}")
-                Path.mkdir(directory, parents=True)
+            save = self._files_table.save_project(
+                directory, self.settings.save_overlay.get(),
+                self.settings.get_all(), self.app_folder)
 
         # If an exception is raised, catching and displaying it
         except (Exception,) as exc:
@@ -488,41 +564,67 @@ class MainWindow(Tk):
                                             "where to save the project !")
             return
 
-        saving_popup: SavePopup | None = None
+        # Displays a popup indicating the project is being saved, and waits for
+        # the save to complete while handling the events of the interface
+        self._saving = True
         try:
-            # Displays a popup indicating the project is being saved
             saving_popup = SavePopup(self, directory)
-            sleep(1)
+            done = BooleanVar(value=False)
+            self.after(33, self._poll_save, save, saving_popup, done)
+            self.wait_variable(done)
+            saving_popup.destroy()
+        finally:
+            self._saving = False
 
-            # Actually saving the project
-            self.save_settings(directory)
-            self._files_table.save_project(directory,
-                                           self.settings.save_overlay.get())
+        if save.error is not None:
+            messagebox.showerror("Error !", "Could not save the project !")
+            return
+        self._files_table.finish_save(save)
 
-            # Checking that all the mandatory files were created as expected
-            if ((directory / 'settings.pickle').exists() and
-                (directory / f"{directory.name}.xlsx").exists() and
-                (directory / 'data.pickle').exists() and
-                (directory / 'Original Images').exists() and
-                len(tuple((directory / 'Original Images').iterdir()))):
+        # Checking that all the mandatory files were created as expected
+        if ((directory / 'settings.pickle').exists() and
+            (directory / f"{directory.name}.xlsx").exists() and
+            has_project_data(directory) and
+            (directory / 'Original Images').exists() and
+            len(tuple((directory / 'Original Images').iterdir()))):
 
-                # Setting the save button, the project title and the menu entry
-                self._set_title_and_button(directory)
-                self.log(f"Project saved at {directory}")
+            # Setting the save button, the project title and the menu entry
+            self._set_title_and_button(directory)
+            self.log(f"Project saved at {directory}")
 
-            else:
-                messagebox.showerror("Error !", "Could not save the project !")
+            # The entries modified during the save still need to be saved
+            if any(entry.modified for entry in self._files_table.table_items):
+                self.set_unsaved_status()
 
-        # If an exception is raised, catching it and displaying
-        except (Exception,) as exc:
-            self._logger.exception(
-                f"Exception caught while saving the project !", exc_info=exc)
+        else:
             messagebox.showerror("Error !", "Could not save the project !")
 
-        # Delete the save popup if it was ever created
-        finally:
-            if saving_popup is not None:
-                saving_popup.destroy()
+    def _poll_save(self,
+                   save: ProjectSave,
+                   saving_popup: SavePopup,
+                   done: BooleanVar) -> None:
+        """Regularly displays the progress of a save running in the background,
+        until it is complete.
+
+        Args:
+            save: The ProjectSave saving the project.
+            saving_popup: The popup displaying the progress of the save.
+            done: Set to True once the save is complete.
+        """
+
+        while True:
+            try:
+                message = save.messages.get_nowait()
+            except Empty:
+                break
+
+            if message == 'Done':
+                self.log("The save thread signaled itself as done")
+                done.set(True)
+                return
+            saving_popup.set_progress(*message)
+
+        self.after(33, self._poll_save, save, saving_popup, done)
 
     def _load_project(self) -> None:
         """Loads a project, its images and its data."""
@@ -542,10 +644,22 @@ class MainWindow(Tk):
         directory = Path(directory)
         self.log(f"User requested to load project {directory}")
 
+        # Cleaning up after any interrupted save of the selected project, or of
+        # the projects it contains
+        recover_project(directory)
+        restored = recover_projects(directory)
+        if restored:
+            self.log(f"Restored the projects {', '.join(map(str, restored))} "
+                     f"after an interrupted save")
+            messagebox.showinfo("Projects restored",
+                                f"The save of the projects "
+                                f"{', '.join(p.name for p in restored)} was "
+                                f"interrupted, their previous version was "
+                                f"restored.")
+
         # Checking that a valid project was selected
         if not (directory.is_dir() and directory.exists() and
-                (directory / 'data.pickle').is_file() and
-                (directory / 'data.pickle').exists()):
+                has_project_data(directory)):
             messagebox.showerror("Error while loading",
                                  "This isn't a valid MyoFInDer project !")
             self.log("The selected directory is not valid for loading into "
@@ -664,6 +778,16 @@ class MainWindow(Tk):
 
         self.log("The user requested to save the current project")
 
+        # Only one save can happen at a time
+        if self._saving:
+            self.log("A project is already being saved, ignoring the request")
+            return False
+
+        # The processed images would otherwise be modified during the save
+        if self._img_to_process_count:
+            self.log("Images are being processed, ignoring the save request")
+            return False
+
         # Asks for a new project name if needed
         if force_save_as or self._current_project is None:
             save = False
@@ -807,6 +931,11 @@ class MainWindow(Tk):
         self.log("Setting up the processing-related objects")
         self._processed_images_count.set(0)
         self._img_to_process_count = len(file_names)
+        self._nb_workers = self.settings.processing_workers.get()
+        self._segmentation.tile_size = self.settings.tile_size.get()
+        self._pipeline_depths = (
+            self.settings.decode_queue_depth.get(),
+            self.settings.post_processing_queue_depth.get())
         self._process_images_button['text'] = 'Stop Processing'
         self._process_images_button.configure(command=self._stop_processing)
         self._processing_label['text'] = f"0 of {len(file_names)} Images " \
@@ -853,8 +982,11 @@ class MainWindow(Tk):
         """Main loop of the thread in charge of processing the images.
 
         Discards all the received jobs when the stop event is set. Otherwise,
-        handles sequentially all the received jobs until the job queue is
-        exhausted or until told to stop.
+        handles all the received jobs in the pipeline of the segmentation until
+        the job queue is exhausted or until told to stop. If several processing
+        workers are requested, the jobs are instead dispatched to a pool of
+        processes and their results are collected in the same order as the
+        jobs.
         Also, signals when done so that the interface is reset after the last
         job in the queue was handled.
         """
@@ -866,6 +998,8 @@ class MainWindow(Tk):
 
             # If the stop_event is set, we just have to discard all the jobs
             if self._stop_processing_event.is_set():
+                # Waiting for the jobs being processed in the pool to finish
+                self._collect_results(wait=True)
                 while True:
                     try:
                         job = self._thread_queue.get(block=True, timeout=0.5)
@@ -891,20 +1025,18 @@ class MainWindow(Tk):
 
                     # Signal that all images have been processed
                     if job is None:
+                        self._collect_results(wait=True)
                         self.log("Processing queue empty, signaling to UI "
                                  "thread")
                         self._ui_queue.put_nowait('Done')
                         continue
 
-                    (path, nuclei_color, fiber_color, minimum_fiber_intensity,
-                     maximum_fiber_intensity, minimum_nucleus_intensity,
-                     maximum_nucleus_intensity, minimum_nucleus_diameter,
-                     minimum_nuclei_count) = job
                     self.log(f"Processing thread received job: "
                              f"{', '.join(map(str, job))}")
 
                 # Shouldn't happen but here as a safety
                 except Empty:
+                    self._collect_results(wait=False)
                     continue
 
                 # Not processing if the user wants to stop the computation
@@ -912,41 +1044,213 @@ class MainWindow(Tk):
                     self.log("Stop event was set, aborting processing")
                     continue
 
-                try:
-                    # Now processing the image
-                    file, nuclei_out, nuclei_in, fiber_contours, area = \
-                        self._segmentation(path,
-                                           nuclei_color,
-                                           fiber_color,
-                                           minimum_fiber_intensity,
-                                           maximum_fiber_intensity,
-                                           minimum_nucleus_intensity,
-                                           maximum_nucleus_intensity,
-                                           minimum_nucleus_diameter,
-                                           minimum_nuclei_count)
-                    self.log(f"Segmentation returned file: {file}, "
-                             f"nuclei out: {len(nuclei_out)}, "
-                             f"nuclei in: {len(nuclei_in)}, "
-                             f"fiber contours: {len(fiber_contours)}, "
-                             f"area: {area}")
-
-                    # Not updating if the user wants to stop the computation
-                    if self._stop_processing_event.is_set():
-                        self.log("Stop event was set, aborting processing")
+                # Dispatching the job to the pool of workers if requested
+                if self._nb_workers > 1:
+                    self._submit_job(job)
+                    continue
+
+                # Otherwise, processing this job and the following ones in
+                # the pipeline of the segmentation
+                self._run_pipeline(job)
+
+        # Releasing the worker processes, if any
+        self._shutdown_pool(wait=False)
+
+        self.log("Processing thread finished")
+
+    def _send_result(self,
+                     file: Path,
+                     nuclei_out: list[tuple[float, float]],
+                     nuclei_in: list[tuple[float, float]],
+                     fiber_contours: tuple,
+                     area: float) -> None:
+        """Passes the result of the processing of one image to the UI thread,
+        unless the user requested the computation to stop.
+
+        Args:
+            file: The path to the processed image.
+            nuclei_out: The positions of the nuclei outside the fibers.
+            nuclei_in: The positions of the nuclei inside the fibers.
+            fiber_contours: The positions of the contour points of the fibers.
+            area: The ratio of fiber area over the total image area.
+        """
+
+        self.log(f"Segmentation returned file: {file}, "
+                 f"nuclei out: {len(nuclei_out)}, "
+                 f"nuclei in: {len(nuclei_in)}, "
+                 f"fiber contours: {len(fiber_contours)}, "
+                 f"area: {area}")
+
+        # Not updating if the user wants to stop the computation
+        if self._stop_processing_event.is_set():
+            self.log("Stop event was set, aborting processing")
+            return
+
+        # Passing the result of the processing to the UI thread
+        self.log("Passing precessed data to the UI thread")
+        self._ui_queue.put_nowait(ProcessResult(
+            nuclei_out, nuclei_in, fiber_contours, area, file))
+
+    def _run_pipeline(self, first_job: tuple) -> None:
+        """Processes the received jobs in the pipeline of the segmentation,
+        until the job queue is exhausted or until told to stop.
+
+        The next images are decoded and post-processed while Cellpose
+        processes the current one, and the results are collected in the same
+        order as the jobs.
+
+        Args:
+            first_job: The first job to process, already acquired from the job
+                queue.
+        """
+
+        exhausted = Event()
+
+        def jobs() -> Iterator[tuple]:
+            """Yields the jobs from the job queue, until the queue is
+            exhausted or until told to stop."""
+
+            job = first_job
+            while True:
+                yield job
+
+                while True:
+                    # Not processing if the user wants to stop the computation
+                    if (self._stop_processing_event.is_set()
+                            or self._stop_thread):
+                        return
+                    try:
+                        job = self._thread_queue.get(block=True, timeout=0.5)
+                        break
+                    except Empty:
                         continue
 
-                    # Passing the result of the processing to the UI thread
-                    self.log("Passing precessed data to the UI thread")
-                    self._ui_queue.put_nowait(ProcessResult(
-                        nuclei_out, nuclei_in, fiber_contours, area, file))
+                # Signal that all images have been processed
+                if job is None:
+                    exhausted.set()
+                    return
+
+                self.log(f"Processing thread received job: "
+                         f"{', '.join(map(str, job))}")
+
+        for path, result in self._segmentation.pipeline(
+                jobs(), *self._pipeline_depths, self._stop_processing_event):
+
+            # Displaying any error in an error window
+            if isinstance(result, Exception):
+                self._logger.exception("Exception caught wile processing "
+                                       "image", exc_info=result)
+                self._ui_queue.put_nowait(ProcessError(path, result))
+            else:
+                self._send_result(*result)
+
+        if exhausted.is_set():
+            self.log("Processing queue empty, signaling to UI thread")
+            self._ui_queue.put_nowait('Done')
+
+    def _submit_job(self, job: tuple) -> None:
+        """Sends a job to the pool of processing workers.
+
+        At most one job per worker is being processed at once, so that
+        stopping the computation only requires waiting for the running jobs.
+
+        Args:
+            job: The arguments to pass to the segmentation for this job.
+        """
+
+        from .image_segmentation import process_in_worker
+
+        # Waiting for a worker to be available, collecting its result
+        pool = self._get_pool()
+        while len(self._pending) >= self._pool_size:
+            self._collect_results(wait=True, max_results=1)
+
+        self.log(f"Sending the job for {job[0]} to the processing pool")
+        try:
+            self._pending.append((job[0],
+                                  pool.submit(process_in_worker, *job)))
+
+        # The pool is broken if a worker died, it will be re-created
+        except (Exception,) as exc:
+            self._logger.exception("Exception caught wile sending a job to "
+                                   "the processing pool", exc_info=exc)
+            self._ui_queue.put_nowait(ProcessError(job[0], exc))
+            self._shutdown_pool(wait=False)
+
+    def _collect_results(self,
+                         wait: bool,
+                         max_results: int | None = None) -> None:
+        """Passes the results of the processing pool to the UI thread, in the
+        same order as the jobs were submitted.
 
-                # Displaying any error in an error window
-                except (Exception,) as exc:
-                    self._logger.exception("Exception caught wile processing "
-                                           "image", exc_info=exc)
+        Args:
+            wait: If True, waits for the pending jobs to finish. Otherwise,
+                only collects the results that are already available.
+            max_results: If given, collects at most this number of results.
+        """
+
+        collected = 0
+        while self._pending and (max_results is None
+                                 or collected < max_results):
+
+            # Collecting the results in order, to preserve the display order
+            path, future = self._pending[0]
+            if not wait and not future.done():
+                return
+            self._pending.popleft()
+            collected += 1
+
+            try:
+                self._send_result(*future.result())
+
+            # Displaying any error in an error window
+            except (Exception,) as exc:
+                self._logger.exception("Exception caught wile processing "
+                                       "image", exc_info=exc)
+                if not self._stop_processing_event.is_set():
                     self._ui_queue.put_nowait(ProcessError(path, exc))
 
-        self.log("Processing thread finished")
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Returns the pool of processing workers, and (re-)creates it if the
+        requested number of workers changed.
+
+        Each worker process loads its own instance of the segmentation class.
+        The pool is also re-created if the tile size changed, as it is set when
+        loading the segmentation class.
+        """
+
+        from .image_segmentation import init_worker
+
+        tile_size = self._segmentation.tile_size
+        if (self._pool is None or self._pool_size != self._nb_workers
+                or self._pool_tile_size != tile_size):
+            self._shutdown_pool(wait=True)
+            self.log(f"Starting a pool of {self._nb_workers} processing "
+                     f"workers")
+            # Spawning is safer than forking a process running Tkinter
+            self._pool = ProcessPoolExecutor(max_workers=self._nb_workers,
+                                             mp_context=get_context('spawn'),
+                                             initializer=init_worker,
+                                             initargs=(self._cache_folder,
+                                                       tile_size))
+            self._pool_size = self._nb_workers
+            self._pool_tile_size = tile_size
+
+        return self._pool
+
+    def _shutdown_pool(self, wait: bool) -> None:
+        """Stops the pool of processing workers if it exists.
+
+        Args:
+            wait: If True, waits for the worker processes to exit.
+        """
+
+        if self._pool is not None:
+            self.log("Stopping the pool of processing workers")
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+            self._pool_size = 0
+            self._pending.clear()
 
     def _handle_ui_queue(self) -> None:
         """Regularly polls the UI queue and handles the messages from the
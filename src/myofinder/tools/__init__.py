@@ -5,7 +5,17 @@ from .save_popup import SavePopup
 from .settings_window import SettingsWindow
 from .splash_window import SplashWindow
 from .structure_classes import (Settings, Nucleus, Fiber, Nuclei, Fibers,
-                                GraphicalElement, SelectionBox, TableItems,
-                                TableEntry, ProcessResult, ProcessError)
+                                NucleiIndex, GraphicalElement, SelectionBox,
+                                TableItems, TableEntry, EntrySummary,
+                                ProcessResult, ProcessError)
 from .warning_window import WarningWindow
-from ._check_image import check_image
+from ._check_image import check_image, load_channels
+from ._image_source import ImageSource
+from ._project_data import (has_project_data, is_saved, save_data, load_data,
+                            mark_saved)
+from ._project_export import (overlay_colors, overlay_formats, save_settings,
+                              save_originals, save_table, save_overlay_images,
+                              save_overlay, saved_overlays)
+from ._project_save import (ProjectSave, recover_project, recover_projects,
+                            recover_interrupted_save)
+from ._segmentation_cache import SegmentationCache
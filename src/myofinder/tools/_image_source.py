@@ -0,0 +1,420 @@
+# coding: utf-8
+
+from pathlib import Path
+from cv2 import imread, IMREAD_ANYCOLOR, IMREAD_ANYDEPTH
+from numpy import (ndarray, memmap, empty, zeros, uint8, dtype, right_shift,
+                   multiply, prod, array)
+from collections.abc import Sequence
+from threading import Lock
+from math import ceil
+from typing import Any
+from tifffile import TiffFile, TiffFileError, PLANARCONFIG, PHOTOMETRIC
+import logging
+
+# A region of an image, as a pair of slices along the rows and the columns
+Region = tuple[slice, slice]
+
+
+class _TiffPlane:
+    """Class reading regions of one channel of a TIFF page, by decoding only
+    the strips or tiles that overlap with the region."""
+
+    def __init__(self, tiff: TiffFile, page: Any, sample: int,
+                 lock: Lock) -> None:
+        """Sets the arguments and computes the layout of the segments.
+
+        Args:
+            tiff: The opened TIFF file.
+            page: The page containing the channel.
+            sample: The index of the channel in the samples of the page.
+            lock: Lock protecting the access to the file.
+        """
+
+        self._tiff = tiff
+        self._page = page
+        self._sample = sample
+        self._lock = lock
+
+        self.shape: tuple[int, int] = (page.imagelength, page.imagewidth)
+        self.dtype: dtype = page.dtype
+
+        # The strips or tiles are laid out in a grid, and ordered by sample
+        # first if the samples are stored separately
+        self._segment_shape = page.chunks[0], page.chunks[1]
+        self._rows = ceil(self.shape[0] / self._segment_shape[0])
+        self._columns = ceil(self.shape[1] / self._segment_shape[1])
+        self._separate = (page.planarconfig == PLANARCONFIG.SEPARATE and
+                          page.samplesperpixel > 1)
+
+    def __getitem__(self, region: Region) -> ndarray:
+        """Decodes the segments overlapping a region of the channel, and
+        returns the region.
+
+        Args:
+            region: The region to read, as slices with a positive step.
+        """
+
+        rows, columns = region
+        top, bottom, _ = rows.indices(self.shape[0])
+        left, right, _ = columns.indices(self.shape[1])
+        plane = zeros((max(bottom - top, 0), max(right - left, 0)),
+                      dtype=self.dtype)
+
+        height, width = self._segment_shape
+        offset = self._sample * self._rows * self._columns \
+            if self._separate else 0
+
+        for row in range(top // height, ceil(bottom / height)):
+            for column in range(left // width, ceil(right / width)):
+                index = offset + row * self._columns + column
+                if not self._page.databytecounts[index]:
+                    continue
+
+                with self._lock:
+                    handle = self._tiff.filehandle
+                    handle.seek(self._page.dataoffsets[index])
+                    data = handle.read(self._page.databytecounts[index])
+                segment, (_, _, y, x, _), _ = self._page.decode(
+                    data, index, jpegtables=self._page.jpegtables)
+
+                # Keeping only the channel, and the part inside the region
+                segment = segment[0, :, :, 0 if self._separate
+                                  else self._sample]
+                y_min, y_max = max(top, y), min(bottom, y + segment.shape[0])
+                x_min, x_max = max(left, x), min(right, x + segment.shape[1])
+                plane[y_min - top:y_max - top, x_min - left:x_max - left] = \
+                    segment[y_min - y:y_max - y, x_min - x:x_max - x]
+
+        return plane[::rows.step or 1, ::columns.step or 1]
+
+
+class ImageSource:
+    """Class giving access to the channels of an image file, without
+    necessarily loading the entire image in memory.
+
+    Uncompressed TIFF files are memory-mapped, and the strips or tiles of the
+    other TIFF files are decoded only when a region overlapping them is read.
+    This way, only the requested channels and regions are read from the disk,
+    which allows handling very large images. The other files, as well as TIFF
+    files with float data, are entirely decoded when opening them.
+
+    The channels are indexed in the RGB order, 0 being red, 1 green and 2
+    blue. Grayscale images are loaded in the blue channel, the red and green
+    channels being empty. For TIFF files storing each channel in a separate
+    page or in separate planes of a single page, the first page or plane is
+    the red channel, the second the green one, and the third the blue one.
+    """
+
+    def __init__(self, image_path: Path) -> None:
+        """Opens the image, and decodes it if it cannot be read lazily.
+
+        Args:
+            image_path: The path to the image to open.
+
+        Raises:
+            IOError: If the image cannot be read or has an unsupported format.
+        """
+
+        self._logger = logging.getLogger("MyoFInDer.ImageSource")
+
+        self.path = Path(image_path)
+        self._tiff: TiffFile | None = None
+        self._lock = Lock()
+        self._bounds: tuple[float, float] | None = None
+        self._planes: list[ndarray | _TiffPlane | None] | None = None
+
+        if self.path.suffix.lower() in ('.tif', '.tiff'):
+            self._open_tiff()
+        if self._planes is None:
+            self._decode()
+
+        planes = [plane for plane in self._planes if plane is not None]
+        self.shape: tuple[int, int] = tuple(planes[0].shape[:2])
+        self.dtype: dtype = planes[0].dtype
+
+    def __enter__(self) -> 'ImageSource':
+        """Allows using the image source as a context manager."""
+
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Closes the file when exiting the context."""
+
+        self.close()
+
+    @property
+    def lazy(self) -> bool:
+        """Whether the image is read from the disk on demand, rather than
+        entirely decoded in memory."""
+
+        return self._tiff is not None
+
+    def close(self) -> None:
+        """Closes the image file, after which no more region can be read."""
+
+        if self._tiff is not None:
+            self._tiff.close()
+            self._tiff = None
+        self._planes = None
+
+    def channel(self, channel: int) -> ndarray | _TiffPlane | None:
+        """Returns an object giving access to one channel of the image with its
+        original bit depth, that only reads the data when it is sliced, or
+        None if the channel is empty.
+
+        Args:
+            channel: The index of the channel, 0 being red, 1 green and 2
+                blue.
+        """
+
+        return self._planes[channel]
+
+    def read(self,
+             channels: Sequence[int],
+             region: Region | None = None,
+             out: ndarray | None = None) -> tuple[ndarray, ...]:
+        """Reads a region of the given channels, and converts it to 8-bits.
+
+        Args:
+            channels: The indexes of the channels to read, 0 being red, 1
+                green and 2 blue.
+            region: The region to read, as slices along the rows and the
+                columns. The slices may have a positive step for reading a
+                downsampled region. The entire image is read if not given.
+            out: If given, a 3-dimensional uint8 array with the shape of the
+                region and one channel per requested channel, in which the
+                channels are written.
+
+        Returns:
+            The requested channels as 2-dimensional 8-bits arrays, in the same
+            order as the given indexes. If the image is already 8-bits, fully
+            decoded, and no output buffer is given, the returned channels are
+            views of the decoded image. If an output buffer was given, the
+            channels are views of it.
+        """
+
+        if region is None:
+            region = (slice(None), slice(None))
+        shape = tuple(len(range(*part.indices(size)))
+                      for part, size in zip(region, self.shape))
+
+        if out is not None and (out.dtype != uint8 or
+                                out.shape != (*shape, len(channels))):
+            raise ValueError(f"The output buffer should be a uint8 array of "
+                             f"shape {(*shape, len(channels))}, got "
+                             f"{out.dtype} of shape {out.shape}")
+
+        loaded = list()
+        for i, channel in enumerate(channels):
+            buffer = out[:, :, i] if out is not None else None
+            plane = self._planes[channel]
+
+            # The missing channels are left empty
+            if plane is None:
+                if buffer is None:
+                    buffer = zeros(shape, dtype=uint8)
+                else:
+                    buffer[:] = 0
+                loaded.append(buffer)
+                continue
+
+            data = _to_8_bits(plane[region], self._bounds, buffer)
+
+            # Not returning views of the file, that would keep it mapped
+            if isinstance(data, memmap):
+                data = array(data)
+            loaded.append(data)
+
+        return tuple(loaded)
+
+    def _open_tiff(self) -> None:
+        """Opens a TIFF file and sets the lazy planes, if its layout allows
+        it."""
+
+        try:
+            tiff = TiffFile(self.path)
+        except (TiffFileError, OSError, ValueError):
+            return
+
+        try:
+            planes = self._tiff_planes(tiff)
+        except (TiffFileError, OSError, ValueError, IndexError, KeyError):
+            self._logger.exception(f"Could not read the layout of "
+                                   f"{self.path}")
+            planes = None
+
+        if planes is None or not any(plane is not None for plane in planes):
+            tiff.close()
+            return
+
+        self._tiff = tiff
+        self._planes = planes
+        self._logger.log(logging.DEBUG, f"Opened {self.path} lazily")
+
+    def _tiff_planes(self, tiff: TiffFile
+                     ) -> list[ndarray | _TiffPlane | None] | None:
+        """Returns the lazy planes of the red, green and blue channels of a
+        TIFF file, or None if its layout is not supported.
+
+        Args:
+            tiff: The opened TIFF file.
+        """
+
+        series = tiff.series[0]
+        keyframe = series.keyframe
+
+        # Float data would need to be entirely read for scaling it, and the
+        # volumetric pages are not supported. The pages whose values are not
+        # directly intensities, like palette images, are left to OpenCV
+        if (keyframe.dtype is None or not _supported(keyframe.dtype)
+                or keyframe.dtype.kind == 'f' or keyframe.imagedepth > 1
+                or keyframe.photometric not in (PHOTOMETRIC.MINISBLACK,
+                                                PHOTOMETRIC.RGB)):
+            return None
+
+        # Several grayscale pages, one per channel
+        if len(series) > 1 and keyframe.ndim == 2:
+            axes = series.axes[:-2]
+            if 'C' in axes:
+                index = axes.index('C')
+                count = series.shape[index]
+                stride = int(prod(series.shape[index + 1:-2]))
+            else:
+                count, stride = len(series), 1
+            return [self._tiff_plane(tiff, series.pages[channel * stride], 0)
+                    if channel < count else None for channel in range(3)]
+
+        if len(series) > 1:
+            return None
+        page = series.pages[0]
+
+        # A single grayscale page
+        if page.ndim == 2:
+            return [None, None, self._tiff_plane(tiff, page, 0)]
+
+        if page.ndim != 3:
+            return None
+        samples = page.samplesperpixel
+
+        # A grayscale image with an alpha channel
+        if samples == 2 and page.extrasamples:
+            return [None, None, self._tiff_plane(tiff, page, 0)]
+
+        # Color images with interleaved or separate channels, ignoring the
+        # alpha channel if any
+        return [self._tiff_plane(tiff, page, channel)
+                if channel < samples else None for channel in range(3)]
+
+    def _tiff_plane(self, tiff: TiffFile, page: Any,
+                    sample: int) -> ndarray | _TiffPlane:
+        """Returns a lazy array giving access to one sample of a TIFF page.
+
+        The page is memory-mapped if it is stored uncompressed and
+        contiguously in the file. Otherwise, its strips or tiles are decoded
+        on demand.
+
+        Args:
+            tiff: The opened TIFF file.
+            page: The page containing the sample.
+            sample: The index of the sample to read.
+        """
+
+        if page.is_memmappable:
+            mapped = memmap(self.path, mode='r',
+                            dtype=page.dtype.newbyteorder(tiff.byteorder),
+                            offset=page.dataoffsets[0], shape=page.shape)
+            if page.ndim == 2:
+                return mapped
+            if page.planarconfig == PLANARCONFIG.SEPARATE:
+                return mapped[sample]
+            return mapped[:, :, sample]
+
+        return _TiffPlane(tiff, page, sample, self._lock)
+
+    def _decode(self) -> None:
+        """Entirely decodes the image with OpenCV, keeping its original bit
+        depth."""
+
+        image = imread(str(self.path), IMREAD_ANYCOLOR | IMREAD_ANYDEPTH)
+
+        # In case the file cannot be reached or has an unsupported format
+        if (image is None or image.ndim not in (2, 3)
+                or (image.ndim == 3 and image.shape[2] not in (3, 4))
+                or not _supported(image.dtype)):
+            raise IOError(f"Could not load the image {self.path}")
+
+        # Ignoring the alpha channel if any
+        if image.ndim == 3:
+            image = image[:, :, :3]
+
+        # For grayscale images, only the blue channel is not empty
+        # Color images are loaded in the BGR order
+        if image.ndim == 2:
+            self._planes = [None, None, image]
+        else:
+            self._planes = [image[:, :, 2 - channel] for channel in range(3)]
+
+        # The empty channels of grayscale images are part of the extrema
+        if image.dtype.kind == 'f':
+            low, high = image.min(), image.max()
+            if image.ndim == 2:
+                low, high = min(low, 0), max(high, 0)
+            self._bounds = (low, high)
+
+
+def _supported(data_type: dtype) -> bool:
+    """Returns whether an image with the given dtype can be converted to
+    8-bits."""
+
+    return (data_type.kind in 'bf' or
+            (data_type.kind in 'iu' and data_type.itemsize <= 8))
+
+
+def _to_8_bits(channel: ndarray,
+               bounds: tuple[float, float] | None,
+               out: ndarray | None) -> ndarray:
+    """Converts one channel of an image to 8-bits.
+
+    Args:
+        channel: The channel to convert.
+        bounds: For float images, the values mapped to 0 and 255.
+        out: If given, the uint8 array where to write the converted channel.
+
+    Returns:
+        The converted channel, that might be a view of the given channel if it
+        is already 8-bits and no output array was given.
+    """
+
+    kind, depth = channel.dtype.kind, channel.dtype.itemsize * 8
+
+    # No conversion needed, avoiding a copy if possible
+    if kind == 'u' and depth == 8:
+        if out is None:
+            return channel
+        out[:] = channel
+        return out
+
+    # The conversions write directly to the output, without intermediate
+    # arrays of the original bit depth
+    if out is None:
+        out = empty(channel.shape, dtype=uint8)
+
+    # If it's boolean, the image will be black and white
+    if kind == 'b':
+        multiply(channel, 255, out=out, casting='unsafe')
+
+    # If it's int, keeping the most significant bits and offsetting to uint
+    elif kind == 'i':
+        right_shift(channel, depth - 8, out=out, casting='unsafe')
+        out ^= 128
+
+    # If it's uint, simply keeping the most significant bits
+    elif kind == 'u':
+        right_shift(channel, depth - 8, out=out, casting='unsafe')
+
+    # If it's float, casting to [0-1] and then to uint8
+    else:
+        low, high = bounds
+        out[:] = (channel - low) / (high - low) * 255
+
+    return out
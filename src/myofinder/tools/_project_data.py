@@ -0,0 +1,308 @@
+# coding: utf-8
+
+from pathlib import Path
+from pickle import load
+from copy import deepcopy
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+import json
+import logging
+import numpy as np
+
+from .structure_classes import (TableItems, TableEntry, EntrySummary, Nuclei,
+                                Fibers)
+
+logger = logging.getLogger("MyoFInDer.ProjectData")
+
+# The folder of a project holding its data, and the file indexing its content
+data_folder = 'Data'
+_index_file = 'index.json'
+
+# The file holding the data of the projects saved by previous versions
+_legacy_file = 'data.pickle'
+
+# The version of the format, to increment whenever it changes
+_format_version = 1
+
+# The suffixes of the files holding the data of one image
+_nuclei_suffix = '.nuclei.npy'
+_vertices_suffix = '.vertices.npy'
+_offsets_suffix = '.offsets.npy'
+
+# The layout of the array holding the nuclei of one image, the first bit of the
+# status being set for the nuclei inside fibers
+_nuclei_dtype = np.dtype([('x', '<f4'), ('y', '<f4'), ('status', 'u1')])
+
+# The maximum number of images whose data is kept in memory after being loaded
+_max_loaded_images = 16
+
+
+class ProjectLoader:
+    """Loads on demand the nuclei and fibers of the images of a saved project.
+
+    It is meant to be given as the loader of the TableEntry objects of the
+    project. Only the data of the most recently loaded images is kept in
+    memory, the one of the other images being released if it wasn't modified.
+    """
+
+    def __init__(self,
+                 directory: Path,
+                 max_loaded: int = _max_loaded_images) -> None:
+        """Sets the arguments.
+
+        Args:
+            directory: The directory where the project is saved.
+            max_loaded: The number of images whose data can be kept in memory
+                at once.
+        """
+
+        self.directory = directory
+        self._folder = directory / data_folder
+        self._max_loaded = max_loaded
+        self._loaded: OrderedDict[int, TableEntry] = OrderedDict()
+
+    def __call__(self, entry: TableEntry) -> tuple[Nuclei, Fibers]:
+        """Reads the nuclei and fibers of an image, and releases the data of
+        the least recently loaded images if too many are in memory."""
+
+        name = Path(entry.path).name
+        logger.log(logging.DEBUG, f"Loading the data of the image {name}")
+        data = (_load_nuclei(self._folder, name),
+                _load_fibers(self._folder, name, entry.summary.area))
+
+        # The modified images are not released, and no longer need tracking
+        self._loaded[id(entry)] = entry
+        self._loaded.move_to_end(id(entry))
+        while len(self._loaded) > self._max_loaded:
+            _, oldest = self._loaded.popitem(last=False)
+            oldest.unload()
+
+        return data
+
+
+def has_project_data(directory: Path) -> bool:
+    """Checks whether a directory contains the data of a saved project, either
+    in the current or in the legacy format."""
+
+    return ((directory / data_folder / _index_file).is_file() or
+            (directory / _legacy_file).is_file())
+
+
+def is_saved(entry: TableEntry, directory: Path) -> bool:
+    """Checks whether the data of an entry is saved and up-to-date in the Data
+    folder of a project."""
+
+    return not entry.modified and _loads_from(entry, directory)
+
+
+def save_data(table_items: TableItems,
+              directory: Path,
+              changed: Iterable[TableEntry] | None = None,
+              progress: Callable[[int, int], None] | None = None) -> None:
+    """Saves the names of the images, the positions of the fibers and the
+    positions and colors of the nuclei.
+
+    The data of each image is stored in .npy files inside the Data folder of
+    the project: one holding the positions and status of the nuclei, one
+    holding the vertices of all the fiber contours, and one holding the offset
+    of each contour among the vertices. An index.json file lists the images
+    along with a summary of their data, and the version of the format.
+
+    Only the files of the images whose data is not already up-to-date in the
+    folder are written.
+
+    Args:
+        table_items: The entries of the project to save.
+        directory: The directory where the data should be saved.
+        changed: If given, the only entries whose data needs to be written, the
+            data of the other ones being already up-to-date in the folder.
+            Otherwise, determined using :func:`is_saved`.
+        progress: If given, called with the number of saved entries and the
+            number of entries to save after each entry.
+    """
+
+    folder = directory / data_folder
+    logger.log(logging.INFO, f"Saving the data to the folder {folder}")
+    folder.mkdir(exist_ok=True)
+
+    if changed is None:
+        changed = [entry for entry in table_items
+                   if not is_saved(entry, directory)]
+    changed = list(changed)
+
+    for i, entry in enumerate(changed, start=1):
+        name = Path(entry.path).name
+        logger.log(logging.DEBUG, f"Saving the data of the image {name}")
+
+        x, y, inside = entry.nuclei.to_arrays()
+        nuclei = np.empty(len(x), dtype=_nuclei_dtype)
+        nuclei['x'], nuclei['y'], nuclei['status'] = x, y, inside
+        vertices, offsets = entry.fibers.to_arrays()
+
+        for suffix, array in ((_nuclei_suffix, nuclei),
+                              (_vertices_suffix, vertices),
+                              (_offsets_suffix, offsets)):
+            # The file may be hard-linked to the one of a previous save, so it
+            # is replaced rather than overwritten
+            (folder / f'{name}{suffix}').unlink(missing_ok=True)
+            np.save(folder / f'{name}{suffix}', array)
+
+        if progress is not None:
+            progress(i, len(changed))
+
+    # The index is written last, so that it only lists complete data
+    images = list()
+    for entry in table_items:
+        summary = entry.summary
+        images.append({'name': Path(entry.path).name,
+                       'nuclei': summary.nuclei,
+                       'nuclei_in': summary.nuclei_in,
+                       'fibers': summary.fibers,
+                       'area': float(summary.area)})
+    (folder / _index_file).unlink(missing_ok=True)
+    with open(folder / _index_file, 'w') as index_file:
+        json.dump({'version': _format_version, 'images': images},
+                  index_file, indent=2)
+
+    # Removing the data of the images that are not part of the project anymore
+    names = {_index_file} | {f"{image['name']}{suffix}" for image in images
+                             for suffix in (_nuclei_suffix, _vertices_suffix,
+                                            _offsets_suffix)}
+    for path in folder.iterdir():
+        if path.name not in names:
+            logger.log(logging.INFO, f"Removing the obsolete file {path}")
+            path.unlink()
+
+    # The legacy data would otherwise be outdated
+    if (directory / _legacy_file).is_file():
+        logger.log(logging.INFO, f"Removing the legacy data file "
+                                 f"{directory / _legacy_file}")
+        (directory / _legacy_file).unlink()
+
+
+def mark_saved(table_items: Iterable[TableEntry],
+               directory: Path,
+               saved: Iterable[TableEntry] | None = None) -> None:
+    """Records that the data of the entries is now up-to-date in the Data
+    folder of a project, and can be loaded from there.
+
+    Args:
+        table_items: The entries of the project that was saved.
+        directory: The directory where the project was saved.
+        saved: If given, the snapshot of the entries that was saved, as
+            returned by :func:`snapshot`, in the same order. The entries that
+            were modified since the snapshot are then left unchanged, as their
+            data in the folder is already outdated.
+    """
+
+    if saved is None:
+        saved = table_items
+
+    loader = ProjectLoader(directory)
+    for entry, copy in zip(table_items, saved):
+        if entry.revision != copy.revision:
+            continue
+        if not _loads_from(entry, directory):
+            entry.loader = loader
+        entry.modified = False
+
+
+def snapshot(table_items: TableItems) -> TableItems:
+    """Returns a copy of the entries of a project that can be saved from
+    another thread, independently of any later change to the original entries.
+
+    The data of the entries that are not loaded is not copied, but loaded
+    later on from the same folder by a distinct loader. The copies have the
+    same revision as the original entries.
+
+    Args:
+        table_items: The entries of the project to copy.
+    """
+
+    loaders: dict[Path, ProjectLoader] = dict()
+    entries = list()
+    for entry in table_items:
+        # The Fiber objects are never modified, only added or removed
+        if entry.loaded:
+            copy = TableEntry(path=entry.path,
+                              nuclei=deepcopy(entry.nuclei),
+                              fibers=Fibers(area=entry.fibers.area,
+                                            fibers=list(entry.fibers)))
+        else:
+            directory = entry.loader.directory
+            copy = TableEntry(path=entry.path,
+                              summary=entry.summary,
+                              loader=loaders.setdefault(
+                                  directory, ProjectLoader(directory)))
+        copy.modified = entry.modified
+        copy.revision = entry.revision
+        entries.append(copy)
+
+    return TableItems(entries=entries)
+
+
+def load_data(directory: Path) -> TableItems:
+    """Loads the names of the images, the positions of the fibers and the
+    positions and colors of the nuclei of a project.
+
+    Only the statistics of each image are read, its nuclei and fibers being
+    loaded when first accessed. Projects saved in the legacy data.pickle
+    format are also supported, and entirely loaded.
+
+    Args:
+        directory: The directory where the project is saved.
+
+    Returns:
+        The entries of the project, with their paths only containing the file
+        names of the images.
+    """
+
+    index_path = directory / data_folder / _index_file
+    if not index_path.is_file():
+        logger.log(logging.INFO, f"Loading project data from the legacy file "
+                                 f"{directory / _legacy_file}")
+        with open(directory / _legacy_file, 'rb') as save_file:
+            return load(save_file)
+
+    logger.log(logging.INFO, f"Loading project data from {index_path}")
+    with open(index_path) as index_file:
+        index = json.load(index_file)
+    if index['version'] > _format_version:
+        raise ValueError(f"The project data was saved with a newer version "
+                         f"of the format ({index['version']}), that is not "
+                         f"supported")
+
+    loader = ProjectLoader(directory)
+    return TableItems(entries=[
+        TableEntry(path=image['name'],
+                   summary=EntrySummary(nuclei=image['nuclei'],
+                                        nuclei_in=image['nuclei_in'],
+                                        fibers=image['fibers'],
+                                        area=image['area']),
+                   loader=loader)
+        for image in index['images']])
+
+
+def _loads_from(entry: TableEntry, directory: Path) -> bool:
+    """Checks whether the data of an entry is loaded from the Data folder of a
+    project."""
+
+    return (isinstance(entry.loader, ProjectLoader) and
+            entry.loader.directory == directory)
+
+
+def _load_nuclei(folder: Path, name: str) -> Nuclei:
+    """Loads the nuclei of one image from a memory-mapped file."""
+
+    nuclei = np.load(folder / f'{name}{_nuclei_suffix}', mmap_mode='r')
+    return Nuclei.from_arrays(nuclei['x'], nuclei['y'],
+                              nuclei['status'] & 1)
+
+
+def _load_fibers(folder: Path, name: str, area: float) -> Fibers:
+    """Loads the fibers of one image from memory-mapped files."""
+
+    return Fibers.from_arrays(
+        np.load(folder / f'{name}{_vertices_suffix}', mmap_mode='r'),
+        np.load(folder / f'{name}{_offsets_suffix}', mmap_mode='r'),
+        area)
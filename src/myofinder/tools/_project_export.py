@@ -0,0 +1,507 @@
+# coding: utf-8
+
+from xlsxwriter import Workbook
+from shutil import copyfile, rmtree
+from cv2 import (polylines, ellipse, imwrite, cvtColor, COLOR_RGB2BGR,
+                 IMWRITE_PNG_COMPRESSION, IMWRITE_JPEG_QUALITY,
+                 IMWRITE_TIFF_COMPRESSION)
+from pathlib import Path
+from pickle import dump, load
+from concurrent.futures import ProcessPoolExecutor, Future, wait, \
+    FIRST_COMPLETED
+from multiprocessing import get_context
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+import logging
+import numpy as np
+
+from .structure_classes import TableItems, TableEntry
+from ._check_image import check_image
+
+logger = logging.getLogger("MyoFInDer.ProjectExport")
+
+color_to_bgr = {'blue': (255, 0, 0),
+                'green': (0, 255, 0),
+                'red': (0, 0, 255),
+                'yellow': (0, 255, 255),
+                'cyan': (255, 255, 0),
+                'magenta': (255, 0, 255),
+                'black': (0, 0, 0),
+                'white': (255, 255, 255),
+                '#FFA500': (0, 165, 255),
+                '#32CD32': (50, 205, 50),
+                '#646464': (100, 100, 100)}
+
+# The formats in which the overlay images can be saved, 'same' keeping the
+# format of the original image
+overlay_formats = ('same', 'png', 'jpg', 'tif')
+
+
+def overlay_colors(nuclei_colour: str,
+                   fiber_colour: str) -> tuple[str, str, str]:
+    """Returns the colors in which the nuclei and fibers are drawn, that depend
+    on the selected channels.
+
+    Args:
+        nuclei_colour: The color of the nuclei channel, as a string.
+        fiber_colour: The color of the fiber channel, as a string.
+
+    Returns:
+        The color of the nuclei outside of fibers, the color of the nuclei
+        inside fibers, and the color of the fibers.
+    """
+
+    # The nuclei outside of fibers are drawn in the remaining channel color
+    num_to_color = {0: 'blue', 1: '#32CD32', 2: 'red'}
+    color_to_num = {'blue': 0, 'green': 1, 'red': 2}
+
+    fiber_num = color_to_num[fiber_colour]
+    nuclei_num = color_to_num[nuclei_colour]
+
+    if not (fiber_num == 2 and nuclei_num == 0):
+        nuc_col_out = num_to_color[3 - fiber_num - nuclei_num]
+    # Special case when the fiber channel is red and the nuclei are blue
+    else:
+        nuc_col_out = 'red'
+
+    # Color of the nuclei inside fibers
+    if nuclei_colour == 'green':
+        nuc_col_in = 'magenta' if fiber_colour == 'red' else 'blue'
+    elif nuclei_colour == 'red':
+        nuc_col_in = '#646464' if fiber_colour == 'blue' else 'white'
+    else:
+        nuc_col_in = 'yellow'
+
+    # Color of the fibers
+    if fiber_colour == 'green':
+        fib_color = 'magenta'
+    elif fiber_colour == 'blue':
+        fib_color = 'magenta' if nuclei_colour == 'green' else 'white'
+    elif fiber_colour == 'red':
+        fib_color = 'cyan' if nuclei_colour == 'green' else '#FFA500'
+    else:
+        raise ValueError(f"Got incorrect fiber color: {fiber_colour}")
+
+    return nuc_col_out, nuc_col_in, fib_color
+
+
+def save_settings(settings: dict[str, Any], directory: Path) -> None:
+    """Saves the values of the settings to a settings.pickle file.
+
+    Args:
+        settings: The values of the settings, indexed by name.
+        directory: The path to the project folder.
+    """
+
+    # The file may be hard-linked to the one of a previous save, so it is
+    # replaced rather than overwritten
+    (directory / 'settings.pickle').unlink(missing_ok=True)
+    with open(directory / 'settings.pickle', 'wb') as param_file:
+        dump(settings, param_file, protocol=4)
+        logger.log(logging.INFO, f"Saved the settings at: "
+                                 f"{directory / 'settings.pickle'}")
+
+
+def saved_overlays(table_items: TableItems,
+                   directory: Path
+                   ) -> tuple[Path, tuple[str, str, str], str, int] | None:
+    """Returns the parameters with which the overlay images of a saved project
+    were drawn, if they are all present and up-to-date.
+
+    The parameters are read from the settings.pickle file of the project, that
+    is written along with the overlay images of all the changed entries.
+
+    Args:
+        table_items: The entries of the project, as loaded from its folder.
+        directory: The path to the project folder.
+
+    Returns:
+        The folder of the project, the colors as returned by
+        :func:`overlay_colors`, the format and the compression level of the
+        overlay images, or None if the overlay images were not saved with the
+        last save of the project or if some of them are missing.
+    """
+
+    settings_file = directory / 'settings.pickle'
+    if not settings_file.is_file():
+        return
+
+    with open(settings_file, 'rb') as param_file:
+        settings = load(param_file)
+
+    # Projects saved by previous versions may not store all the parameters
+    keys = ('save_overlay', 'nuclei_colour', 'fiber_colour', 'overlay_format',
+            'overlay_compression')
+    if not all(key in settings for key in keys):
+        return
+    if not settings['save_overlay']:
+        return
+
+    folder = directory / 'Overlay Images'
+    if not all((folder / overlay_name(Path(entry.path).name,
+                                      settings['overlay_format'])).is_file()
+               for entry in table_items):
+        return
+
+    return (directory,
+            overlay_colors(settings['nuclei_colour'],
+                           settings['fiber_colour']),
+            settings['overlay_format'], settings['overlay_compression'])
+
+
+def save_originals(table_items: TableItems,
+                   directory: Path,
+                   on_error: Callable[[Path], None] | None = None,
+                   progress: Callable[[int, int], None] | None = None
+                   ) -> None:
+    """Saves the original images in a sub-folder of the project folder.
+
+    The paths of the entries are updated to point to the saved images.
+
+    Args:
+        table_items: The entries of the project to save.
+        directory: The path to the project folder.
+        on_error: If given, called with the path to any image that couldn't be
+            saved.
+        progress: If given, called with the number of handled images and the
+            total number of images after each image.
+    """
+
+    # Creating the directory if it doesn't exit
+    if not (directory / 'Original Images').is_dir():
+        logger.log(logging.INFO,
+                   f"Creating the folder for saving the original images at: "
+                   f"{directory / 'Original Images'}")
+        Path.mkdir(directory / 'Original Images')
+
+    logger.log(logging.INFO, "Saving the original images")
+
+    # Actually saving the images
+    for i, item in enumerate(table_items, start=1):
+        # Saving only if the images are not saved yet
+        if directory not in item.path.parents:
+            new_path = directory / 'Original Images' / item.path.name
+            logger.log(logging.INFO, f"Saving the image: {new_path}")
+
+            # Handling the case when the image cannot be loaded
+            try:
+                new_path.unlink(missing_ok=True)
+                copyfile(item.path, new_path)
+            except FileNotFoundError:
+                logger.log(logging.INFO,
+                           f"ERROR! Could not save file {new_path}")
+                if on_error is not None:
+                    on_error(item.path)
+            else:
+                # Changing the saved path for the image
+                table_items.rename(item.path, new_path)
+
+        else:
+            logger.log(logging.INFO,
+                       f"Skipping {item.path} as it is already saved")
+
+        if progress is not None:
+            progress(i, len(table_items))
+
+
+def save_table(table_items: TableItems, directory: Path) -> None:
+    """Saves a .xlsx file containing stats about the images of the project.
+
+    Args:
+        table_items: The entries of the project to save.
+        directory: The path to the project folder.
+    """
+
+    # Creating the Excel file, replacing any previous one
+    (directory / str(directory.name + '.xlsx')).unlink(missing_ok=True)
+    workbook = Workbook(str(directory / str(directory.name + '.xlsx')))
+    worksheet = workbook.add_worksheet()
+
+    logger.log(logging.INFO,
+               f"Saving an overview of the data as an Excel file at "
+               f"{directory / str(directory.name + '.xlsx')}")
+
+    # Bold style for a nicer layout
+    bold = workbook.add_format({'bold': True, 'align': 'center'})
+
+    # Writing the labels
+    worksheet.write(0, 0, "Image names", bold)
+    worksheet.write(0, 1, "Total number of nuclei", bold)
+    worksheet.write(0, 2, "Number of tropomyosin positive nuclei", bold)
+    worksheet.write(0, 3, "Fusion index", bold)
+    worksheet.write(0, 4, "Fiber area ratio", bold)
+
+    # Setting the column widths
+    worksheet.set_column(
+        0, 0, width=max(11, max(len(file.name) for file
+                                in table_items.file_names)
+                        if table_items else 0))
+    worksheet.set_column(1, 1, width=22)
+    worksheet.set_column(2, 2, width=37)
+    worksheet.set_column(3, 3, width=17)
+    worksheet.set_column(4, 4, width=16)
+
+    for i, item in enumerate(table_items):
+        # The summary doesn't require the data of the image to be loaded
+        summary = item.summary
+
+        # Writing the names of the images
+        worksheet.write(i + 2, 0, item.path.name)
+
+        # Writing the total number of nuclei
+        worksheet.write(i + 2, 1, summary.nuclei)
+
+        # Writing the number of nuclei in fibers
+        worksheet.write(i + 2, 2, summary.nuclei_in)
+
+        # Writing the ratio of nuclei in over the total number of nuclei
+        if summary.nuclei > summary.nuclei_in:
+            worksheet.write(i + 2, 3, summary.nuclei_in / summary.nuclei)
+        else:
+            worksheet.write(i + 2, 3, 'NA')
+
+        # Writing the percentage area of fibers
+        worksheet.write(i + 2, 4, f'{summary.area * 100:.2f}')
+
+    workbook.close()
+
+
+def overlay_name(name: str, overlay_format: str = 'same') -> str:
+    """Returns the file name of the overlay image of an image.
+
+    Args:
+        name: The file name of the original image.
+        overlay_format: The format in which the overlay image is saved, one of
+            :obj:`overlay_formats`.
+    """
+
+    if overlay_format == 'same':
+        return name
+    return f'{Path(name).stem}.{overlay_format}'
+
+
+def save_overlay_images(table_items: TableItems,
+                        directory: Path,
+                        colors: tuple[str, str, str],
+                        changed: Iterable[TableEntry] | None = None,
+                        progress: Callable[[int, int], None] | None = None,
+                        workers: int = 1,
+                        overlay_format: str = 'same',
+                        compression: int = 1) -> None:
+    """Saves the images with the nuclei and fibers drawn on them.
+
+    With several workers, the images are drawn and encoded in parallel, each
+    one in a separate process.
+
+    Args:
+        table_items: The entries of the project to save.
+        directory: The path to the project folder.
+        colors: The color of the nuclei outside of fibers, the color of the
+            nuclei inside fibers, and the color of the fibers, as returned by
+            :func:`overlay_colors`.
+        changed: If given, only the overlay images of these entries are saved
+            again, the ones of the other entries being up-to-date. Otherwise,
+            all the overlay images are saved.
+        progress: If given, called with the number of saved images and the
+            number of images to save after each image.
+        workers: The number of processes drawing and encoding the images.
+        overlay_format: The format in which to save the images, one of
+            :obj:`overlay_formats`.
+        compression: The compression level of the saved images, between 0 and
+            9. Higher values give smaller files, that are slower to encode for
+            PNG and of lower quality for JPEG.
+    """
+
+    folder = directory / 'Overlay Images'
+
+    if changed is not None and folder.is_dir():
+        logger.log(logging.INFO, "Updating the overlay images")
+
+        # Removing the images that are not part of the project anymore
+        names = {overlay_name(entry.path.name, overlay_format)
+                 for entry in table_items}
+        for path in folder.iterdir():
+            if path.name not in names:
+                logger.log(logging.INFO, f"Removing the image {path}")
+                path.unlink()
+        to_save = list(changed)
+
+    else:
+        # Creates the directory if it doesn't exist yet
+        if folder.is_dir():
+            rmtree(folder)
+            logger.log(logging.INFO,
+                       f"Creating the folder for saving the overlay images "
+                       f"at: {folder}")
+        Path.mkdir(folder)
+
+        logger.log(logging.INFO, "Saving the overlay images")
+        to_save = list(table_items)
+
+    tasks = (_overlay_task(entry, directory, colors, overlay_format,
+                           compression) for entry in to_save)
+
+    if workers <= 1 or len(to_save) <= 1:
+        for i, task in enumerate(tasks, start=1):
+            _draw_overlay(*task)
+            if progress is not None:
+                progress(i, len(to_save))
+        return
+
+    logger.log(logging.INFO, f"Saving the overlay images with {workers} "
+                             f"workers")
+    for i, _ in enumerate(_draw_in_pool(tasks, workers), start=1):
+        if progress is not None:
+            progress(i, len(to_save))
+
+
+def save_overlay(entry: TableEntry,
+                 project_name: Path,
+                 colors: tuple[str, str, str],
+                 overlay_format: str = 'same',
+                 compression: int = 1) -> None:
+    """Draws fibers and nuclei on an images and then saves it.
+
+    Args:
+        entry: The table entry whose image to save.
+        project_name: The path to the project folder.
+        colors: The color of the nuclei outside of fibers, the color of the
+            nuclei inside fibers, and the color of the fibers, as returned by
+            :func:`overlay_colors`.
+        overlay_format: The format in which to save the image, one of
+            :obj:`overlay_formats`.
+        compression: The compression level of the saved image, between 0 and
+            9.
+    """
+
+    _draw_overlay(*_overlay_task(entry, project_name, colors, overlay_format,
+                                 compression))
+
+
+def _overlay_task(entry: TableEntry,
+                  project_name: Path,
+                  colors: tuple[str, str, str],
+                  overlay_format: str,
+                  compression: int) -> tuple[Any, ...]:
+    """Returns the arguments of :func:`_draw_overlay` for one entry, that only
+    contain picklable objects and can be sent to another process."""
+
+    source = project_name / "Original Images" / entry.path.name
+    destination = (project_name / "Overlay Images" /
+                   overlay_name(entry.path.name, overlay_format))
+    x, y, inside = entry.nuclei.to_arrays()
+    vertices, offsets = entry.fibers.to_arrays()
+    bgr = tuple(color_to_bgr[color] for color in colors)
+
+    return (source, destination, (x, y, inside), (vertices, offsets), bgr,
+            _encoding_params(destination.suffix, compression))
+
+
+def _encoding_params(suffix: str, compression: int) -> list[int]:
+    """Returns the parameters given to imwrite for saving an image with the
+    given extension and compression level, between 0 and 9.
+
+    A compression level of 1 keeps the default parameters of OpenCV, that are
+    tuned for speed and much faster than explicitly setting the same level.
+    """
+
+    suffix = suffix.lower()
+    if compression == 1:
+        return []
+    elif suffix == '.png':
+        return [IMWRITE_PNG_COMPRESSION, compression]
+    elif suffix in ('.jpg', '.jpeg'):
+        return [IMWRITE_JPEG_QUALITY, 100 - 5 * compression]
+    elif suffix in ('.tif', '.tiff'):
+        # No compression, or LZW
+        return [IMWRITE_TIFF_COMPRESSION, 1 if compression == 0 else 5]
+    return []
+
+
+def _draw_in_pool(tasks: Iterable[tuple[Any, ...]],
+                  workers: int) -> Iterator[None]:
+    """Draws and saves the overlay images in a pool of processes, and yields
+    each time an image is saved.
+
+    Only a limited number of images are submitted at once, so that the data
+    of all the images is not held in memory.
+    """
+
+    tasks = iter(tasks)
+    pending: set[Future] = set()
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=get_context('spawn')) as pool:
+        while True:
+            for task in tasks:
+                pending.add(pool.submit(_draw_overlay, *task))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                return
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                # Raises any exception that occurred in the worker
+                future.result()
+                yield
+
+
+def _draw_overlay(source: Path,
+                  destination: Path,
+                  nuclei: tuple[np.ndarray, np.ndarray, np.ndarray],
+                  fibers: tuple[np.ndarray, np.ndarray],
+                  colors: tuple[tuple[int, int, int], ...],
+                  params: list[int]) -> None:
+    """Draws fibers and nuclei on an image and then saves it.
+
+    It only takes picklable arguments, so that it can run in another process.
+
+    Args:
+        source: The path to the original image.
+        destination: The path where to save the overlay image.
+        nuclei: The x and y positions of the nuclei, and whether they're inside
+            fibers.
+        fibers: The vertices of the contours of all the fibers, and the offset
+            of each contour among them.
+        colors: The BGR color of the nuclei outside of fibers, the one of the
+            nuclei inside fibers, and the one of the fibers.
+        params: The parameters given to imwrite for encoding the image.
+    """
+
+    nuc_col_out, nuc_col_in, fib_color = colors
+
+    # Reads the image
+    cv_img = check_image(source)
+
+    # Aborting if the image cannot be loaded
+    if cv_img is None:
+        logger.log(logging.INFO,
+                   f"Skipping the image {destination} as the original image "
+                   f"could not be loaded")
+        return
+
+    cv_img = cvtColor(cv_img, COLOR_RGB2BGR)
+
+    # Adjusting the indicator sizes to the size of the image
+    max_dim = max(cv_img.shape)
+    line_width = max(1, round(max_dim / 1080))
+    spot_size = max(1, round(max_dim / 1080 * 2))
+
+    # Drawing all the fibers at once
+    vertices, offsets = fibers
+    if len(offsets) > 1:
+        contours = np.split(np.asarray(vertices, dtype=np.int32),
+                            offsets[1:-1])
+        polylines(cv_img, [contour.reshape((-1, 1, 2))
+                           for contour in contours],
+                  True, fib_color, line_width)
+
+    # Drawing the nuclei
+    for x, y, inside in zip(*(array.tolist() for array in nuclei)):
+        ellipse(cv_img, (int(x), int(y)), (spot_size, spot_size), 0, 0, 360,
+                nuc_col_in if inside else nuc_col_out, -1)
+
+    # Now saving the image, replacing any previous one
+    logger.log(logging.INFO, f"Saving the image {destination}")
+    destination.unlink(missing_ok=True)
+    imwrite(str(destination), cv_img, params)
@@ -0,0 +1,300 @@
+# coding: utf-8
+
+from pathlib import Path
+from shutil import copytree, copy2, rmtree
+from threading import Thread
+from queue import Queue
+from collections.abc import Callable
+from typing import Any
+import logging
+import os
+
+from .structure_classes import TableItems, TableEntry
+from ._project_data import save_data, mark_saved, snapshot
+from ._project_export import (save_settings, save_table, save_originals,
+                              save_overlay_images)
+
+logger = logging.getLogger("MyoFInDer.ProjectSave")
+
+# The suffix of the folder in which a project is staged while being saved
+_staging_suffix = '.saving'
+
+# The file of the application folder holding the path to the project whose
+# folder is being replaced, if any
+_journal_file = 'saving.txt'
+
+
+def _link(source: str, destination: str) -> None:
+    """Hard-links a file to a new location, or copies it if the file system
+    doesn't support hard links."""
+
+    try:
+        os.link(source, destination)
+    except OSError:
+        copy2(source, destination)
+
+
+def _container(directory: Path) -> Path:
+    """Returns the folder holding the staged and previous versions of a
+    project while it is being saved."""
+
+    return directory.parent / f'.{directory.name}{_staging_suffix}'
+
+
+def recover_project(directory: Path) -> bool:
+    """Cleans up after a save of a project that didn't complete, restoring the
+    previous version of the project if it was already moved away.
+
+    Args:
+        directory: The path to the project folder.
+
+    Returns:
+        True if the previous version of the project was restored, False
+        otherwise.
+    """
+
+    container = _container(directory)
+    if not container.is_dir():
+        return False
+
+    restored = False
+    if (container / 'previous').is_dir() and not directory.exists():
+        logger.log(logging.WARNING, f"Restoring the previous version of the "
+                                    f"project {directory}")
+        (container / 'previous').rename(directory)
+        restored = True
+    logger.log(logging.INFO, f"Removing the staging folder {container}")
+    rmtree(container, ignore_errors=True)
+    return restored
+
+
+def recover_projects(folder: Path) -> list[Path]:
+    """Cleans up after the saves that didn't complete of all the projects
+    located in a folder, see :func:`recover_project`.
+
+    Args:
+        folder: The folder containing the projects.
+
+    Returns:
+        The paths to the projects whose previous version was restored.
+    """
+
+    restored = list()
+    for container in folder.glob(f'.*{_staging_suffix}'):
+        directory = folder / container.name[1:-len(_staging_suffix)]
+        if container.is_dir() and recover_project(directory):
+            restored.append(directory)
+    return restored
+
+
+def recover_interrupted_save(app_folder: Path) -> Path | None:
+    """Restores the previous version of a project if the application stopped
+    while replacing its folder, as recorded in the application folder.
+
+    Args:
+        app_folder: The path to the application folder.
+
+    Returns:
+        The path to the project if its previous version was restored, None
+        otherwise.
+    """
+
+    journal = app_folder / _journal_file
+    if not journal.is_file():
+        return None
+
+    directory = Path(journal.read_text(encoding='utf-8'))
+    restored = recover_project(directory)
+    journal.unlink(missing_ok=True)
+    return directory if restored else None
+
+
+class ProjectSave:
+    """Saves a project in a background thread, from a snapshot of its entries
+    taken when the save starts.
+
+    The project is first entirely written to a staging folder next to the
+    project folder, in which the files of any previous save are hard-linked so
+    that only the changed files need to be written. The staging folder then
+    replaces the project folder, so that an interrupted save never leaves a
+    partially written project behind. If the application stops while the
+    project folder is being replaced, the previous version of the project is
+    restored by :func:`recover_interrupted_save` or :func:`recover_projects`.
+
+    The progress of the save is reported in a Queue, as tuples containing the
+    name of the current step, the number of handled items and the total number
+    of items in this step. The string 'Done' is sent once the save is over.
+    """
+
+    def __init__(self,
+                 table_items: TableItems,
+                 directory: Path,
+                 settings: dict[str, Any],
+                 changed: list[TableEntry],
+                 overlay_colors: tuple[str, str, str] | None,
+                 redraw_overlays: bool,
+                 app_folder: Path | None = None) -> None:
+        """Takes the snapshot of the entries, and creates the staging folder.
+
+        Args:
+            table_items: The entries of the project to save.
+            directory: The path to the project folder.
+            settings: The values of the settings, indexed by name.
+            changed: The entries whose data is not up-to-date in the project
+                folder.
+            overlay_colors: The colors to use for drawing the overlay images,
+                as returned by :func:`overlay_colors`, or None if the overlay
+                images should not be saved.
+            redraw_overlays: If True, all the overlay images are drawn again.
+                Otherwise, only the ones of the changed entries are. The
+                format, compression and number of workers used for drawing
+                them are read from the settings.
+            app_folder: If given, the project folder being replaced is
+                recorded in this folder, for restoring it when the
+                application starts again after an interruption.
+        """
+
+        self.directory = directory
+        self.messages = Queue(maxsize=0)
+        self.failed: list[Path] = list()
+        self.error: Exception | None = None
+
+        self.overlay_colors = overlay_colors
+        self.overlay_format: str = settings['overlay_format']
+        self.overlay_compression: int = settings['overlay_compression']
+        self._settings = settings
+        self._redraw_overlays = redraw_overlays
+
+        self._container = _container(directory)
+        self._journal = app_folder / _journal_file \
+            if app_folder is not None else None
+        self._staging = self._container / directory.name
+        self._previous = self._container / 'previous'
+
+        # The entries of the snapshot are saved from the staging folder
+        self._entries = list(table_items)
+        self._snapshot = snapshot(table_items)
+        for entry in self._snapshot:
+            if directory in entry.path.parents:
+                self._snapshot.rename(
+                    entry.path,
+                    self._staging / entry.path.relative_to(directory))
+        changed = set(map(id, changed))
+        self.changed = [copy for entry, copy
+                         in zip(self._entries, self._snapshot)
+                         if id(entry) in changed]
+
+        self._recover()
+        self._staging.mkdir(parents=True)
+
+        self._thread = Thread(target=self._save)
+
+    def start(self) -> None:
+        """Starts saving the project in a background thread."""
+
+        logger.log(logging.INFO, f"Starting to save the project "
+                                 f"{self.directory}")
+        self._thread.start()
+
+    def apply(self, table_items: TableItems) -> None:
+        """Updates the entries of the project once saved, so that they point
+        to the saved images and data.
+
+        The entries modified while the project was being saved remain marked
+        as modified, as their saved data is already outdated.
+
+        Must be called from the thread of the interface, after the save
+        successfully completed.
+
+        Args:
+            table_items: The entries of the project that was saved.
+        """
+
+        for entry, copy in zip(self._entries, self._snapshot):
+            if self._staging in copy.path.parents:
+                new_path = self.directory / copy.path.relative_to(
+                    self._staging)
+                if new_path != entry.path:
+                    table_items.rename(entry.path, new_path)
+
+        mark_saved(self._entries, self.directory, self._snapshot)
+
+    def _save(self) -> None:
+        """Writes all the files of the project to the staging folder, and then
+        moves it in place of the project folder."""
+
+        try:
+            # Starting from the files of the previous save, if any
+            if self.directory.is_dir():
+                self._progress("Preparing", 0, 1)
+                copytree(self.directory, self._staging, copy_function=_link,
+                         dirs_exist_ok=True)
+
+            self._progress("Saving the settings", 0, 1)
+            save_settings(self._settings, self._staging)
+
+            self._progress("Saving the summary", 0, 1)
+            save_table(self._snapshot, self._staging)
+
+            save_originals(self._snapshot, self._staging, self.failed.append,
+                           self._reporter("Saving the original images"))
+
+            if self.overlay_colors is not None:
+                save_overlay_images(
+                    self._snapshot, self._staging, self.overlay_colors,
+                    None if self._redraw_overlays else self.changed,
+                    self._reporter("Saving the overlay images"),
+                    self._settings['overlay_workers'],
+                    self.overlay_format, self.overlay_compression)
+
+            save_data(self._snapshot, self._staging, self.changed,
+                      self._reporter("Saving the data"))
+
+            self._progress("Finishing", 0, 1)
+            self._commit()
+            logger.log(logging.INFO, f"Project saved at {self.directory}")
+
+        except (Exception,) as exc:
+            logger.exception("Exception caught while saving the project !",
+                             exc_info=exc)
+            self.error = exc
+            self._recover()
+            if self._journal is not None:
+                self._journal.unlink(missing_ok=True)
+
+        finally:
+            self.messages.put_nowait('Done')
+
+    def _commit(self) -> None:
+        """Replaces the project folder with the staging folder, and removes
+        the previous version of the project."""
+
+        # Recording the project being replaced, in case the application stops
+        # between the two renames
+        if self._journal is not None:
+            self._journal.write_text(str(self.directory), encoding='utf-8')
+
+        if self.directory.exists():
+            self.directory.rename(self._previous)
+        self._staging.rename(self.directory)
+        rmtree(self._container)
+
+        if self._journal is not None:
+            self._journal.unlink(missing_ok=True)
+
+    def _recover(self) -> None:
+        """Cleans up after a save that didn't complete, restoring the previous
+        version of the project if it was already moved away."""
+
+        recover_project(self.directory)
+
+    def _progress(self, step: str, done: int, total: int) -> None:
+        """Reports the progress of the save."""
+
+        self.messages.put_nowait((step, done, total))
+
+    def _reporter(self, step: str) -> Callable[[int, int], None]:
+        """Returns a callback reporting the progress of the given step."""
+
+        self._progress(step, 0, 1)
+        return lambda done, total: self._progress(step, done, total)
@@ -0,0 +1,232 @@
+# coding: utf-8
+
+from pathlib import Path
+from hashlib import sha256
+from collections import OrderedDict
+from threading import Lock, get_ident
+from typing import Any
+from os import replace, utime, getpid
+import numpy as np
+import logging
+
+# Maximum number of image files whose key is remembered
+_max_digests = 4096
+
+
+class SegmentationCache:
+    """Class managing a cache of the intermediate results of the segmentation,
+    like the labeled images returned by Cellpose and the fiber masks.
+
+    The most recently used results are kept in memory, and if a folder is
+    given all the results are also stored on disk. Each result is stored in
+    its own file, named after the hash of a key. The key should contain the
+    key identifying the image content, as returned by :meth:`digest`, along
+    with all the settings the result depends on. The least recently used
+    results are deleted when the total size of the cache exceeds the maximum
+    size.
+
+    The arrays returned by the cache are shared with it, and should therefore
+    not be modified.
+    """
+
+    def __init__(self,
+                 folder: Path | None = None,
+                 max_size: int = 2 * 1024 ** 3,
+                 max_memory: int = 512 * 1024 ** 2) -> None:
+        """Creates the cache folder if needed, and indexes the cached files.
+
+        Args:
+            folder: The folder where to store the cached results. If not
+                given, the results are only kept in memory.
+            max_size: The maximum total size of the cached files, in bytes.
+            max_memory: The maximum total size of the results kept in memory,
+                in bytes.
+        """
+
+        self._logger = logging.getLogger("MyoFInDer.SegmentationCache")
+
+        self._folder = folder
+        self._max_size = max_size
+        self._max_memory = max_memory
+        self._lock = Lock()
+        self._digests: OrderedDict[tuple[Path, int, int], str] = \
+            OrderedDict()
+
+        # The results kept in memory, from the least to the most recently used
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._memory_size = 0
+
+        self._files: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        if self._folder is None:
+            return
+
+        self._folder.mkdir(parents=True, exist_ok=True)
+
+        # Indexing the existing files, from the least to the most recently used
+        files = list()
+        for file in self._folder.glob('*.npz'):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, file.name, stat.st_size))
+        self._files = OrderedDict(
+            (name, size) for _, name, size in sorted(files))
+        self._size = sum(self._files.values())
+
+        self.log(f"Found {len(self._files)} cached results in {folder}, "
+                 f"total size {self._size} bytes")
+
+    def log(self, msg: str) -> None:
+        """Wrapper for reducing the verbosity of logging."""
+
+        self._logger.log(logging.INFO, msg)
+
+    def digest(self, path: Path) -> str:
+        """Returns a key identifying the content of an image file.
+
+        If the cache only lives in memory, the key is derived from the path,
+        size and modification time of the file, and its content is never read.
+        Otherwise, the key should remain valid across sessions and is a hash
+        of the whole content of the file, read in chunks.
+
+        The key is only computed again if the size or the modification time
+        of the file changed since the last call.
+
+        Args:
+            path: The path to the image file.
+        """
+
+        stat = path.stat()
+        key = (path, stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            if key in self._digests:
+                self._digests.move_to_end(key)
+                return self._digests[key]
+
+        if self._folder is None:
+            digest = f'{path.absolute()}:{stat.st_size}:{stat.st_mtime_ns}'
+        else:
+            digest = self._hash_file(path)
+
+        with self._lock:
+            self._digests[key] = digest
+            while len(self._digests) > _max_digests:
+                self._digests.popitem(last=False)
+
+        return digest
+
+    def get(self, key: tuple[Any, ...]) -> np.ndarray | None:
+        """Returns the array stored under the given key, or None if there's no
+        such array in the cache.
+
+        Args:
+            key: A tuple uniquely identifying the array.
+        """
+
+        name = self._file_name(key)
+
+        # Looking for the array in memory first
+        with self._lock:
+            if name in self._memory:
+                self._memory.move_to_end(name)
+                return self._memory[name]
+
+        if self._folder is None:
+            return None
+
+        path = self._folder / name
+        try:
+            with np.load(path) as data:
+                array = data['array']
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # Marking the file as the most recently used one
+        with self._lock:
+            self._keep_in_memory(name, array)
+            try:
+                utime(path)
+            except OSError:
+                pass
+            if name in self._files:
+                self._files.move_to_end(name)
+
+        return array
+
+    def put(self, key: tuple[Any, ...], array: np.ndarray) -> None:
+        """Stores an array in the cache, and deletes the least recently used
+        files if the cache exceeds its maximum size.
+
+        Args:
+            key: A tuple uniquely identifying the array.
+            array: The array to store.
+        """
+
+        name = self._file_name(key)
+        with self._lock:
+            self._keep_in_memory(name, array)
+
+        if self._folder is None:
+            return
+
+        path = self._folder / name
+
+        # Writing to a temporary file first, so that no partial file is read
+        temp = self._folder / f'{name}.{getpid()}-{get_ident()}.tmp'
+        try:
+            with open(temp, 'wb') as file:
+                np.savez_compressed(file, array=array)
+            replace(temp, path)
+            size = path.stat().st_size
+        except OSError:
+            self._logger.exception(f"Could not write the cached result "
+                                   f"{path}")
+            temp.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._size += size - self._files.pop(name, 0)
+            self._files[name] = size
+
+            # Removing the least recently used files
+            while self._size > self._max_size and len(self._files) > 1:
+                old, old_size = self._files.popitem(last=False)
+                self._size -= old_size
+                (self._folder / old).unlink(missing_ok=True)
+                self.log(f"Removed {old} from the cache")
+
+    def _keep_in_memory(self, name: str, array: np.ndarray) -> None:
+        """Keeps an array in memory, and forgets the least recently used ones
+        if the memory limit is exceeded.
+
+        Must be called with the lock acquired.
+        """
+
+        if name in self._memory:
+            self._memory_size -= self._memory.pop(name).nbytes
+        self._memory[name] = array
+        self._memory_size += array.nbytes
+
+        while self._memory_size > self._max_memory and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= old.nbytes
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """Returns the hash of the whole content of a file, read in chunks so
+        that large files are never entirely loaded in memory."""
+
+        hasher = sha256()
+        with open(path, 'rb') as file:
+            while chunk := file.read(1024 ** 2):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _file_name(key: tuple[Any, ...]) -> str:
+        """Returns the name of the file storing the array for a given key."""
+
+        return sha256(repr(key).encode()).hexdigest() + '.npz'
@@ -7,7 +7,11 @@ from pathlib import Path
 
 class SavePopup(Toplevel):
     """Popup window displayed while the project is being saved to inform the
-    user that saving is in progress."""
+    user that saving is in progress.
+
+    It displays the progress of the save, and prevents any interaction with the
+    main window until it is destroyed.
+    """
 
     def __init__(self, main_window: Tk, directory: Path) -> None:
         """Sets the layout of the popup window.
@@ -23,11 +27,34 @@ class SavePopup(Toplevel):
         self.title("Saving....")
         ttk.Label(self, text=f"Saving to '{directory.name}' ..."). \
             pack(anchor='center', expand=False, fill='none', padx=10, pady=10)
+        self._step = ttk.Label(self, text='')
+        self._step.pack(anchor='w', expand=False, fill='none', padx=10)
+        self._progress = ttk.Progressbar(self, orient='horizontal',
+                                         length=300, mode='determinate')
+        self._progress.pack(anchor='center', expand=False, fill='x', padx=10,
+                            pady=10)
 
         # Centering on the screen
         self.update()
         self._center()
 
+        # Blocking the main window while saving
+        self.transient(main_window)
+        self.protocol("WM_DELETE_WINDOW", lambda: None)
+        self.grab_set()
+
+    def set_progress(self, step: str, done: int, total: int) -> None:
+        """Displays the current step of the save and its progress.
+
+        Args:
+            step: The name of the current step.
+            done: The number of handled items in this step.
+            total: The total number of items to handle in this step.
+        """
+
+        self._step['text'] = step
+        self._progress['value'] = 100 * done / total if total else 100
+
     def _center(self) -> None:
         """Centers the popup window on the currently used monitor."""
 
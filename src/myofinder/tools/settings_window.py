@@ -1,7 +1,10 @@
 # coding: utf-8
 
-from tkinter import Toplevel, ttk, Scale
+from tkinter import Toplevel, ttk, Scale, BooleanVar, StringVar
 from screeninfo import get_monitors
+from os import cpu_count
+
+from ._project_export import overlay_formats
 
 
 class SettingsWindow(Toplevel):
@@ -19,6 +22,21 @@ class SettingsWindow(Toplevel):
         # Setting the variables
         self._main_window = main_window
         self._settings = self._main_window.settings
+        self._preview = BooleanVar(self, value=False)
+        self._preview_status = StringVar(self, value='')
+        self._preview_after: str | None = None
+
+        # The settings whose effect can be previewed
+        self._preview_traces = [
+            (variable, variable.trace_add("write", self._schedule_preview))
+            for variable in (self._settings.nuclei_colour,
+                             self._settings.fiber_colour,
+                             self._settings.minimum_fiber_intensity,
+                             self._settings.maximum_fiber_intensity,
+                             self._settings.minimum_nucleus_intensity,
+                             self._settings.maximum_nucleus_intensity,
+                             self._settings.minimum_nuc_diameter,
+                             self._settings.minimum_nuclei_count)]
 
         # Setting window properties
         self.resizable(False, False)
@@ -31,8 +49,16 @@ class SettingsWindow(Toplevel):
         self._center()
 
     def destroy(self) -> None:
-        """Before exiting, saves the settings to a file in the application
-        folder."""
+        """Before exiting, ends the preview and saves the settings to a file in
+        the application folder."""
+
+        # Ending the preview and removing the traces
+        if self._preview_after is not None:
+            self.after_cancel(self._preview_after)
+            self._preview_after = None
+        for variable, callback in self._preview_traces:
+            variable.trace_remove("write", callback)
+        self._main_window.end_preview()
 
         if self._main_window.app_folder is not None:
             self._main_window.save_settings(self._main_window.app_folder)
@@ -97,10 +123,83 @@ class SettingsWindow(Toplevel):
             value=0)
         self._overlay_off_button.grid(column=1, row=12, sticky='NW')
 
+        # Buttons for selecting the format of the overlay images
+        self._overlay_format_label = ttk.Label(self._frame,
+                                               text='Overlay format :')
+        self._overlay_format_label.grid(column=0, row=13, sticky='NE',
+                                        pady=(10, 0), padx=(0, 10))
+
+        self._overlay_format_frame = ttk.Frame(self._frame)
+
+        self._overlay_format_buttons = list()
+        for overlay_format in overlay_formats:
+            button = ttk.Radiobutton(
+                self._overlay_format_frame,
+                text='Same' if overlay_format == 'same'
+                else overlay_format.upper(),
+                variable=self._settings.overlay_format, value=overlay_format)
+            button.pack(side='left', anchor='w', fill='none', expand=False,
+                        padx=(0, 10))
+            self._overlay_format_buttons.append(button)
+
+        self._overlay_format_frame.grid(column=1, row=13, sticky='NW',
+                                        pady=(10, 0))
+
+        # Slider to adjust the compression level of the overlay images
+        self._compression_label = ttk.Label(
+            self._frame, text='Overlay compression :')
+        self._compression_label.grid(column=0, row=14, sticky='E',
+                                     pady=(10, 0), padx=(0, 10))
+
+        self._compression_slider_frame = ttk.Frame(self._frame)
+
+        self._compression_slide_val_label = ttk.Label(
+            self._compression_slider_frame,
+            textvariable=self._settings.overlay_compression, width=3)
+        self._compression_slide_val_label.pack(
+            side='left', anchor='w', fill='none', expand=False, padx=(0, 20))
+
+        self._compression_slider = Scale(
+            self._compression_slider_frame, from_=0, to=9,
+            variable=self._settings.overlay_compression,
+            orient="horizontal", length=150, showvalue=False,
+            tickinterval=3)
+        self._compression_slider.pack(side='left', anchor='w',
+                                      fill='none', expand=False)
+
+        self._compression_slider_frame.grid(column=1, row=14, sticky='NW',
+                                            pady=(10, 0))
+
+        # Slider to adjust the number of overlay images saved in parallel
+        self._overlay_workers_label = ttk.Label(
+            self._frame, text='Number of overlay workers :')
+        self._overlay_workers_label.grid(
+            column=0, row=15, sticky='E', pady=(10, 0), padx=(0, 10))
+
+        self._overlay_workers_slider_frame = ttk.Frame(self._frame)
+
+        self._overlay_workers_slide_val_label = ttk.Label(
+            self._overlay_workers_slider_frame,
+            textvariable=self._settings.overlay_workers, width=3)
+        self._overlay_workers_slide_val_label.pack(
+            side='left', anchor='w', fill='none', expand=False, padx=(0, 20))
+
+        max_workers = max(cpu_count() or 1, 2)
+        self._overlay_workers_slider = Scale(
+            self._overlay_workers_slider_frame, from_=1, to=max_workers,
+            variable=self._settings.overlay_workers,
+            orient="horizontal", length=150, showvalue=False,
+            tickinterval=max(max_workers // 4, 1))
+        self._overlay_workers_slider.pack(side='left', anchor='w',
+                                          fill='none', expand=False)
+
+        self._overlay_workers_slider_frame.grid(column=1, row=15, sticky='NW',
+                                                pady=(10, 0))
+
         # Slider to adjust the minimum intensity for fiber detection
         self._min_fiber_int_label = ttk.Label(self._frame,
                                               text='Minimum fiber intensity :')
-        self._min_fiber_int_label.grid(column=0, row=13, sticky='E',
+        self._min_fiber_int_label.grid(column=0, row=16, sticky='E',
                                        pady=(10, 0), padx=(0, 10))
 
         self._minimum_fiber_intensity_slider_frame = ttk.Frame(self._frame)
@@ -122,12 +221,12 @@ class SettingsWindow(Toplevel):
                                       expand=False)
 
         self._minimum_fiber_intensity_slider_frame.grid(
-            column=1, row=13, sticky='NW', pady=(10, 0))
+            column=1, row=16, sticky='NW', pady=(10, 0))
 
         # Slider to adjust the maximum intensity for fiber detection
         self._max_fiber_int_label = ttk.Label(self._frame,
                                               text='Maximum fiber intensity :')
-        self._max_fiber_int_label.grid(column=0, row=14, sticky='E',
+        self._max_fiber_int_label.grid(column=0, row=17, sticky='E',
                                        pady=(10, 0), padx=(0, 10))
 
         self._maximum_fiber_intensity_slider_frame = ttk.Frame(self._frame)
@@ -147,12 +246,12 @@ class SettingsWindow(Toplevel):
                                       expand=False)
 
         self._maximum_fiber_intensity_slider_frame.grid(
-            column=1, row=14, sticky='NW', pady=(10, 0))
+            column=1, row=17, sticky='NW', pady=(10, 0))
 
         # Slider to adjust the minimum intensity for nuclei detection
         self._min_nucleus_int_label = ttk.Label(
             self._frame, text='Minimum nucleus intensity :')
-        self._min_nucleus_int_label.grid(column=0, row=15, sticky='E',
+        self._min_nucleus_int_label.grid(column=0, row=18, sticky='E',
                                          pady=(10, 0), padx=(0, 10))
 
         self._minimum_nuclei_intensity_slider_frame = ttk.Frame(self._frame)
@@ -172,12 +271,12 @@ class SettingsWindow(Toplevel):
                                       expand=False)
 
         self._minimum_nuclei_intensity_slider_frame.grid(
-            column=1, row=15, sticky='NW', pady=(10, 0))
+            column=1, row=18, sticky='NW', pady=(10, 0))
 
         # Slider to adjust the maximum intensity for nuclei detection
         self._max_nucleus_int_label = ttk.Label(
             self._frame, text='Maximum nucleus intensity :')
-        self._max_nucleus_int_label.grid(column=0, row=16, sticky='E',
+        self._max_nucleus_int_label.grid(column=0, row=19, sticky='E',
                                          pady=(10, 0), padx=(0, 10))
 
         self._maximum_nuclei_intensity_slider_frame = ttk.Frame(self._frame)
@@ -197,13 +296,13 @@ class SettingsWindow(Toplevel):
                                       expand=False)
 
         self._maximum_nuclei_intensity_slider_frame.grid(
-            column=1, row=16, sticky='NW', pady=(10, 0))
+            column=1, row=19, sticky='NW', pady=(10, 0))
 
         # Slider to adjust the minimum nucleus diameter
         self._min_nucleus_diam_label = ttk.Label(
             self._frame, text='Minimum nucleus diameter (px) :')
         self._min_nucleus_diam_label.grid(
-            column=0, row=17, sticky='E', pady=(10, 0), padx=(0, 10))
+            column=0, row=20, sticky='E', pady=(10, 0), padx=(0, 10))
 
         self._diameter_slider_frame = ttk.Frame(self._frame)
 
@@ -221,14 +320,14 @@ class SettingsWindow(Toplevel):
         self._min_nuc_diam_slider.pack(side='left', anchor='w',
                                        fill='none', expand=False)
 
-        self._diameter_slider_frame.grid(column=1, row=17, sticky='NW',
+        self._diameter_slider_frame.grid(column=1, row=20, sticky='NW',
                                          pady=(10, 0))
 
         # Slider to adjust the minimum nucleus count
         self._min_nuclei_count_label = ttk.Label(
             self._frame, text='Minimum nuclei count :')
         self._min_nuclei_count_label.grid(
-            column=0, row=18, sticky='E', pady=(10, 0), padx=(0, 10))
+            column=0, row=21, sticky='E', pady=(10, 0), padx=(0, 10))
 
         self._count_slider_frame = ttk.Frame(self._frame)
 
@@ -246,9 +345,164 @@ class SettingsWindow(Toplevel):
         self._count_slider.pack(side='left', anchor='w',
                                 fill='none', expand=False)
 
-        self._count_slider_frame.grid(column=1, row=18, sticky='NW',
+        self._count_slider_frame.grid(column=1, row=21, sticky='NW',
                                       pady=(10, 0))
 
+        # Slider to adjust the number of images processed in parallel
+        self._processing_workers_label = ttk.Label(
+            self._frame, text='Number of processing workers :')
+        self._processing_workers_label.grid(
+            column=0, row=22, sticky='E', pady=(10, 0), padx=(0, 10))
+
+        self._workers_slider_frame = ttk.Frame(self._frame)
+
+        self._workers_slide_val_label = ttk.Label(
+            self._workers_slider_frame,
+            textvariable=self._settings.processing_workers, width=3)
+        self._workers_slide_val_label.pack(
+            side='left', anchor='w', fill='none', expand=False, padx=(0, 20))
+
+        self._workers_slider = Scale(
+            self._workers_slider_frame, from_=1, to=max_workers,
+            variable=self._settings.processing_workers,
+            orient="horizontal", length=150, showvalue=False,
+            tickinterval=max(max_workers // 4, 1))
+        self._workers_slider.pack(side='left', anchor='w',
+                                  fill='none', expand=False)
+
+        self._workers_slider_frame.grid(column=1, row=22, sticky='NW',
+                                        pady=(10, 0))
+
+        # Slider to adjust the number of images waiting for Cellpose
+        self._decode_depth_label = ttk.Label(
+            self._frame, text='Decoding queue depth :')
+        self._decode_depth_label.grid(
+            column=0, row=23, sticky='E', pady=(10, 0), padx=(0, 10))
+
+        self._decode_depth_slider_frame = ttk.Frame(self._frame)
+
+        self._decode_depth_slide_val_label = ttk.Label(
+            self._decode_depth_slider_frame,
+            textvariable=self._settings.decode_queue_depth, width=3)
+        self._decode_depth_slide_val_label.pack(
+            side='left', anchor='w', fill='none', expand=False, padx=(0, 20))
+
+        self._decode_depth_slider = Scale(
+            self._decode_depth_slider_frame, from_=1, to=8,
+            variable=self._settings.decode_queue_depth,
+            orient="horizontal", length=150, showvalue=False,
+            tickinterval=7)
+        self._decode_depth_slider.pack(side='left', anchor='w',
+                                       fill='none', expand=False)
+
+        self._decode_depth_slider_frame.grid(column=1, row=23, sticky='NW',
+                                             pady=(10, 0))
+
+        # Slider to adjust the number of images waiting for post-processing
+        self._post_depth_label = ttk.Label(
+            self._frame, text='Post-processing queue depth :')
+        self._post_depth_label.grid(
+            column=0, row=24, sticky='E', pady=(10, 0), padx=(0, 10))
+
+        self._post_depth_slider_frame = ttk.Frame(self._frame)
+
+        self._post_depth_slide_val_label = ttk.Label(
+            self._post_depth_slider_frame,
+            textvariable=self._settings.post_processing_queue_depth, width=3)
+        self._post_depth_slide_val_label.pack(
+            side='left', anchor='w', fill='none', expand=False, padx=(0, 20))
+
+        self._post_depth_slider = Scale(
+            self._post_depth_slider_frame, from_=1, to=8,
+            variable=self._settings.post_processing_queue_depth,
+            orient="horizontal", length=150, showvalue=False,
+            tickinterval=7)
+        self._post_depth_slider.pack(side='left', anchor='w',
+                                     fill='none', expand=False)
+
+        self._post_depth_slider_frame.grid(column=1, row=24, sticky='NW',
+                                           pady=(10, 0))
+
+        # Slider to adjust the size above which images are processed in tiles,
+        # 0 disabling the processing in tiles
+        self._tile_size_label = ttk.Label(
+            self._frame, text='Tile size (px) :')
+        self._tile_size_label.grid(
+            column=0, row=25, sticky='E', pady=(10, 0), padx=(0, 10))
+
+        self._tile_size_slider_frame = ttk.Frame(self._frame)
+
+        self._tile_size_slide_val_label = ttk.Label(
+            self._tile_size_slider_frame,
+            textvariable=self._settings.tile_size, width=5)
+        self._tile_size_slide_val_label.pack(
+            side='left', anchor='w', fill='none', expand=False, padx=(0, 20))
+
+        self._tile_size_slider = Scale(
+            self._tile_size_slider_frame, from_=0, to=16384,
+            variable=self._settings.tile_size, resolution=512,
+            orient="horizontal", length=150, showvalue=False,
+            tickinterval=16384)
+        self._tile_size_slider.pack(side='left', anchor='w',
+                                    fill='none', expand=False)
+
+        self._tile_size_slider_frame.grid(column=1, row=25, sticky='NW',
+                                          pady=(10, 0))
+
+        # Button to preview the effect of the settings on the current image
+        self._preview_label = ttk.Label(self._frame, text='Live preview :')
+        self._preview_label.grid(column=0, row=26, sticky='NE', pady=(10, 0),
+                                 padx=(0, 10))
+
+        self._preview_frame = ttk.Frame(self._frame)
+
+        self._preview_button = ttk.Checkbutton(
+            self._preview_frame, variable=self._preview,
+            onvalue=True, offvalue=False, command=self._toggle_preview)
+        self._preview_button.pack(side='left', anchor='w', fill='none',
+                                  expand=False)
+
+        self._preview_status_label = ttk.Label(
+            self._preview_frame, textvariable=self._preview_status)
+        self._preview_status_label.pack(side='left', anchor='w', fill='none',
+                                        expand=False, padx=(10, 0))
+
+        self._preview_frame.grid(column=1, row=26, sticky='NW', pady=(10, 0))
+
+    def _toggle_preview(self) -> None:
+        """Starts or ends the preview of the settings on the current image."""
+
+        if self._preview.get():
+            self._update_preview()
+        else:
+            self._preview_status.set('')
+            self._main_window.end_preview()
+
+    def _schedule_preview(self, _, __, ___) -> None:
+        """Updates the preview shortly after a setting was modified.
+
+        Successive modifications, like when dragging a slider, only trigger
+        one update once the setting stops changing.
+        """
+
+        if not self._preview.get():
+            return
+
+        if self._preview_after is not None:
+            self.after_cancel(self._preview_after)
+        self._preview_after = self.after(50, self._update_preview)
+
+    def _update_preview(self) -> None:
+        """Displays the effect of the current settings on the current
+        image."""
+
+        self._preview_after = None
+
+        if self._main_window.preview_settings():
+            self._preview_status.set('')
+        else:
+            self._preview_status.set('Process the image first')
+
     def _center(self) -> None:
         """Centers the popup window on the currently used monitor."""
 
@@ -1,7 +1,8 @@
 # coding: utf-8
 
-from dataclasses import dataclass, field
-from collections.abc import Iterator, Callable
+from dataclasses import dataclass, field, fields
+from collections.abc import Iterator, Iterable, Callable
+from itertools import product
 from typing import Any
 from tkinter.ttk import Button, Separator, Label
 from functools import partial
@@ -59,51 +60,356 @@ class Fiber:
     position: list[tuple[float, float]] = field(default_factory=list)
 
 
-@dataclass
 class Nuclei:
-    """Class for managing the data of all the nuclei in one image."""
+    """Class for managing the data of all the nuclei in one image.
+
+    The nuclei are stored column-wise, as arrays holding their positions,
+    their status, and optionally the index of the canvas object drawing them.
+    Each nucleus is identified by its index in these arrays, that remains
+    valid as long as the nucleus exists. The index of a removed nucleus is
+    reused by the next added one.
+
+    Iterating over the nuclei yields Nucleus objects holding a copy of their
+    data, so modifying them has no effect on the stored nuclei.
+    """
+
+    # The bits of the status of each nucleus
+    _valid = 1
+    _in = 2
 
-    nuclei: list[Nucleus] = field(default_factory=list)
+    def __init__(self, nuclei: Iterable[Nucleus] = ()) -> None:
+        """Sets the arrays and adds the given nuclei, if any."""
 
-    def append(self, nuc: Nucleus) -> None:
-        """Adds a nucleus to the list of nuclei."""
+        self._x = np.empty(0, dtype=np.float32)
+        self._y = np.empty(0, dtype=np.float32)
+        self._status = np.empty(0, dtype=np.uint8)
+        self._tk_objs: np.ndarray | None = None
 
-        self.nuclei.append(nuc)
+        # The number of used indexes, and the ones that were freed
+        self._size = 0
+        self._free: list[int] = list()
+
+        self._count = 0
+        self._in_count = 0
+
+        for nuc in nuclei:
+            self.append(nuc)
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restores the nuclei from a pickled object, including the ones saved
+        by previous versions that stored a list of Nucleus objects."""
+
+        if 'nuclei' in state:
+            self.__init__(state['nuclei'])
+        else:
+            self.__dict__.update(state)
+
+    @classmethod
+    def from_arrays(cls,
+                    x: np.ndarray,
+                    y: np.ndarray,
+                    inside: np.ndarray) -> 'Nuclei':
+        """Creates a Nuclei object from the positions of the nuclei and whether
+        they're inside fibers, in the format returned by :meth:`to_arrays`."""
+
+        nuclei = cls()
+        nuclei._x = np.array(x, dtype=np.float32)
+        nuclei._y = np.array(y, dtype=np.float32)
+        nuclei._status = np.where(inside, cls._valid | cls._in,
+                                  cls._valid).astype(np.uint8)
+        nuclei._size = nuclei._count = len(nuclei._x)
+        nuclei._in_count = int(np.count_nonzero(inside))
+        return nuclei
+
+    def to_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the x and y positions of the nuclei, and whether they're
+        inside fibers, as arrays following the order of the nuclei."""
+
+        indexes = self.indexes()
+        return (self._x[indexes], self._y[indexes],
+                (self._status[indexes] & self._in).astype(bool))
+
+    def __eq__(self, other: Any) -> bool:
+        """Two Nuclei objects are considered equal if they hold the same nuclei
+        in the same order, with the same colors."""
+
+        if not isinstance(other, Nuclei):
+            return NotImplemented
+        indexes, other_indexes = self.indexes(), other.indexes()
+        return (len(indexes) == len(other_indexes)
+                and np.array_equal(self._x[indexes],
+                                   other._x[other_indexes])
+                and np.array_equal(self._y[indexes],
+                                   other._y[other_indexes])
+                and np.array_equal(self._status[indexes],
+                                   other._status[other_indexes]))
+
+    def append(self, nuc: Nucleus) -> int:
+        """Adds a nucleus and returns its index."""
+
+        if self._free:
+            index = self._free.pop()
+        else:
+            if self._size == len(self._x):
+                self._grow()
+            index = self._size
+            self._size += 1
+
+        self._x[index] = nuc.x_pos
+        self._y[index] = nuc.y_pos
+        self._status[index] = self._valid | (self._in if nuc.color == 'in'
+                                             else 0)
+        if self._tk_objs is not None or nuc.tk_obj is not None:
+            self.set_tk_obj(index, nuc.tk_obj)
+
+        self._count += 1
+        self._in_count += nuc.color == 'in'
+        return index
 
     def remove(self, nuc: Nucleus) -> None:
-        """Removes a given nucleus from the list of nuclei."""
+        """Removes the nucleus at the position of a given nucleus."""
 
-        try:
-            self.nuclei.remove(nuc)
-        except ValueError:
-            raise ValueError("No matching nucleus to delete")
+        self.remove_at(self.find(nuc.x_pos, nuc.y_pos))
+
+    def remove_at(self, index: int) -> None:
+        """Removes the nucleus at a given index."""
+
+        self._check_index(index)
+
+        self._count -= 1
+        self._in_count -= bool(self._status[index] & self._in)
+        self._status[index] = 0
+        if self._tk_objs is not None:
+            self._tk_objs[index] = -1
+        self._free.append(index)
+
+    def invert(self, nuc: Nucleus) -> None:
+        """Switches the color of the nucleus at the position of a given
+        nucleus."""
+
+        self.invert_at(self.find(nuc.x_pos, nuc.y_pos))
+
+    def invert_at(self, index: int) -> None:
+        """Switches the color of the nucleus at a given index."""
+
+        self._check_index(index)
+
+        self._in_count += -1 if self._status[index] & self._in else 1
+        self._status[index] ^= self._in
+
+    def find(self, x: float, y: float) -> int:
+        """Returns the index of the nucleus at a given position.
+
+        Raises:
+            ValueError: If no nucleus lies at the given position.
+        """
+
+        matches = np.flatnonzero((self._x[:self._size] == np.float32(x)) &
+                                 (self._y[:self._size] == np.float32(y)) &
+                                 (self._status[:self._size] & self._valid))
+        if not matches.size:
+            raise ValueError("No matching nucleus found")
+        return int(matches[0])
+
+    def set_tk_obj(self, index: int, tk_obj: int | None) -> None:
+        """Sets the index of the canvas object drawing a given nucleus."""
+
+        if self._tk_objs is None:
+            self._tk_objs = np.full(len(self._x), -1, dtype=np.int64)
+        self._tk_objs[index] = -1 if tk_obj is None else tk_obj
+
+    def clear_tk_objs(self) -> None:
+        """Removes the references to canvas objects for all the nuclei."""
+
+        self._tk_objs = None
 
     def reset(self) -> None:
-        """Deletes all the saved Nucleus objects."""
+        """Deletes all the saved nuclei."""
+
+        self.__init__()
+
+    def indexes(self) -> np.ndarray:
+        """Returns the indexes of all the nuclei."""
+
+        return np.flatnonzero(self._status[:self._size] & self._valid)
+
+    @property
+    def x_positions(self) -> np.ndarray:
+        """The x positions of the nuclei, by index, only meaningful for the
+        indexes returned by :meth:`indexes`."""
 
-        self.nuclei = list()
+        return self._x[:self._size]
+
+    @property
+    def y_positions(self) -> np.ndarray:
+        """The y positions of the nuclei, by index, only meaningful for the
+        indexes returned by :meth:`indexes`."""
+
+        return self._y[:self._size]
+
+    def __getitem__(self, index: int) -> Nucleus:
+        """Returns a copy of the data of the nucleus at a given index."""
+
+        self._check_index(index)
+
+        tk_obj = None
+        if self._tk_objs is not None and self._tk_objs[index] >= 0:
+            tk_obj = int(self._tk_objs[index])
+        return Nucleus(float(self._x[index]), float(self._y[index]), tk_obj,
+                       'in' if self._status[index] & self._in else 'out')
 
     def __iter__(self) -> Iterator[Nucleus]:
-        """Returns an iterator over the saved Nucleus objects."""
+        """Returns an iterator over copies of the saved nuclei."""
 
-        return iter(self.nuclei)
+        return (self[index] for index in self.indexes())
 
     @property
     def nuclei_in_count(self) -> int:
         """Returns the number of nuclei inside fibers."""
 
-        return len([nuc for nuc in self.nuclei if nuc.color == 'in'])
+        return self._in_count
 
     @property
     def nuclei_out_count(self) -> int:
         """Returns the number of nuclei outside fibers."""
 
-        return len([nuc for nuc in self.nuclei if nuc.color == 'out'])
+        return self._count - self._in_count
 
     def __len__(self) -> int:
         """Returns the number of nuclei."""
 
-        return len(self.nuclei)
+        return self._count
+
+    def _check_index(self, index: int) -> None:
+        """Makes sure a nucleus exists at a given index."""
+
+        if not (0 <= index < self._size
+                and self._status[index] & self._valid):
+            raise IndexError(f"No nucleus at index {index}")
+
+    def _grow(self) -> None:
+        """Doubles the capacity of the arrays."""
+
+        capacity = max(2 * len(self._x), 16)
+        for name in ('_x', '_y', '_status', '_tk_objs'):
+            old = getattr(self, name)
+            if old is None:
+                continue
+            new = np.full(capacity, -1 if name == '_tk_objs' else 0,
+                          dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+
+@dataclass
+class NucleiIndex:
+    """Class indexing the nuclei of one image on a uniform grid, for quickly
+    finding the nuclei in a given region of the image.
+
+    The nuclei are referred to by their index in the indexed Nuclei object.
+    The index only needs to be updated when nuclei are added or removed, not
+    when their color changes.
+    """
+
+    cell_size: float = 64
+    nuclei: Nuclei = field(default_factory=Nuclei)
+    cells: dict[tuple[int, int], list[int]] = field(default_factory=dict)
+
+    def build(self, nuclei: Nuclei) -> None:
+        """Indexes the given nuclei, dropping all the previously indexed
+        ones."""
+
+        self.nuclei = nuclei
+        self.cells = dict()
+        indexes = nuclei.indexes()
+        columns = (nuclei.x_positions[indexes] // self.cell_size).astype(int)
+        rows = (nuclei.y_positions[indexes] // self.cell_size).astype(int)
+        for index, column, row in zip(indexes.tolist(), columns.tolist(),
+                                      rows.tolist()):
+            self.cells.setdefault((column, row), list()).append(index)
+
+    def add(self, index: int) -> None:
+        """Adds the nucleus at a given index to the index."""
+
+        self.cells.setdefault(self._cell(index), list()).append(index)
+
+    def remove(self, index: int) -> None:
+        """Removes the nucleus at a given index from the index, before it is
+        removed from the nuclei."""
+
+        cell = self._cell(index)
+        try:
+            self.cells[cell].remove(index)
+        except (KeyError, ValueError):
+            raise ValueError("No matching nucleus to delete")
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def in_box(self,
+               x_min: float,
+               y_min: float,
+               x_max: float,
+               y_max: float) -> list[int]:
+        """Returns all the nuclei located inside a given box, limits included.
+
+        Args:
+            x_min: The left limit of the box.
+            y_min: The top limit of the box.
+            x_max: The right limit of the box.
+            y_max: The bottom limit of the box.
+
+        Returns:
+            The indexes of the nuclei inside the box, in no particular order.
+        """
+
+        col_min, row_min = int(x_min // self.cell_size), int(y_min //
+                                                             self.cell_size)
+        col_max, row_max = int(x_max // self.cell_size), int(y_max //
+                                                             self.cell_size)
+
+        # For large boxes, it is faster to go through the non-empty cells
+        if (col_max - col_min + 1) * (row_max - row_min + 1) > len(self.cells):
+            cells = (indexes for (col, row), indexes in self.cells.items()
+                     if col_min <= col <= col_max and row_min <= row <= row_max)
+        else:
+            cells = (self.cells[cell] for cell
+                     in product(range(col_min, col_max + 1),
+                                range(row_min, row_max + 1))
+                     if cell in self.cells)
+
+        indexes = np.fromiter((index for cell in cells for index in cell),
+                              dtype=np.intp)
+        x = self.nuclei.x_positions[indexes]
+        y = self.nuclei.y_positions[indexes]
+        return indexes[(x >= x_min) & (x <= x_max) &
+                       (y >= y_min) & (y <= y_max)].tolist()
+
+    def closest(self, x: float, y: float, radius: float) -> int | None:
+        """Returns the nucleus closest to a given position, among those at most
+        a given distance away along both axes.
+
+        Args:
+            x: The x position where to search for a nucleus.
+            y: The y position where to search for a nucleus.
+            radius: The maximum distance to the position along each axis.
+
+        Returns:
+            The index of the closest nucleus, or None if no nucleus is close
+            enough.
+        """
+
+        indexes = self.in_box(x - radius, y - radius, x + radius, y + radius)
+        if not indexes:
+            return None
+        distances = ((self.nuclei.x_positions[indexes] - x) ** 2 +
+                     (self.nuclei.y_positions[indexes] - y) ** 2)
+        return indexes[int(np.argmin(distances))]
+
+    def _cell(self, index: int) -> tuple[int, int]:
+        """Returns the column and row of the cell containing a nucleus."""
+
+        return (int(self.nuclei.x_positions[index] // self.cell_size),
+                int(self.nuclei.y_positions[index] // self.cell_size))
 
 
 @dataclass
@@ -113,6 +419,35 @@ class Fibers:
     area: float = field(default=0)
     fibers: list[Fiber] = field(default_factory=list)
 
+    @classmethod
+    def from_arrays(cls,
+                    vertices: np.ndarray,
+                    offsets: np.ndarray,
+                    area: float) -> 'Fibers':
+        """Creates a Fibers object from the vertices of the contours of the
+        fibers, in the format returned by :meth:`to_arrays`, and their area."""
+
+        vertices = vertices.tolist()
+        offsets = offsets.tolist()
+        return cls(area=area,
+                   fibers=[Fiber(list(map(tuple, vertices[start:end])))
+                           for start, end in zip(offsets[:-1], offsets[1:])])
+
+    def to_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the vertices of the contours of all the fibers in a single
+        array, and the offsets of each contour in it.
+
+        The contour of the i-th fiber lies between the i-th and i+1-th
+        offsets, the last offset being the total number of vertices.
+        """
+
+        contours = [np.asarray(fib.position).reshape(-1, 2) for fib in self]
+        offsets = np.cumsum([0] + [len(contour) for contour in contours],
+                            dtype=np.int64)
+        if not contours:
+            return np.empty((0, 2), dtype=np.int32), offsets
+        return np.concatenate(contours), offsets
+
     def append(self, fib: Fiber) -> None:
         """Adds a fiber to the list of fibers."""
 
@@ -340,23 +675,211 @@ class GraphicalElement(Frame):
 
 
 @dataclass
+class EntrySummary:
+    """Class holding the statistics of one image, that remain available when
+    its nuclei and fibers are not loaded."""
+
+    nuclei: int = 0
+    nuclei_in: int = 0
+    fibers: int = 0
+    area: float = 0
+
+
 class TableEntry:
-    """Class holding all the information associated with one image."""
+    """Class holding all the information associated with one image.
+
+    The nuclei and fibers of the images of a loaded project are only read from
+    the disk when they are first accessed, by calling the given loader. Until
+    then, the statistics of the image are taken from the given summary. The
+    data can later be released if it wasn't modified, as it can always be read
+    again.
+
+    The modified flag is set whenever the nuclei or fibers change, and cleared
+    once they are saved, so that only the changed images are written when
+    saving the project. Each time it is set, the revision of the entry is also
+    incremented, so that the changes made while the project is being saved
+    can be told apart from the saved ones.
+    """
+
+    def __init__(self,
+                 path: Path | str,
+                 nuclei: Nuclei | None = None,
+                 fibers: Fibers | None = None,
+                 graph_elt: GraphicalElement | None = None,
+                 summary: EntrySummary | None = None,
+                 loader: Callable[['TableEntry'],
+                                  tuple[Nuclei, Fibers]] | None = None
+                 ) -> None:
+        """Sets the arguments.
+
+        Args:
+            path: The path to the image.
+            nuclei: The nuclei of the image, or None if they should be loaded
+                later on.
+            fibers: The fibers of the image, or None if they should be loaded
+                later on.
+            graph_elt: The Frame displaying the entry in the files table.
+            summary: The statistics of the image, used as long as its nuclei
+                and fibers are not loaded.
+            loader: Returns the nuclei and fibers of the image when called with
+                the entry as argument. Must be given if nuclei and fibers are
+                not.
+        """
+
+        self.path = path
+        self.graph_elt = graph_elt
+        self.revision = 0
+        self._modified = False
+
+        self._nuclei = nuclei
+        self._fibers = fibers
+        self._summary = summary if summary is not None else EntrySummary()
+        self.loader = loader
+
+        # Entries created without data nor loader are simply empty
+        if loader is None:
+            if self._nuclei is None:
+                self._nuclei = Nuclei()
+            if self._fibers is None:
+                self._fibers = Fibers()
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Also supports the entries pickled as dataclasses by previous
+        versions."""
+
+        if 'nuclei' in state:
+            self.__init__(state['path'], state['nuclei'], state['fibers'],
+                          state.get('graph_elt'))
+        else:
+            self.__dict__.update(state)
+
+    def __eq__(self, other: Any) -> bool:
+        """Two entries are equal if they hold the same image, nuclei, fibers
+        and graphical element."""
+
+        if not isinstance(other, TableEntry):
+            return NotImplemented
+        return (self.path == other.path and self.nuclei == other.nuclei and
+                self.fibers == other.fibers and
+                self.graph_elt == other.graph_elt)
+
+    def __repr__(self) -> str:
+        """Only displays the path and loading status of the entry."""
+
+        return (f"{type(self).__name__}(path={self.path!r}, "
+                f"loaded={self.loaded})")
+
+    @property
+    def nuclei(self) -> Nuclei:
+        """The nuclei of the image, loaded if they weren't yet."""
+
+        if self._nuclei is None:
+            self._load()
+        return self._nuclei
+
+    @nuclei.setter
+    def nuclei(self, nuclei: Nuclei) -> None:
+        self._nuclei = nuclei
+
+    @property
+    def fibers(self) -> Fibers:
+        """The fibers of the image, loaded if they weren't yet."""
+
+        if self._fibers is None:
+            self._load()
+        return self._fibers
+
+    @fibers.setter
+    def fibers(self, fibers: Fibers) -> None:
+        self._fibers = fibers
+
+    @property
+    def modified(self) -> bool:
+        """Whether the nuclei or fibers of the image changed since they were
+        last saved."""
+
+        return self._modified
+
+    @modified.setter
+    def modified(self, modified: bool) -> None:
+        if modified:
+            self.revision += 1
+        self._modified = modified
 
-    path: Path | str
-    nuclei: Nuclei
-    fibers: Fibers
-    graph_elt: GraphicalElement | None = None
+    @property
+    def loaded(self) -> bool:
+        """Whether the nuclei and fibers of the image are in memory."""
+
+        return self._nuclei is not None and self._fibers is not None
 
     @property
-    def save_version(self):
-        """Returns a simpler version of the current class, with no canvas
-        object and with the path truncated to only the file name."""
+    def summary(self) -> EntrySummary:
+        """Returns the statistics of the image, without loading its data if
+        it's not in memory."""
+
+        if not self.loaded:
+            return self._summary
+        return EntrySummary(nuclei=len(self._nuclei),
+                            nuclei_in=self._nuclei.nuclei_in_count,
+                            fibers=len(self._fibers),
+                            area=self._fibers.area)
+
+    def unload(self) -> bool:
+        """Releases the nuclei and fibers of the image, if they can be loaded
+        again and weren't modified.
+
+        Returns:
+            True if the data was released, False otherwise.
+        """
+
+        if self.loader is None or self.modified or not self.loaded:
+            return False
 
-        return TableEntry(path=self.path.name,
-                          nuclei=self.nuclei,
-                          fibers=self.fibers,
-                          graph_elt=None)
+        self._summary = self.summary
+        self._nuclei = self._fibers = None
+        return True
+
+    def _load(self) -> None:
+        """Reads the nuclei and fibers of the image using the loader."""
+
+        self._nuclei, self._fibers = self.loader(self)
+
+    def set_processed_data(self,
+                           nuclei_out: list[tuple[np.ndarray, np.ndarray]],
+                           nuclei_in: list[tuple[np.ndarray, np.ndarray]],
+                           fiber_contours: tuple[np.ndarray, ...],
+                           area: float) -> None:
+        """Replaces the nuclei and fibers of the entry with the ones computed
+        by the segmentation.
+
+        Args:
+            nuclei_out: The positions of the nuclei outside the fibers.
+            nuclei_in: The positions of the nuclei inside the fibers.
+            fiber_contours: The positions of the contour points of the fibers.
+            area: The ratio of fiber area over the total image area.
+        """
+
+        # No need to load the previous data, it is replaced anyway
+        if not self.loaded:
+            self._nuclei, self._fibers = Nuclei(), Fibers()
+        self.modified = True
+
+        # Adds the received nuclei to the Nuclei object
+        self.nuclei.reset()
+        for x, y in nuclei_out:
+            self.nuclei.append(Nucleus(x, y, None, 'out'))
+        for x, y in nuclei_in:
+            self.nuclei.append(Nucleus(x, y, None, 'in'))
+
+        # Adds the received fibers to the Fibers object
+        self.fibers.reset()
+        self.fibers.area = area
+        for contour in fiber_contours:
+            # Ensuring single points are not being outlined
+            if len(contour.shape) < 2:
+                continue
+            contour = list(map(tuple, contour))
+            self.fibers.append(Fiber(contour))
 
 
 @dataclass
@@ -365,22 +888,30 @@ class TableItems:
 
     It also implements many helper functions for simplifying the code in the
     rest of the project.
+
+    The position of each entry is indexed by its path, and the position of the
+    selected entry is cached, so that the entries are never searched
+    linearly. The entries should therefore only be added, removed, renamed
+    and selected using the dedicated methods.
     """
 
     entries: list[TableEntry] = field(default_factory=list)
     current_index: int | None = None
+    _indexes: dict[Path | str, int] = field(default_factory=dict, init=False,
+                                            repr=False, compare=False)
+    _selected: int | None = field(default=None, init=False, repr=False,
+                                  compare=False)
+
+    def __post_init__(self) -> None:
+        """Indexes the entries given at instantiation."""
+
+        self._reindex()
 
     def __getitem__(self, item: Path) -> TableEntry:
         """Returns the TableEntry object whose path corresponds to the given
         one."""
 
-        # Searches for the first (hopefully the only) entry with a given path
-        for entry in self.entries:
-            if entry.path == item:
-                return entry
-
-        # In the (unlikely) case when there's no entry for the requested path
-        raise KeyError
+        return self.entries[self._indexes[item]]
 
     def __iter__(self) -> Iterator[TableEntry]:
         """Returns an iterator over the stored TableEntry objects."""
@@ -410,28 +941,27 @@ class TableItems:
         """Returns the TableEntry instance corresponding to the currently
         displayed image."""
 
-        if self.selected is None:
+        if self._selected is None:
             return
 
-        return self[self.selected]
+        return self.entries[self._selected]
 
     @property
     def selected(self) -> Path | None:
         """Returns the path of the TableEntry instance corresponding to the
         currently displayed image."""
 
-        for entry in self.entries:
-            if entry.graph_elt.selected.get():
-                return entry.path
+        if self._selected is not None:
+            return self.entries[self._selected].path
 
-    @property
-    def save_version(self):
-        """Returns a simpler version of the current class, with no canvas
-        object and with the paths of the TableEntry objects truncated to only
-        the file name."""
+    def select(self, index: int) -> None:
+        """Marks the entry at a given position as the one of the currently
+        displayed image, and unmarks the previously selected one."""
 
-        return TableItems(entries=[entry.save_version for entry
-                                   in self.entries])
+        if self._selected is not None:
+            self.entries[self._selected].graph_elt.selected.set(False)
+        self.entries[index].graph_elt.selected.set(True)
+        self._selected = index
 
     def reset(self) -> None:
         """Resets all the graphics and deletes all the stored TableEntry
@@ -439,6 +969,7 @@ class TableItems:
 
         self.reset_graphics()
         self.entries = list()
+        self._indexes = dict()
 
     def reset_graphics(self) -> None:
         """Deletes all the displayed Frames of the Table_entries, but keeps the
@@ -449,29 +980,55 @@ class TableItems:
             entry.graph_elt.destroy()
             del entry.graph_elt
 
+        # The new graphical elements are created unselected
+        self._selected = None
+
     def append(self, entry: TableEntry) -> None:
         """Adds a TableEntry object to the list of the stored ones."""
 
+        self._indexes.setdefault(entry.path, len(self.entries))
         self.entries.append(entry)
 
     def remove(self, path: Path) -> None:
         """Removes the TableEntry object corresponding to the given path from
         the list of the stored ones."""
 
-        try:
-            self.entries.remove(self[path])
-        except KeyError:
-            raise ValueError(f"No table entry associated with the path {path}")
+        index = self.index(path)
+        del self.entries[index]
+        self._reindex()
+
+        # Keeping the selected entry up to date
+        if self._selected == index:
+            self._selected = None
+        elif self._selected is not None and self._selected > index:
+            self._selected -= 1
+
+    def rename(self, path: Path, new_path: Path) -> None:
+        """Changes the path of the TableEntry object corresponding to the given
+        path."""
+
+        index = self.index(path)
+        self.entries[index].path = new_path
+        del self._indexes[path]
+        self._indexes.setdefault(new_path, index)
 
     def index(self, path: Path) -> int:
         """Returns the position of the TableEntry corresponding to the given
         path in the list of all the stored TableEntry objects."""
 
-        for i, entry in enumerate(self):
-            if entry.path == path:
-                return i
+        try:
+            return self._indexes[path]
+        except KeyError:
+            raise ValueError(f"No table entry associated with the path "
+                             f"{path}")
 
-        raise ValueError(f"No table entry associated with the path {path}")
+    def _reindex(self) -> None:
+        """Indexes the position of all the entries by their path, keeping the
+        first one in case several entries share the same path."""
+
+        self._indexes = dict()
+        for i, entry in enumerate(self.entries):
+            self._indexes.setdefault(entry.path, i)
 
 
 @dataclass
@@ -507,13 +1064,18 @@ class SelectionBox:
         if not bool(self):
             return False
 
-        x_min = min(self.x_start, self.x_end)
-        x_max = max(self.x_start, self.x_end)
-        y_min = min(self.y_start, self.y_end)
-        y_max = max(self.y_start, self.y_end)
+        x_min, y_min, x_max, y_max = self.limits
 
         return (x_min <= x <= x_max) and (y_min <= y <= y_max)
 
+    @property
+    def limits(self) -> tuple[float, float, float, float]:
+        """Returns the left, top, right and bottom limits of the selection
+        box."""
+
+        return (min(self.x_start, self.x_end), min(self.y_start, self.y_end),
+                max(self.x_start, self.x_end), max(self.y_start, self.y_end))
+
     @property
     def started(self) -> bool:
         """Returns True if the first corner of the selection box has been
@@ -540,6 +1102,13 @@ class Settings:
         default_factory=partial(StringVar, value="blue", name='nuclei_colour'))
     save_overlay: BooleanVar = field(
         default_factory=partial(BooleanVar, value=False, name='save_overlay'))
+    overlay_format: StringVar = field(
+        default_factory=partial(StringVar, value='same',
+                                name='overlay_format'))
+    overlay_compression: IntVar = field(
+        default_factory=partial(IntVar, value=1, name='overlay_compression'))
+    overlay_workers: IntVar = field(
+        default_factory=partial(IntVar, value=1, name='overlay_workers'))
     minimum_fiber_intensity: IntVar = field(
         default_factory=partial(IntVar, value=25,
                                 name='minimum_fiber_intensity'))
@@ -566,6 +1135,15 @@ class Settings:
         default_factory=partial(BooleanVar, value=True, name='show_nuclei'))
     show_fibers: BooleanVar = field(
         default_factory=partial(BooleanVar, value=False, name='show_fibers'))
+    processing_workers: IntVar = field(
+        default_factory=partial(IntVar, value=1, name='processing_workers'))
+    decode_queue_depth: IntVar = field(
+        default_factory=partial(IntVar, value=2, name='decode_queue_depth'))
+    post_processing_queue_depth: IntVar = field(
+        default_factory=partial(IntVar, value=2,
+                                name='post_processing_queue_depth'))
+    tile_size: IntVar = field(
+        default_factory=partial(IntVar, value=0, name='tile_size'))
 
     _logger: logging.Logger | None = None
 
@@ -582,6 +1160,9 @@ class Settings:
             'fiber_colour': self.fiber_colour.get(),
             'nuclei_colour': self.nuclei_colour.get(),
             'save_overlay': self.save_overlay.get(),
+            'overlay_format': self.overlay_format.get(),
+            'overlay_compression': self.overlay_compression.get(),
+            'overlay_workers': self.overlay_workers.get(),
             'minimum_fiber_intensity': self.minimum_fiber_intensity.get(),
             'maximum_fiber_intensity': self.maximum_fiber_intensity.get(),
             'minimum_nucleus_intensity': self.minimum_nucleus_intensity.get(),
@@ -592,7 +1173,24 @@ class Settings:
             'green_channel_bool': self.green_channel_bool.get(),
             'red_channel_bool': self.red_channel_bool.get(),
             'show_nuclei': self.show_nuclei.get(),
-            'show_fibers': self.show_fibers.get()}
+            'show_fibers': self.show_fibers.get(),
+            'processing_workers': self.processing_workers.get(),
+            'decode_queue_depth': self.decode_queue_depth.get(),
+            'post_processing_queue_depth':
+                self.post_processing_queue_depth.get(),
+            'tile_size': self.tile_size.get()}
+
+    @classmethod
+    def defaults(cls) -> dict[str, Any]:
+        """Returns a dict containing the default values of all the settings.
+
+        Unlike :meth:`get_all`, it doesn't instantiate any tkinter variable and
+        can therefore be called without a running interface.
+        """
+
+        return {setting.name: setting.default_factory.keywords['value']
+                for setting in fields(cls)
+                if isinstance(setting.default_factory, partial)}
 
     def update(self, settings: dict[str, Any]) -> None:
         """Updates the values of the settings based on the provided dictionary.
@@ -21,3 +21,11 @@ from .test_18_change_settings import Test18ChangeSettings
 from .test_19_process_vary_settings import Test19ProcessVarySettings
 from .test_20_save_vary_settings import Test20SaveVarySettings
 from .test_21_process_vary_channels import Test21ProcessVaryChannels
+from .test_22_batch_processing import Test22BatchProcessing
+from .test_23_segmentation_cache import Test23SegmentationCache
+from .test_24_settings_preview import Test24SettingsPreview
+from .test_25_nuclei_overlay import Test25NucleiOverlay
+from .test_26_batch_inference import Test26BatchInference
+from .test_27_interrupted_save import Test27InterruptedSave
+from .test_28_hole_sums import Test28HoleSums
+from .test_29_project_data import Test29ProjectData
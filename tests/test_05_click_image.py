@@ -94,6 +94,13 @@ class Test05ClickImage(BaseTestInterface):
         self.assertEqual((self._window._files_table.table_items.current_entry.
                           nuclei.nuclei_out_count), 5)
 
+        # Checking that the spatial index holds exactly the remaining nuclei
+        self.assertEqual(
+            sorted(self._window._image_canvas._nuclei_index.in_box(
+                0, 0, self._window._image_canvas._image.width,
+                self._window._image_canvas._image.height)),
+            self._window._image_canvas._nuclei.indexes().tolist())
+
         # Generating a left click-and-drag over the 5 remaining nuclei
         self._window._image_canvas._canvas.event_generate(
             '<ButtonPress-1>', when="now", x=5, y=5)
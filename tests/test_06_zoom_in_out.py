@@ -8,6 +8,13 @@ from .util import BaseTestInterface, mock_filedialog, mock_warning_window
 
 class Test06ZoomInOut(BaseTestInterface):
 
+    def _displayed_size(self) -> tuple[int, int]:
+        """Returns the width and height of the region covered by the displayed
+        tiles of the image."""
+
+        x_0, y_0, x_1, y_1 = self._window._image_canvas._canvas.bbox('image')
+        return x_1 - x_0, y_1 - y_0
+
     def testZoomInOut(self) -> None:
         """This test checks that the image in the image canvas is correctly
         resized when using the mousewheel."""
@@ -20,8 +27,7 @@ class Test06ZoomInOut(BaseTestInterface):
 
         # Reading the scale and dimension of the image before any interaction
         scale_0 = self._window._image_canvas._img_scale
-        width_0 = self._window._image_canvas._image_tk.width()
-        height_0 = self._window._image_canvas._image_tk.height()
+        width_0, height_0 = self._displayed_size()
 
         # Checking that the displayed image is by default not zoomed in or out
         self.assertEqual(self._window._image_canvas._can_scale, 1.0)
@@ -42,10 +48,8 @@ class Test06ZoomInOut(BaseTestInterface):
         self.assertEqual(self._window._image_canvas._can_scale,
                          self._window._image_canvas._delta)
         self.assertEqual(self._window._image_canvas._current_zoom, 1)
-        self.assertGreater(self._window._image_canvas._image_tk.width(),
-                           width_0)
-        self.assertGreater(
-            self._window._image_canvas._image_tk.height(), height_0)
+        self.assertGreater(self._displayed_size()[0], width_0)
+        self.assertGreater(self._displayed_size()[1], height_0)
 
         # Generating five zoom-in events with the mousewheel
         for _ in range(5):
@@ -63,10 +67,8 @@ class Test06ZoomInOut(BaseTestInterface):
         self.assertAlmostEqual(self._window._image_canvas._can_scale,
                                self._window._image_canvas._delta ** 5)
         self.assertEqual(self._window._image_canvas._current_zoom, 5)
-        self.assertGreater(self._window._image_canvas._image_tk.width(),
-                           width_0)
-        self.assertGreater(
-            self._window._image_canvas._image_tk.height(), height_0)
+        self.assertGreater(self._displayed_size()[0], width_0)
+        self.assertGreater(self._displayed_size()[1], height_0)
 
         # Generating 11 zoom-out events with the mousewheel
         for _ in range(11):
@@ -84,7 +86,5 @@ class Test06ZoomInOut(BaseTestInterface):
         self.assertAlmostEqual(self._window._image_canvas._can_scale,
                                self._window._image_canvas._delta ** -5)
         self.assertEqual(self._window._image_canvas._current_zoom, -5)
-        self.assertLess(self._window._image_canvas._image_tk.width(),
-                        width_0)
-        self.assertLess(self._window._image_canvas._image_tk.height(),
-                        height_0)
+        self.assertLess(self._displayed_size()[0], width_0)
+        self.assertLess(self._displayed_size()[1], height_0)
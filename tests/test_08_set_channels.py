@@ -7,6 +7,14 @@ from .util import BaseTestInterface, mock_filedialog, mock_warning_window
 
 class Test08SetChannels(BaseTestInterface):
 
+    def _top_left_pixel(self) -> tuple[int, int, int]:
+        """Returns the RGB value of the pixel in position (0, 0) of the
+        displayed image."""
+
+        canvas = self._window._image_canvas
+        key = next(key for key in canvas._tile_ids if key[2:] == (0, 0))
+        return canvas._tiles[key]._PhotoImage__photo.get(0, 0)
+
     def testSetChannels(self) -> None:
         """This test checks that the checkboxes in the interface can
         successfully show or hide the channels of the displayed image."""
@@ -26,8 +34,7 @@ class Test08SetChannels(BaseTestInterface):
         init_b = self._window.settings.blue_channel_bool.get()
 
         # Reading the RGB value of the pixel in position (0, 0)
-        r, g, b = (self._window._image_canvas._image_tk.
-                   _PhotoImage__photo.get(0, 0))
+        r, g, b = self._top_left_pixel()
 
         # Checking that the RGB values are consistent with the state of the
         # checkboxes
@@ -41,8 +48,7 @@ class Test08SetChannels(BaseTestInterface):
         self._window._blue_channel_check_button.invoke()
 
         # Reading the new RGB value of the pixel in position (0, 0)
-        r, g, b = (self._window._image_canvas._image_tk.
-                   _PhotoImage__photo.get(0, 0))
+        r, g, b = self._top_left_pixel()
 
         # Reading the new values of the checkboxes driving the display of the
         # channels
@@ -52,11 +52,13 @@ class Test14SaveProject(BaseTestInterfaceProcessing):
         self.assertTrue(save_path.is_dir())
         self.assertTrue((save_path / 'settings.pickle').exists())
         self.assertTrue((save_path / 'save_folder.xlsx').exists())
-        self.assertTrue((save_path / 'data.pickle').exists())
+        self.assertTrue((save_path / 'Data' / 'index.json').exists())
         self.assertTrue((save_path / 'Original Images').exists())
         self.assertTrue((save_path / 'Original Images').is_dir())
         self.assertGreater(len(tuple((save_path /
                                       'Original Images').iterdir())), 0)
+        # The staging folder should have replaced the project folder
+        self.assertFalse((save_path.parent / '.save_folder.saving').exists())
 
         # Copying all the files that were just saved to a different folder
         shutil.copytree(save_path, save_path / 'copy')
@@ -66,11 +68,13 @@ class Test14SaveProject(BaseTestInterfaceProcessing):
 
         # Checking that the recorded files are still the same as the first ones
         comp = filecmp.cmpfiles(save_path, save_path / 'copy',
-                                ('data.pickle', 'settings.pickle',
-                                 'save_folder.xlsx',
+                                ('Data/index.json',
+                                 'Data/image_1.jpg.nuclei.npy',
+                                 'settings.pickle', 'save_folder.xlsx',
                                  'Original Images/image_1.jpg'), shallow=False)
-        self.assertCountEqual(('data.pickle', 'settings.pickle',
-                               'save_folder.xlsx',
+        self.assertCountEqual(('Data/index.json',
+                               'Data/image_1.jpg.nuclei.npy',
+                               'settings.pickle', 'save_folder.xlsx',
                                'Original Images/image_1.jpg'), comp[0])
         self.assertFalse(comp[1] or comp[2])
 
@@ -85,13 +89,19 @@ class Test14SaveProject(BaseTestInterfaceProcessing):
         # Triggering a third save action using the "Save" button
         self._window._save_button.invoke()
 
+        # Checking that the modification is not pending anymore once saved
+        self.assertFalse(any(entry.modified for entry
+                             in self._window._files_table.table_items))
+
         # Checking that some recorded files are now different to the original
         # due to the modification
         comp = filecmp.cmpfiles(save_path, save_path / 'copy',
-                                ('data.pickle', 'settings.pickle',
-                                 'save_folder.xlsx',
+                                ('Data/index.json',
+                                 'Data/image_1.jpg.nuclei.npy',
+                                 'settings.pickle', 'save_folder.xlsx',
                                  'Original Images/image_1.jpg'), shallow=False)
         self.assertCountEqual(('Original Images/image_1.jpg',), comp[0])
-        self.assertCountEqual(('data.pickle', 'save_folder.xlsx',
-                               'settings.pickle'), comp[1])
+        self.assertCountEqual(('Data/index.json',
+                               'Data/image_1.jpg.nuclei.npy',
+                               'save_folder.xlsx', 'settings.pickle'), comp[1])
         self.assertFalse(comp[2])
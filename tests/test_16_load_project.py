@@ -6,7 +6,7 @@ from threading import Thread
 from time import sleep
 
 from .util import (BaseTestInterfaceProcessing, mock_filedialog,
-                   mock_warning_window)
+                   mock_warning_window, save_version)
 
 
 class Test16LoadProject(BaseTestInterfaceProcessing):
@@ -44,7 +44,7 @@ class Test16LoadProject(BaseTestInterfaceProcessing):
 
         # Copying the current parameters and image data to later compare it
         settings = deepcopy(self._window.settings.get_all())
-        table = deepcopy(self._window._files_table.table_items.save_version)
+        table = deepcopy(save_version(self._window._files_table.table_items))
 
         # Triggering a save action using the "Save" button
         self._window._save_button.invoke()
@@ -59,5 +59,8 @@ class Test16LoadProject(BaseTestInterfaceProcessing):
 
         # Checking that the loaded data matches the one copied earlier
         self.assertEqual(settings, self._window.settings.get_all())
+        self.assertEqual([entry.summary for entry in table],
+                         [entry.summary for entry
+                          in self._window._files_table.table_items])
         self.assertEqual(table,
-                         self._window._files_table.table_items.save_version)
+                         save_version(self._window._files_table.table_items))
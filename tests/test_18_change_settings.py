@@ -47,6 +47,31 @@ class Test18ChangeSettings(BaseTestInterface):
         else:
             self._window._settings_window._overlay_on_button.invoke()
 
+        # Modifying the overlay format setting value
+        buttons = self._window._settings_window._overlay_format_buttons
+        if init_settings['overlay_format'] == 'png':
+            buttons[2].invoke()
+        else:
+            buttons[1].invoke()
+
+        # Modifying the overlay compression setting value
+        compression = init_settings['overlay_compression']
+        if int(compression - 1) >= 0:
+            self._window._settings_window._compression_slider.set(
+                int(compression - 1))
+        else:
+            self._window._settings_window._compression_slider.set(
+                int(compression + 1))
+
+        # Modifying the number of overlay workers setting value
+        overlay_workers = init_settings['overlay_workers']
+        if int(overlay_workers - 1) > 0:
+            self._window._settings_window._overlay_workers_slider.set(
+                int(overlay_workers - 1))
+        else:
+            self._window._settings_window._overlay_workers_slider.set(
+                int(overlay_workers + 1))
+
         # Modifying the minimum fiber intensity setting value
         min_fib_int = init_settings['minimum_fiber_intensity']
         if int(min_fib_int - 1) > 0:
@@ -101,6 +126,41 @@ class Test18ChangeSettings(BaseTestInterface):
             self._window._settings_window._count_slider.set(
                 int(min_nuc_count + 1))
 
+        # Modifying the number of processing workers setting value
+        workers = init_settings['processing_workers']
+        if int(workers - 1) > 0:
+            self._window._settings_window._workers_slider.set(
+                int(workers - 1))
+        else:
+            self._window._settings_window._workers_slider.set(
+                int(workers + 1))
+
+        # Modifying the pipeline queue depths settings values
+        decode_depth = init_settings['decode_queue_depth']
+        if int(decode_depth - 1) > 0:
+            self._window._settings_window._decode_depth_slider.set(
+                int(decode_depth - 1))
+        else:
+            self._window._settings_window._decode_depth_slider.set(
+                int(decode_depth + 1))
+
+        post_depth = init_settings['post_processing_queue_depth']
+        if int(post_depth - 1) > 0:
+            self._window._settings_window._post_depth_slider.set(
+                int(post_depth - 1))
+        else:
+            self._window._settings_window._post_depth_slider.set(
+                int(post_depth + 1))
+
+        # Modifying the tile size setting value
+        tile_size = init_settings['tile_size']
+        if int(tile_size - 512) >= 0:
+            self._window._settings_window._tile_size_slider.set(
+                int(tile_size - 512))
+        else:
+            self._window._settings_window._tile_size_slider.set(
+                int(tile_size + 512))
+
         # Modifying the channels display settings values
         self._window._red_channel_check_button.invoke()
         self._window._green_channel_check_button.invoke()
@@ -92,3 +92,18 @@ class Test20SaveVarySettings(BaseTestInterfaceProcessing):
         self.assertTrue(save_path.exists())
         self.assertTrue((save_path / 'Overlay Images' /
                          'image_1.jpg').exists())
+
+        # Saving the overlay images as PNG, with several workers
+        index = self._window._settings_menu.index("Settings")
+        self._window._settings_menu.invoke(index)
+        self._window._settings_window._overlay_format_buttons[1].invoke()
+        self._window._settings_window._overlay_workers_slider.set(2)
+        self._window._settings_window.destroy()
+
+        self._window._save_button.invoke()
+
+        # Checking that the overlay images were replaced with PNG ones
+        self.assertTrue((save_path / 'Overlay Images' /
+                         'image_1.png').exists())
+        self.assertFalse((save_path / 'Overlay Images' /
+                          'image_1.jpg').exists())
@@ -0,0 +1,43 @@
+# coding: utf-8
+
+from pathlib import Path
+
+from .util import BaseTestInterface, mock_filedialog
+
+
+class Test22BatchProcessing(BaseTestInterface):
+
+    def testBatchProcessing(self) -> None:
+        """This test checks that images processed from the command line are
+        saved as a project that can be loaded in the interface."""
+
+        from myofinder.batch import main
+
+        # Processing two images from the command line
+        save_path = Path(self._dir.name) / 'batch_folder'
+        ret = main([str(Path(__file__).parent / 'data' / 'image_1.jpg'),
+                    str(Path(__file__).parent / 'data' / 'image_2.jpg'),
+                    '-o', str(save_path), '--save-overlay', '-n'])
+        self.assertEqual(ret, 0)
+
+        # Checking that all the files that should be saved were indeed created
+        self.assertTrue((save_path / 'settings.pickle').exists())
+        self.assertTrue((save_path / 'batch_folder.xlsx').exists())
+        self.assertTrue((save_path / 'Data' / 'index.json').exists())
+        self.assertEqual(len(tuple((save_path /
+                                    'Original Images').iterdir())), 2)
+        self.assertEqual(len(tuple((save_path /
+                                    'Overlay Images').iterdir())), 2)
+
+        # Loading the project in the interface
+        mock_filedialog.load_directory = str(save_path)
+        index = self._window._file_menu.index("Load From Explorer")
+        self._window._file_menu.invoke(index)
+
+        # Checking that the processed data was loaded
+        table = self._window._files_table.table_items
+        self.assertEqual(len(table.entries), 2)
+        for entry in table:
+            self.assertGreater(len(entry.nuclei), 0)
+            self.assertGreater(len(entry.fibers), 0)
+        self.assertTrue(self._window.settings.save_overlay.get())
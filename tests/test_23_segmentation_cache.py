@@ -0,0 +1,67 @@
+# coding: utf-8
+
+from copy import deepcopy
+from pathlib import Path
+from threading import Thread
+from time import sleep
+
+from .util import (BaseTestInterfaceProcessing, mock_filedialog,
+                   mock_warning_window, save_version)
+
+
+class Test23SegmentationCache(BaseTestInterfaceProcessing):
+
+    def testSegmentationCache(self) -> None:
+        """This test checks that the segmentation results are cached in the
+        application folder, and that processing again an image from the cache
+        gives the same result."""
+
+        # The mock selection window returns the path to one image to load
+        mock_filedialog.file_name = [
+            str(Path(__file__).parent / 'data' / 'image_1.jpg')]
+        mock_warning_window.WarningWindow.value = 1
+        self._window._select_images()
+
+        # Stopping the regular processing Thread
+        self._window._stop_thread = True
+        sleep(2)
+
+        # Processing the image a first time
+        self._window._process_images_button.invoke()
+        self._window._stop_thread = False
+        Thread(target=self._stop_thread).start()
+        self._window._process_thread()
+        self._window._handle_ui_queue()
+        self._window._handle_ui_queue()
+        table = deepcopy(save_version(self._window._files_table.table_items))
+
+        # Checking that the fiber mask and the labeled image were cached
+        cache_folder = Path(self._dir.name) / 'cache'
+        self.assertTrue(cache_folder.is_dir())
+        self.assertEqual(len(tuple(cache_folder.glob('*.npz'))), 2)
+
+        # Processing the image a second time, using the cached results
+        self._window._process_images_button.invoke()
+        self._window._stop_thread = False
+        Thread(target=self._stop_thread).start()
+        self._window._process_thread()
+        self._window._handle_ui_queue()
+        self._window._handle_ui_queue()
+
+        # Checking that the results are identical and no file was added
+        self.assertEqual(table,
+                         save_version(self._window._files_table.table_items))
+        self.assertEqual(len(tuple(cache_folder.glob('*.npz'))), 2)
+
+        # Processing the image with a different minimum nucleus diameter
+        self._window.settings.minimum_nuc_diameter.set(
+            self._window.settings.minimum_nuc_diameter.get() + 5)
+        self._window._process_images_button.invoke()
+        self._window._stop_thread = False
+        Thread(target=self._stop_thread).start()
+        self._window._process_thread()
+        self._window._handle_ui_queue()
+        self._window._handle_ui_queue()
+
+        # Checking that the cached labeled image was reused
+        self.assertEqual(len(tuple(cache_folder.glob('*.npz'))), 2)
@@ -0,0 +1,71 @@
+# coding: utf-8
+
+from pathlib import Path
+from threading import Thread
+from time import sleep
+
+from .util import (BaseTestInterfaceProcessing, mock_filedialog,
+                   mock_warning_window)
+
+
+class Test24SettingsPreview(BaseTestInterfaceProcessing):
+
+    def testSettingsPreview(self) -> None:
+        """This test checks that the effect of the settings can be previewed on
+        a processed image, and that the actual nuclei and fibers are displayed
+        again when closing the settings window."""
+
+        # The mock selection window returns the path to one image to load
+        mock_filedialog.file_name = [
+            str(Path(__file__).parent / 'data' / 'image_1.jpg')]
+        mock_warning_window.WarningWindow.value = 1
+        self._window._select_images()
+
+        # Stopping the regular processing Thread
+        self._window._stop_thread = True
+        sleep(2)
+
+        # Opening the settings window and enabling the preview
+        index = self._window._settings_menu.index("Settings")
+        self._window._settings_menu.invoke(index)
+        settings_window = self._window._settings_window
+        settings_window._preview_button.invoke()
+
+        # The preview is not possible as long as the image is not processed
+        self.assertTrue(settings_window._preview_status.get())
+        self.assertIsNone(self._window._image_canvas._preview_backup)
+        settings_window.destroy()
+
+        # Processing the image
+        self._window._process_images_button.invoke()
+        self._window._stop_thread = False
+        Thread(target=self._stop_thread).start()
+        self._window._process_thread()
+        self._window._handle_ui_queue()
+        self._window._handle_ui_queue()
+        nuclei = self._window._image_canvas._nuclei
+        fibers = self._window._image_canvas._fibers
+
+        # Opening the settings window and enabling the preview again
+        self._window._settings_menu.invoke(index)
+        settings_window = self._window._settings_window
+        settings_window._preview_button.invoke()
+        self.assertFalse(settings_window._preview_status.get())
+        self.assertIsNotNone(self._window._image_canvas._preview_backup)
+
+        # Modifying a setting and updating the preview
+        settings_window._min_nuc_int_slider.set(
+            settings_window._min_nuc_int_slider.get() + 10)
+        self.assertIsNotNone(settings_window._preview_after)
+        settings_window._update_preview()
+        self.assertIsNot(self._window._image_canvas._nuclei, nuclei)
+        self.assertTrue(all(nuc.tk_obj is not None for nuc
+                            in self._window._image_canvas._nuclei))
+
+        # Closing the settings window restores the actual nuclei and fibers
+        settings_window.destroy()
+        self.assertIsNone(self._window._image_canvas._preview_backup)
+        self.assertIs(self._window._image_canvas._nuclei, nuclei)
+        self.assertIs(self._window._image_canvas._fibers, fibers)
+        self.assertTrue(all(nuc.tk_obj is not None for nuc
+                            in self._window._image_canvas._nuclei))
@@ -0,0 +1,74 @@
+# coding: utf-8
+
+from pathlib import Path
+from unittest.mock import patch
+
+from .util import BaseTestInterface, mock_filedialog, mock_warning_window
+
+
+class Test25NucleiOverlay(BaseTestInterface):
+
+    def testNucleiOverlay(self) -> None:
+        """This test checks that the nuclei are correctly drawn on overlay
+        tiles when they are too many to be drawn as individual canvas items,
+        and that the overlay is updated when editing the nuclei."""
+
+        from myofinder import image_canvas
+
+        # Forcing the nuclei to be drawn on overlay tiles
+        with patch.object(image_canvas, '_max_nuclei_items', -1):
+            # The mock selection window returns the path to one image to load
+            mock_filedialog.file_name = [str(Path(__file__).parent / 'data' /
+                                             'image_1.jpg')]
+            mock_warning_window.WarningWindow.value = 1
+            self._window._select_images()
+
+        canvas = self._window._image_canvas
+        self.assertTrue(canvas._nuc_rasterized)
+        self.assertGreater(len(canvas._nuc_tiles), 0)
+
+        # Generating 10 left-clicks on the image canvas
+        for i in range(1, 11):
+            canvas._canvas.event_generate(
+                '<ButtonPress-1>', when="now", x=10 * i, y=10 * i)
+            canvas._canvas.event_generate(
+                '<ButtonRelease-1>', when="now", x=10 * i, y=10 * i)
+        canvas.update_idletasks()
+
+        # The nuclei are added, but not as canvas items
+        self.assertEqual(len(canvas._nuclei), 10)
+        self.assertTrue(all(nuc.tk_obj is None for nuc in canvas._nuclei))
+
+        # Checking that the nuclei are drawn on the overlay
+        for nuc in canvas._nuclei:
+            x = int(nuc.x_pos * canvas._img_scale)
+            y = int(nuc.y_pos * canvas._img_scale)
+            overlay, *_ = canvas._nuc_tiles[(canvas._current_zoom,
+                                             x // image_canvas._tile_size,
+                                             y // image_canvas._tile_size)]
+            self.assertEqual(overlay.getpixel((x % image_canvas._tile_size,
+                                               y % image_canvas._tile_size)),
+                             (*image_canvas.ImageColor.getrgb(
+                                 canvas.nuc_col_out), 255))
+
+        # Deleting a nucleus with a right-click removes it from the overlay
+        nuc = next(iter(canvas._nuclei))
+        x = int(nuc.x_pos * canvas._img_scale)
+        y = int(nuc.y_pos * canvas._img_scale)
+        canvas._canvas.event_generate('<ButtonPress-3>', when="now",
+                                      x=10, y=10)
+        canvas._canvas.event_generate('<ButtonRelease-3>', when="now",
+                                      x=10, y=10)
+        canvas.update_idletasks()
+        self.assertEqual(len(canvas._nuclei), 9)
+        overlay, *_ = canvas._nuc_tiles[(canvas._current_zoom,
+                                         x // image_canvas._tile_size,
+                                         y // image_canvas._tile_size)]
+        self.assertEqual(overlay.getpixel((x % image_canvas._tile_size,
+                                           y % image_canvas._tile_size))[3],
+                         0)
+
+        # Hiding the nuclei hides the overlay tiles
+        self._window._show_nuclei_check_button.invoke()
+        self.assertTrue(all(canvas._canvas.itemcget(idx, "state") == 'hidden'
+                            for *_, idx in canvas._nuc_tiles.values()))
@@ -0,0 +1,44 @@
+# coding: utf-8
+
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import cellpose.core
+
+
+class Test26BatchInference(unittest.TestCase):
+
+    def testBatchInference(self) -> None:
+        """This test checks that the tiles of several images of a same group
+        are sent together through the Cellpose network when processing images
+        in batch."""
+
+        from myofinder.image_segmentation import (ImageSegmentation,
+                                                  _count_network_tiles)
+
+        segmentation = ImageSegmentation()
+
+        # Recording the number of tiles in each batch sent through the network
+        batches = list()
+        forward = cellpose.core._forward
+
+        def record(net, x):
+            batches.append(x.shape[0])
+            return forward(net, x)
+
+        # Processing two images of 1024x1024 pixels in a same group
+        paths = [Path(__file__).parent / 'data' / 'image_2.jpg',
+                 Path(__file__).parent / 'data' / 'image_3.jpg']
+        with mock.patch('cellpose.core._forward', side_effect=record):
+            results = segmentation.batch(paths, 'blue', 'green', 25, 255, 25,
+                                         255, 20, 3)
+
+        # Checking that the images were processed without error
+        for path, result in results:
+            self.assertNotIsInstance(result, Exception)
+
+        # Checking that a batch held the tiles of more than one image
+        tiles = _count_network_tiles((1024, 1024))
+        self.assertEqual(tiles, 36)
+        self.assertGreater(max(batches), tiles)
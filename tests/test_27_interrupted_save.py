@@ -0,0 +1,129 @@
+# coding: utf-8
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from myofinder.tools import (ProjectSave, Settings, TableItems, TableEntry,
+                             Nucleus, Nuclei, Fibers, recover_interrupted_save,
+                             recover_projects, save_data, load_data)
+
+
+class Test27InterruptedSave(unittest.TestCase):
+
+    def setUp(self) -> None:
+        """Creates a temporary directory for the application folder and the
+        project."""
+
+        self._dir = TemporaryDirectory()
+        self._app_folder = Path(self._dir.name) / 'app'
+        self._app_folder.mkdir()
+        self._project = Path(self._dir.name) / 'project'
+        self._items = TableItems(entries=[TableEntry(
+            path=Path(__file__).parent / 'data' / 'image_1.jpg',
+            nuclei=Nuclei(), fibers=Fibers())])
+
+    def tearDown(self) -> None:
+        """Cleans up the temporary directory."""
+
+        self._dir.cleanup()
+
+    def _save(self) -> ProjectSave:
+        """Saves the project and waits for the save to complete."""
+
+        save = ProjectSave(self._items, self._project, Settings.defaults(),
+                           list(self._items), None, True, self._app_folder)
+        save.start()
+        while save.messages.get() != 'Done':
+            pass
+        save._thread.join()
+        return save
+
+    def _interrupted_save(self) -> None:
+        """Saves the project again, stopping the save like a crash of the
+        application would between the two renames of the commit."""
+
+        rename = Path.rename
+        staging = (self._project.parent / '.project.saving' /
+                   self._project.name)
+
+        def crash(path: Path, target: Path) -> Path:
+            if path == staging:
+                raise KeyboardInterrupt
+            return rename(path, target)
+
+        with mock.patch.object(Path, 'rename', autospec=True,
+                               side_effect=crash), \
+                mock.patch('threading.excepthook'):
+            self._save()
+
+        # Checking that the project folder is missing at this point
+        self.assertFalse(self._project.exists())
+
+    def testInterruptedSave(self) -> None:
+        """This test checks that a project whose save was interrupted while
+        replacing its folder is restored, either when the application starts
+        or when loading the project."""
+
+        # Saving the project a first time
+        save = self._save()
+        self.assertIsNone(save.error)
+        save.apply(self._items)
+        self.assertTrue((self._project / 'settings.pickle').exists())
+
+        # Restoring the project like when the application starts
+        self._interrupted_save()
+        self.assertEqual(recover_interrupted_save(self._app_folder),
+                         self._project)
+        self.assertTrue((self._project / 'settings.pickle').exists())
+        self.assertTrue((self._project / 'Original Images' /
+                         'image_1.jpg').exists())
+        self.assertFalse((self._project.parent / '.project.saving').exists())
+        self.assertIsNone(recover_interrupted_save(self._app_folder))
+
+        # Restoring the project like when loading the folder containing it
+        self._interrupted_save()
+        self.assertEqual(recover_projects(self._project.parent),
+                         [self._project])
+        self.assertTrue((self._project / 'settings.pickle').exists())
+        self.assertFalse((self._project.parent / '.project.saving').exists())
+
+        # Checking that the project can be saved again
+        self.assertIsNone(self._save().error)
+        self.assertFalse(any(self._app_folder.iterdir()))
+
+    def testEditDuringSave(self) -> None:
+        """This test checks that an entry modified while the project is being
+        saved remains marked as modified once the save is over."""
+
+        self._items.append(TableEntry(
+            path=Path(__file__).parent / 'data' / 'image_2.jpg',
+            nuclei=Nuclei(), fibers=Fibers()))
+        edited, other = self._items
+        edited.modified = other.modified = True
+
+        # Adding a nucleus to the first entry while its data is being saved
+        def edit(*args, **kwargs) -> None:
+            edited.nuclei.append(Nucleus(10, 20, None, 'out'))
+            edited.modified = True
+            save_data(*args, **kwargs)
+
+        with mock.patch('myofinder.tools._project_save.save_data',
+                        side_effect=edit):
+            save = self._save()
+        self.assertIsNone(save.error)
+        save.apply(self._items)
+
+        # Checking that only the entry that wasn't edited is marked as saved
+        self.assertTrue(edited.modified)
+        self.assertFalse(other.modified)
+        self.assertEqual(len(edited.nuclei), 1)
+        self.assertEqual(len(load_data(self._project).entries[0].nuclei), 0)
+
+        # Checking that the edit is written by the next save
+        save = self._save()
+        self.assertIsNone(save.error)
+        save.apply(self._items)
+        self.assertFalse(edited.modified)
+        self.assertEqual(len(load_data(self._project).entries[0].nuclei), 1)
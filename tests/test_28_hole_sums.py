@@ -0,0 +1,67 @@
+# coding: utf-8
+
+import unittest
+
+import cv2
+import numpy as np
+
+
+class Test28HoleSums(unittest.TestCase):
+
+    def setUp(self) -> None:
+        """Creates the random generator for the intensity channels."""
+
+        self._rng = np.random.default_rng(0)
+
+    def testNestedSiblingHoles(self) -> None:
+        """This test checks that the pixels of the wall separating two sibling
+        holes nested in an island are counted only once in the ancestors of
+        the holes."""
+
+        image = np.zeros((60, 60), dtype=np.uint8)
+        image[2:58, 2:58] = 255
+        image[8:52, 8:52] = 0
+        image[12:48, 12:48] = 255
+        # Two sibling holes separated by a wall of only one pixel
+        image[16:44, 16:29] = 0
+        image[16:44, 30:44] = 0
+
+        self._check_hole_sums(image)
+
+    def testRandomHoles(self) -> None:
+        """This test checks the hole sums on random images containing many
+        nested and adjacent contours."""
+
+        for _ in range(50):
+            image = (self._rng.random((80, 80)) > 0.45).astype(np.uint8) * 255
+            self._check_hole_sums(image)
+
+    def _check_hole_sums(self, image: np.ndarray) -> None:
+        """Compares the hole sums to the ones obtained by filling each inside
+        contour separately."""
+
+        from myofinder.image_segmentation import ImageSegmentation
+
+        nuclei_channel = self._rng.integers(0, 255, image.shape,
+                                            dtype=np.uint8)
+        fiber_channel = self._rng.integers(0, 255, image.shape,
+                                           dtype=np.uint8)
+
+        contours, hierarchy = cv2.findContours(image, cv2.RETR_TREE,
+                                               cv2.CHAIN_APPROX_NONE)
+        parents = hierarchy[0, :, 3]
+        holes, order, borders = ImageSegmentation._get_hole_labels(
+            image.shape, contours, parents)
+        count, sum_nuc, sum_fib = ImageSegmentation._get_hole_sums(
+            holes, parents, order, borders, nuclei_channel, fiber_channel)
+
+        self.assertTrue(order)
+        for i in order:
+            reference = np.zeros(image.shape, dtype=np.uint8)
+            cv2.drawContours(reference, contours, i, 1, -1)
+            inside = reference.astype(bool)
+            self.assertEqual(count[i + 1], np.count_nonzero(inside))
+            self.assertEqual(sum_nuc[i + 1],
+                             nuclei_channel[inside].sum(dtype=np.int64))
+            self.assertEqual(sum_fib[i + 1],
+                             fiber_channel[inside].sum(dtype=np.int64))
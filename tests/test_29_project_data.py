@@ -0,0 +1,202 @@
+# coding: utf-8
+
+import pickle
+import shutil
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+
+from myofinder.tools import (ProjectSave, Settings, TableItems, TableEntry,
+                             Nucleus, Nuclei, Fiber, Fibers, load_data,
+                             save_data, overlay_colors, saved_overlays)
+from myofinder.tools._project_data import ProjectLoader
+
+
+class Test29ProjectData(unittest.TestCase):
+
+    def setUp(self) -> None:
+        """Creates a temporary project containing one image."""
+
+        self._dir = TemporaryDirectory()
+        self._project = Path(self._dir.name) / 'project'
+        (self._project / 'Original Images').mkdir(parents=True)
+        shutil.copy(Path(__file__).parent / 'data' / 'image_1.jpg',
+                    self._project / 'Original Images')
+
+        self._nuclei = [Nucleus(10.5, 20.25, None, 'in'),
+                        Nucleus(30, 40, None, 'out'),
+                        Nucleus(50.75, 60, None, 'in')]
+        self._fibers = [Fiber([(1, 2), (3, 4), (5, 6)]),
+                        Fiber([(7, 8), (9, 10)])]
+
+    def tearDown(self) -> None:
+        """Cleans up the temporary directory."""
+
+        self._dir.cleanup()
+
+    def _load(self) -> TableItems:
+        """Loads the data of the project, completing the paths of the images
+        like when opening a project."""
+
+        table_items = load_data(self._project)
+        for entry in table_items:
+            entry.path = self._project / 'Original Images' / entry.path
+        return table_items
+
+    def _save(self,
+              table_items: TableItems,
+              settings: dict[str, Any] | None = None) -> None:
+        """Saves the project and waits for the save to complete, along with
+        the overlay images if required by the settings."""
+
+        if settings is None:
+            settings = Settings.defaults()
+        colors = None
+        if settings['save_overlay']:
+            colors = overlay_colors(settings['nuclei_colour'],
+                                    settings['fiber_colour'])
+
+        save = ProjectSave(table_items, self._project, settings,
+                           list(table_items), colors, True)
+        save.start()
+        while save.messages.get() != 'Done':
+            pass
+        save._thread.join()
+        self.assertIsNone(save.error)
+        save.apply(table_items)
+
+    def _check(self, table_items: TableItems) -> None:
+        """Checks that the loaded entries hold the expected nuclei and
+        fibers."""
+
+        self.assertEqual(len(table_items), 1)
+        entry, = table_items
+        self.assertEqual(Path(entry.path).name, 'image_1.jpg')
+        self.assertEqual(entry.nuclei, Nuclei(self._nuclei))
+        self.assertEqual([(nuc.x_pos, nuc.y_pos, nuc.color)
+                          for nuc in entry.nuclei],
+                         [(nuc.x_pos, nuc.y_pos, nuc.color)
+                          for nuc in self._nuclei])
+        self.assertEqual(entry.fibers.area, 0.25)
+        self.assertEqual(list(entry.fibers), self._fibers)
+
+    def testLegacyProject(self) -> None:
+        """This test checks that a project saved in the legacy data.pickle
+        format is loaded, and converted to the current format when saved."""
+
+        # Building the objects the way they were pickled by previous versions,
+        # when the nuclei were stored as a list and the entries as dataclasses
+        nuclei = Nuclei.__new__(Nuclei)
+        nuclei.__dict__ = {'nuclei': self._nuclei}
+        entry = TableEntry.__new__(TableEntry)
+        entry.__dict__ = {'path': 'image_1.jpg', 'nuclei': nuclei,
+                          'fibers': Fibers(area=0.25, fibers=self._fibers),
+                          'graph_elt': None}
+        table_items = TableItems.__new__(TableItems)
+        table_items.__dict__ = {'entries': [entry], 'current_index': None}
+        with open(self._project / 'data.pickle', 'wb') as file:
+            pickle.dump(table_items, file)
+
+        # Checking that the legacy data is correctly loaded
+        table_items = self._load()
+        self._check(table_items)
+
+        # Checking that the legacy file is replaced by the current format
+        self._save(table_items)
+        self.assertFalse((self._project / 'data.pickle').exists())
+        self.assertTrue((self._project / 'Data' / 'index.json').is_file())
+        self._check(self._load())
+
+    def testRoundTrip(self) -> None:
+        """This test checks that the positions and status of the nuclei and the
+        vertices of the fibers are preserved when saving and loading a
+        project."""
+
+        table_items = TableItems(entries=[TableEntry(
+            path=self._project / 'Original Images' / 'image_1.jpg',
+            nuclei=Nuclei(self._nuclei),
+            fibers=Fibers(area=0.25, fibers=self._fibers))])
+        self._save(table_items)
+
+        # Checking that the entries are not loaded until their data is needed
+        loaded = self._load()
+        self.assertFalse(any(entry.loaded for entry in loaded))
+        self.assertEqual(loaded.entries[0].summary.nuclei, 3)
+        self.assertEqual(loaded.entries[0].summary.nuclei_in, 2)
+        self._check(loaded)
+
+        # Checking that saving the loaded project again preserves its data
+        self._save(loaded)
+        self._check(self._load())
+
+    def testLoaderEviction(self) -> None:
+        """This test checks that only the data of the most recently loaded
+        images is kept in memory, except for the modified ones, and that the
+        released data can be loaded again."""
+
+        # Saving a project with several images holding different data
+        names = [f'image_{i}.jpg' for i in range(3)]
+        saved = TableItems(entries=[TableEntry(
+            path=name, nuclei=Nuclei([Nucleus(i, i + 1, None, 'in')]),
+            fibers=Fibers(area=i / 10, fibers=[Fiber([(i, i), (i, i + 1)])]))
+            for i, name in enumerate(names)])
+        save_data(saved, self._project)
+
+        # Loading it with a loader keeping at most two images in memory
+        table_items = load_data(self._project)
+        loader = ProjectLoader(self._project, max_loaded=2)
+        for entry in table_items:
+            entry.loader = loader
+        first, second, third = table_items
+
+        # Checking that the least recently loaded image is released
+        self.assertEqual(first.nuclei, saved.entries[0].nuclei)
+        self.assertEqual(second.nuclei, saved.entries[1].nuclei)
+        self.assertTrue(first.loaded and second.loaded)
+        self.assertEqual(third.nuclei, saved.entries[2].nuclei)
+        self.assertFalse(first.loaded)
+        self.assertTrue(second.loaded and third.loaded)
+
+        # Checking that a modified image is never released
+        second.modified = True
+        self.assertEqual(first.fibers, saved.entries[0].fibers)
+        self.assertTrue(first.loaded and second.loaded and third.loaded)
+        self.assertFalse(second.unload())
+        self.assertTrue(second.loaded)
+
+        # Checking that the released images load the same data again
+        for entry, saved_entry in zip(table_items, saved):
+            self.assertEqual(entry.nuclei, saved_entry.nuclei)
+            self.assertEqual(entry.fibers, saved_entry.fibers)
+            self.assertEqual(entry.summary, saved_entry.summary)
+
+    def testSavedOverlays(self) -> None:
+        """This test checks that the parameters of the overlay images saved
+        with a project are retrieved when loading it, so that the overlay
+        images are not all drawn again at the next save."""
+
+        table_items = TableItems(entries=[TableEntry(
+            path=self._project / 'Original Images' / 'image_1.jpg',
+            nuclei=Nuclei(self._nuclei),
+            fibers=Fibers(area=0.25, fibers=self._fibers))])
+
+        # No overlay images are available if they were not saved
+        settings = Settings.defaults()
+        settings['save_overlay'] = False
+        self._save(table_items, settings)
+        self.assertIsNone(saved_overlays(self._load(), self._project))
+
+        # Otherwise, the parameters of the saved overlay images are returned
+        settings.update(save_overlay=True, overlay_format='png',
+                        overlay_compression=3)
+        self._save(table_items, settings)
+        self.assertEqual(saved_overlays(self._load(), self._project),
+                         (self._project,
+                          overlay_colors(settings['nuclei_colour'],
+                                         settings['fiber_colour']),
+                          'png', 3))
+
+        # Unless some of the overlay images are missing
+        (self._project / 'Overlay Images' / 'image_1.png').unlink()
+        self.assertIsNone(saved_overlays(self._load(), self._project))
@@ -4,3 +4,4 @@ from .base_classes import BaseTestInterface, BaseTestInterfaceProcessing
 from . import mock_filedialog
 from . import mock_messagebox
 from . import mock_warning_window
+from .save_version import save_version
@@ -7,3 +7,12 @@ def askyesno(*_, **__) -> bool:
     """
 
     return True
+
+
+def showinfo(*_, **__) -> str:
+    """Mocks a call to tkinter.messagebox.showinfo().
+
+    Normally displays an information message to the user.
+    """
+
+    return 'ok'
@@ -0,0 +1,16 @@
+# coding: utf-8
+
+from pathlib import Path
+
+from myofinder.tools import TableItems, TableEntry
+
+
+def save_version(table_items: TableItems) -> TableItems:
+    """Returns a simpler version of the given entries, with no canvas object
+    and with the paths truncated to only the file names, for comparing the
+    data of projects saved and loaded from different folders."""
+
+    return TableItems(entries=[TableEntry(path=Path(entry.path).name,
+                                          nuclei=entry.nuclei,
+                                          fibers=entry.fibers)
+                               for entry in table_items])